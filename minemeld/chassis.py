@@ -82,12 +82,18 @@ class Chassis(object):
     def get_ft(self, ftname):
         return self.fts.get(ftname, None)
 
-    def configure(self, config):
+    def configure(self, config, remote_topics=None):
         """configures the chassis instance
 
         Args:
             config (list): list of FTs
+            remote_topics (list): list of topics published by nodes of
+                this chassis and subscribed by nodes in other chassis.
+                If None all the topics are published on the comm backend
         """
+        if remote_topics is not None:
+            self.fabric.set_remote_topics(remote_topics)
+
         newfts = {}
         for ft in config:
             ftconfig = config[ft]
@@ -137,6 +143,12 @@ class Chassis(object):
         return self.fabric.send_rpc(sftname, dftname, method, params,
                                     block=block, timeout=timeout)
 
+    def send_rpc_bulk(self, sftname, dftname, method, items,
+                      chunk_size, timeout):
+        return self.fabric.send_rpc_bulk(sftname, dftname, method, items,
+                                         chunk_size=chunk_size,
+                                         timeout=timeout)
+
     def _log_actor(self):
         while True:
             try:
@@ -169,6 +181,10 @@ class Chassis(object):
                 LOG.exception('Error publishing status')
 
     def publish_status(self, timestamp, nodename, status):
+        fstats = self.fabric.statistics().get(nodename, None)
+        if fstats is not None:
+            status['fabric'] = fstats
+
         self.status_channel_queue.put({
             'timestamp': timestamp,
             'source': nodename,
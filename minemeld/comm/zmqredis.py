@@ -25,9 +25,11 @@ import logging
 import uuid
 import os
 import time
+import collections
 
 import gevent
 import gevent.event
+import gevent.lock
 import ujson as json
 from errno import EAGAIN
 
@@ -38,14 +40,48 @@ LOG = logging.getLogger(__name__)
 
 
 class RedisPubChannel(object):
-    def __init__(self, topic, connection_pool):
+    """Publishes messages on a topic using a sequence of Redis lists.
+
+    If *batch_size* is greater than 1, messages are accumulated and pushed
+    as a single JSON list, flushed when *batch_size* messages have been
+    queued or *batch_timeout* seconds after the first message of the batch.
+    Lagger and backpressure accounting is done in units of messages.
+
+    Args:
+        topic (str): topic name
+        connection_pool: Redis connection pool
+        batch_size (int): max number of messages per batch
+        batch_timeout (float): max delay in seconds before flushing a batch
+    """
+    def __init__(self, topic, connection_pool, batch_size=1,
+                 batch_timeout=0.1):
         self.topic = topic
         self.prefix = 'mm:topic:{}'.format(self.topic)
 
         self.connection_pool = connection_pool
         self.SR = None
 
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self._batch = []
+        self._batch_glet = None
+
+        # pushes can wait for the lagger, the lock keeps list
+        # entries in order when the batch timer and the publisher
+        # flush at the same time
+        self._push_lock = gevent.lock.Semaphore()
+
+        # num_publish counts list entries, num_messages counts messages
         self.num_publish = 0
+        self.num_messages = 0
+        self._last_lagger_check = 0
+
+        # (num_publish, num_messages) after each entry not yet
+        # consumed by all the subscribers
+        self._pending_entries = collections.deque()
+        self._consumed_messages = 0
+
+        self.statistics = collections.defaultdict(int)
 
     def connect(self):
         if self.SR is not None:
@@ -59,6 +95,19 @@ class RedisPubChannel(object):
         if self.SR is None:
             return
 
+        if self._batch_glet is not None:
+            self._batch_glet.kill()
+            self._batch_glet = None
+
+        if len(self._batch) != 0:
+            batch = self._batch
+            self._batch = []
+            self._push(
+                '[' + ','.join(batch) + ']',
+                len(batch),
+                backpressure=False
+            )
+
         self.SR = None
 
     def lagger(self):
@@ -76,6 +125,16 @@ class RedisPubChannel(object):
 
         return minsubc
 
+    def _consumed(self, lagger):
+        """Translates the number of list entries consumed by the lagger
+        into number of messages.
+        """
+        while len(self._pending_entries) != 0 and \
+                self._pending_entries[0][0] <= lagger:
+            self._consumed_messages = self._pending_entries.popleft()[1]
+
+        return self._consumed_messages
+
     def gc(self, lagger):
         minhighbits = lagger >> 12
 
@@ -96,42 +155,103 @@ class RedisPubChannel(object):
             ))
             self.SR.delete(*queues)
 
-    def publish(self, method, params=None):
-        high_bits = self.num_publish >> 12
+    def _push(self, payload, num_messages, backpressure=True):
+        with self._push_lock:
+            if backpressure:
+                self._wait_lagger()
+
+            # computed after the wait, num_publish could have changed
+            high_bits = self.num_publish >> 12
+
+            qname = '{}:queue:{:013X}'.format(
+                self.prefix,
+                high_bits
+            )
+
+            self.SR.rpush(qname, payload)
+            self.num_publish += 1
+            self.num_messages += num_messages
+            self._pending_entries.append(
+                (self.num_publish, self.num_messages)
+            )
+
+        self.statistics['tx.entries'] += 1
+        self.statistics['tx.messages'] += num_messages
+        self.statistics['tx.bytes'] += len(payload)
+
+    def _wait_lagger(self):
         low_bits = self.num_publish & 0xfff
 
-        if (low_bits % 128) == 127:
-            lagger = self.lagger()
-            LOG.debug('topic {} - sent {} lagger {}'.format(
+        if (self.num_messages - self._last_lagger_check) < 128 and \
+           low_bits != 0xfff:
+            return
+
+        self._last_lagger_check = self.num_messages
+
+        lagger = self.lagger()
+        LOG.debug('topic {} - sent {} lagger {}'.format(
+            self.topic,
+            self.num_messages,
+            self._consumed(lagger)
+        ))
+
+        while (self.num_messages - self._consumed(lagger)) > 1024:
+            LOG.debug('topic {} - waiting lagger delta: {}'.format(
                 self.topic,
-                self.num_publish,
-                lagger
+                self.num_messages - self._consumed(lagger)
             ))
+            self.statistics['wait.lagger'] += 1
+            gevent.sleep(0.1)
+            lagger = self.lagger()
 
-            while (self.num_publish - lagger) > 1024:
-                LOG.debug('topic {} - waiting lagger delta: {}'.format(
-                    self.topic,
-                    self.num_publish - lagger
-                ))
-                gevent.sleep(0.1)
-                lagger = self.lagger()
+        if low_bits == 0xfff:
+            # we are switching to a new list, gc
+            self.gc(lagger)
+
+    def _flush_later(self):
+        gevent.sleep(self.batch_timeout)
 
-            if low_bits == 0xfff:
-                # we are switching to a new list, gc
-                self.gc(lagger)
+        self._batch_glet = None
+        self.flush()
 
+    def flush(self):
+        """Pushes the pending batch, if any.
+        """
+        if self._batch_glet is not None and \
+           self._batch_glet is not gevent.getcurrent():
+            self._batch_glet.kill()
+        self._batch_glet = None
+
+        if len(self._batch) == 0:
+            return
+
+        batch = self._batch
+        self._batch = []
+
+        self._push('[' + ','.join(batch) + ']', len(batch))
+
+    def publish(self, method, params=None):
         msg = {
             'method': method,
             'params': params
         }
 
-        qname = '{}:queue:{:013X}'.format(
-            self.prefix,
-            high_bits
-        )
+        if self.batch_size <= 1:
+            self._push(json.dumps(msg), 1)
+            return
+
+        # messages are serialized right away, publishers are free
+        # to modify params after publish returns
+        self._batch.append(json.dumps(msg))
+
+        # checkpoints and other control messages are not delayed
+        if len(self._batch) >= self.batch_size or \
+           method not in ('update', 'withdraw'):
+            self.flush()
+            return
 
-        self.SR.rpush(qname, json.dumps(msg))
-        self.num_publish += 1
+        if self._batch_glet is None:
+            self._batch_glet = gevent.spawn(self._flush_later)
 
 
 class ZMQRpcFanoutClientChannel(object):
@@ -507,16 +627,11 @@ class RedisSubChannel(object):
         self.connection_pool = connection_pool
 
         self.num_callbacks = 0
+        self.statistics = collections.defaultdict(int)
 
         self.sub_number = None
 
-    def _callback(self, msg):
-        try:
-            msg = json.loads(msg)
-        except ValueError:
-            LOG.error("invalid message received")
-            return
-
+    def _dispatch(self, msg):
         method = msg.get('method', None)
         params = msg.get('params', {})
         if method is None:
@@ -544,6 +659,26 @@ class RedisSubChannel(object):
 
         self.num_callbacks += 1
 
+    def _callback(self, msg):
+        self.statistics['rx.entries'] += 1
+        self.statistics['rx.bytes'] += len(msg)
+
+        try:
+            msg = json.loads(msg)
+        except ValueError:
+            LOG.error("invalid message received")
+            return
+
+        # a list entry could be a single message or a batch
+        if isinstance(msg, list):
+            for m in msg:
+                self._dispatch(m)
+            self.statistics['rx.messages'] += len(msg)
+            return
+
+        self._dispatch(msg)
+        self.statistics['rx.messages'] += 1
+
     def connect(self):
         subscribers_key = '{}:subscribers'.format(self.prefix)
 
@@ -585,6 +720,10 @@ class ZMQRedis(object):
             self.redis_config['url']
         )
 
+        # batching of messages on Redis pub channels
+        self.pub_batch_size = config.get('batch_size', 1)
+        self.pub_batch_timeout = config.get('batch_timeout', 0.1)
+
     def add_failure_listener(self, listener):
         self.failure_listeners.append(listener)
 
@@ -613,7 +752,9 @@ class ZMQRedis(object):
         if not multi_write:
             redis_pub_channel = RedisPubChannel(
                 topic=topic,
-                connection_pool=self.redis_cp
+                connection_pool=self.redis_cp,
+                batch_size=self.pub_batch_size,
+                batch_timeout=self.pub_batch_timeout
             )
             self.pub_channels.append(redis_pub_channel)
 
@@ -649,6 +790,24 @@ class ZMQRedis(object):
         )
         self.mw_sub_channels.append(subchannel)
 
+    @staticmethod
+    def _rpc_address(dest):
+        if dest[0] == '@':
+            return 'ipc://@/var/run/minemeld/{}:rpc'.format(dest[1:])
+
+        return 'ipc:///var/run/minemeld/{}:rpc'.format(dest)
+
+    @staticmethod
+    def _recv_result(socket, timeout):
+        if timeout is None:
+            return socket.recv_json()
+
+        # zmq green does not support RCVTIMEO
+        if socket.poll(flags=zmq.POLLIN, timeout=int(timeout*1000)) == 0:
+            raise RuntimeError('Timeout in RPC')
+
+        return socket.recv_json(flags=zmq.NOBLOCK)
+
     def send_rpc(self, dest, method, params,
                  block=True, timeout=None):
         if self.context is None:
@@ -665,16 +824,7 @@ class ZMQRedis(object):
 
         socket = self.context.socket(zmq.REQ)
 
-        if dest[0] == '@':
-            address = 'ipc://@/var/run/minemeld/{}:rpc'.format(
-                dest[1:]
-            )
-        else:
-            address = 'ipc:///var/run/minemeld/{}:rpc'.format(
-                dest
-            )
-
-        socket.connect(address)
+        socket.connect(self._rpc_address(dest))
         socket.setsockopt(zmq.LINGER, 0)
         socket.send_json(body)
         LOG.debug('RPC sent to {}:rpc for method {}'.format(dest, method))
@@ -683,21 +833,78 @@ class ZMQRedis(object):
             socket.close(linger=0)
             return
 
-        if timeout is not None:
-            # zmq green does not support RCVTIMEO
-            if socket.poll(flags=zmq.POLLIN, timeout=int(timeout*1000)) != 0:
-                result = socket.recv_json(flags=zmq.NOBLOCK)
+        try:
+            result = self._recv_result(socket, timeout)
 
-            else:
-                socket.close(linger=0)
-                raise RuntimeError('Timeout in RPC')
+        finally:
+            socket.close(linger=0)
 
-        else:
-            result = socket.recv_json()
+        return result
 
-        socket.close(linger=0)
+    def send_rpc_stream(self, dest, method, params_iterator, timeout=None):
+        """Sends a stream of RPC calls to *dest* over a single socket.
 
-        return result
+        A call is sent only after the reply to the previous one has been
+        received. The RPC server replies when the method returns, the
+        stream is paced by the receiver only if its methods return after
+        the call has been processed. The stream is aborted if a call
+        fails.
+
+        Args:
+            dest (str): destination RPC server channel
+            method (str): method name
+            params_iterator: iterator of the params of each call
+            timeout (int): timeout in seconds of each call
+
+        Returns the number of calls sent.
+        """
+        if self.context is None:
+            raise RuntimeError('send_rpc_stream to {} when not connected'.format(dest))
+
+        socket = self.context.socket(zmq.REQ)
+        socket.connect(self._rpc_address(dest))
+        socket.setsockopt(zmq.LINGER, 0)
+
+        num_calls = 0
+        try:
+            for params in params_iterator:
+                socket.send_json({
+                    'method': method,
+                    'id': str(uuid.uuid1()),
+                    'params': params
+                })
+
+                result = self._recv_result(socket, timeout)
+                if result.get('error', None) is not None:
+                    raise RuntimeError('Error in RPC stream to {}: {}'.format(
+                        dest, result['error']
+                    ))
+
+                num_calls += 1
+
+        finally:
+            socket.close(linger=0)
+
+        LOG.debug('RPC stream to {}:rpc for method {} - {} calls'.format(
+            dest, method, num_calls
+        ))
+
+        return num_calls
+
+    def statistics(self):
+        """Returns throughput counters of Redis pub and sub channels,
+        per topic.
+        """
+        result = collections.defaultdict(dict)
+
+        for pc in self.pub_channels:
+            result[pc.topic].update(pc.statistics)
+
+        for sc in self.sub_channels:
+            for k, v in sc.statistics.iteritems():
+                result[sc.topic][k] = result[sc.topic].get(k, 0) + v
+
+        return dict(result)
 
     def _ioloop(self, executor):
         executor.run()
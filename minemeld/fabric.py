@@ -23,15 +23,134 @@ fabric using this instance.
 from __future__ import absolute_import
 
 import logging
+import collections
+
+import gevent
+import gevent.queue
 
 import minemeld.comm
 
 LOG = logging.getLogger(__name__)
 
+LOCAL_QUEUE_SIZE = 1024
+
+
+def _copy_params(value):
+    """Copies JSON-like message params, subscribers and publisher should
+    not share containers as they are free to modify them.
+    """
+    if isinstance(value, dict):
+        return {k: _copy_params(v) for k, v in value.iteritems()}
+
+    if isinstance(value, list):
+        return [_copy_params(v) for v in value]
+
+    return value
+
+
+class LocalPubChannel(object):
+    """Publishing channel for nodes running inside the same chassis.
+
+    Messages are delivered directly to the queues of local subscribers,
+    without serialization. If the topic has subscribers in other chassis
+    messages are also published on the communication backend channel.
+
+    Args:
+        topic (str): topic name
+    """
+    def __init__(self, topic):
+        self.topic = topic
+        self.subscribers = []
+        self.remote = None
+
+        self.statistics = collections.defaultdict(int)
+
+    def add_subscriber(self, subscriber):
+        self.subscribers.append(subscriber)
+
+    def publish(self, method, params=None):
+        for sc in self.subscribers:
+            sc.put(method, _copy_params(params))
+            self.statistics['tx.local.messages'] += 1
+
+        if self.remote is not None:
+            self.remote.publish(method, params)
+
+
+class LocalSubChannel(object):
+    """Subscription channel for a topic published inside the same chassis.
+
+    Messages published before dispatching starts are buffered without
+    limits, as the communication backend does. Then messages are stored
+    in a bounded queue, publishers block when the queue is full.
+
+    Args:
+        topic (str): topic name
+        obj: subscriber instance
+        allowed_methods (list): list of allowed methods
+        maxsize (int): size of the queue
+    """
+    def __init__(self, topic, obj, allowed_methods, maxsize=LOCAL_QUEUE_SIZE):
+        self.topic = topic
+        self.obj = obj
+        self.allowed_methods = allowed_methods
+
+        self.queue = gevent.queue.Queue(maxsize=maxsize)
+        self.pending = collections.deque()
+        self.dispatching = False
+
+        self.statistics = collections.defaultdict(int)
+
+    def put(self, method, params):
+        if not self.dispatching:
+            self.pending.append((method, params))
+            return
+
+        self.queue.put((method, params))
+
+    def start_dispatching(self):
+        self.dispatching = True
+
+    def run(self):
+        while True:
+            if self.pending:
+                method, params = self.pending.popleft()
+            else:
+                method, params = self.queue.get()
+            self.statistics['rx.local.messages'] += 1
+
+            if method not in self.allowed_methods:
+                LOG.error('Method not allowed: %s', method)
+                continue
+
+            m = getattr(self.obj, method, None)
+            if m is None:
+                LOG.error('Method %s not defined', method)
+                continue
+
+            if params is None:
+                params = {}
+
+            try:
+                m(**params)
+
+            except gevent.GreenletExit:
+                raise
+
+            except:
+                LOG.exception('Exception in handling %s on topic %s '
+                              'with params %s', method, self.topic, params)
+
 
 class Fabric(object):
     """MineMeld chassis fabric class
 
+    If the list of topics with subscribers outside the chassis is known
+    (see `set_remote_topics`), edges between nodes in the same chassis use
+    in-memory queues and topics without remote subscribers are not
+    published on the communication backend. mm-run sets it only if the
+    environment variable MM_LOCAL_FABRIC is true.
+
     Args:
         chassis: MineMeld chassis instance
         config (dict): communication backend config
@@ -45,6 +164,22 @@ class Fabric(object):
 
         self.comm = minemeld.comm.factory(self.comm_class, self.comm_config)
 
+        self.remote_topics = None
+        self.local_pub_channels = {}
+        self.local_sub_channels = []
+        self._sub_requests = []
+        self._local_glets = []
+
+    def set_remote_topics(self, remote_topics):
+        """Sets the list of topics with subscribers in other chassis,
+        enables delivery over in-memory queues for the others.
+        Should be called before any channel is requested.
+
+        Args:
+            remote_topics (list): list of topic names
+        """
+        self.remote_topics = set(remote_topics)
+
     def request_rpc_channel(self, ftname, node, allowed_methods):
         """Creates a new RPC channel on the communication backend.
 
@@ -61,7 +196,13 @@ class Fabric(object):
         Args:
             ftname (str): node name
         """
-        return self.comm.request_pub_channel(ftname)
+        if self.remote_topics is None:
+            return self.comm.request_pub_channel(ftname)
+
+        pc = LocalPubChannel(ftname)
+        self.local_pub_channels[ftname] = pc
+
+        return pc
 
     def request_sub_channel(self, ftname, node, subname, allowed_methods):
         """Creates a subscription channel to topic subname.
@@ -73,7 +214,29 @@ class Fabric(object):
             allowed_methods (list): list of allowed methods
         """
         _ = ftname  # noqa
-        self.comm.request_sub_channel(subname, node, allowed_methods)
+        if self.remote_topics is None:
+            self.comm.request_sub_channel(subname, node, allowed_methods)
+            return
+
+        # resolved in start, when all the nodes have been connected
+        self._sub_requests.append((subname, node, allowed_methods))
+
+    def _connect_local_channels(self):
+        for subname, node, allowed_methods in self._sub_requests:
+            pc = self.local_pub_channels.get(subname, None)
+            if pc is None:
+                self.comm.request_sub_channel(subname, node, allowed_methods)
+                continue
+
+            LOG.info('local subscription to %s', subname)
+            sc = LocalSubChannel(subname, node, allowed_methods)
+            pc.add_subscriber(sc)
+            self.local_sub_channels.append(sc)
+        self._sub_requests = []
+
+        for topic, pc in self.local_pub_channels.iteritems():
+            if topic in self.remote_topics:
+                pc.remote = self.comm.request_pub_channel(topic)
 
     def send_rpc(self, sftname, dftname, method, params,
                  block=True, timeout=None):
@@ -96,19 +259,96 @@ class Fabric(object):
             timeout=timeout
         )
 
+    def send_rpc_bulk(self, sftname, dftname, method, items,
+                      chunk_size=1000, timeout=None):
+        """Sends *items* to a specific node as a stream of RPC calls.
+
+        Items are sent in chunks of *chunk_size*, the next chunk is sent
+        when the destination node replies to the previous call.
+        BaseFT.update_bulk replies once the chunk has been processed,
+        also for actor based nodes. The last call of the stream has
+        *eos* set to True, and it could carry no items.
+
+        Args:
+            sftname (str): source node name
+            dftname (str): destination node name
+            method (str): method name, called with the params *source*,
+                *items* and *eos*
+            items: iterator of JSON serializable items
+            chunk_size (int): max number of items per call
+            timeout (int): timeout in seconds of each call
+        """
+        def _chunks():
+            chunk = []
+            for item in items:
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    yield {'source': sftname, 'items': chunk, 'eos': False}
+                    chunk = []
+
+            yield {'source': sftname, 'items': chunk, 'eos': True}
+
+        return self.comm.send_rpc_stream(
+            dftname,
+            method,
+            _chunks(),
+            timeout=timeout
+        )
+
+    def statistics(self):
+        """Returns throughput counters of the fabric, per topic.
+        """
+        result = {}
+
+        stats = getattr(self.comm, 'statistics', None)
+        if stats is not None:
+            result = stats()
+
+        for channel in self.local_pub_channels.values() + self.local_sub_channels:
+            tstats = result.setdefault(channel.topic, {})
+            for k, v in channel.statistics.iteritems():
+                tstats[k] = tstats.get(k, 0) + v
+
+        return result
+
     def _comm_failure(self):
         self.chassis.fabric_failed()
 
+    def _local_failure(self, g):
+        try:
+            g.get()
+
+        except gevent.GreenletExit:
+            return
+
+        except:
+            LOG.exception('Exception in local channel')
+            self._comm_failure()
+
     def start(self):
         LOG.debug("fabric start called")
+        if self.remote_topics is not None:
+            self._connect_local_channels()
+
         self.comm.add_failure_listener(self._comm_failure)
         self.comm.start(start_dispatching=False)
 
     def start_dispatching(self):
+        for sc in self.local_sub_channels:
+            sc.start_dispatching()
+            g = gevent.spawn(sc.run)
+            g.link_exception(self._local_failure)
+            self._local_glets.append(g)
+
         self.comm.start_dispatching()
 
     def stop(self):
         LOG.debug("fabric stop called")
+        for g in self._local_glets:
+            g.unlink(self._local_failure)
+            g.kill()
+        self._local_glets = []
+
         self.comm.stop()
 
 
@@ -0,0 +1,106 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Streaming compression of feed responses.
+
+The body generated by the feed formatters is compressed chunk by chunk
+while it is sent to the client, the full body is never buffered.
+"""
+
+import zlib
+from collections import defaultdict
+
+from flask import request
+
+from . import config
+
+
+__all__ = ['STATISTICS', 'accepted_encoding', 'compress_stream']
+
+
+COMPRESSION_LEVEL = int(config.get('FEEDS_COMPRESSION_LEVEL', 6))
+# minimum size of the compressed chunks yielded by compress_stream
+MIN_CHUNK_SIZE = 16 * 1024
+
+# zlib window bits for each supported content encoding
+_ENCODINGS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS
+}
+
+STATISTICS = defaultdict(int)
+
+
+def accepted_encoding():
+    """Returns the content encoding to be used for the response of the
+    current request, None if the client does not accept any of the
+    supported encodings.
+    """
+    if not config.get('FEEDS_COMPRESSION', True):
+        return None
+
+    accepted = request.accept_encodings
+    for encoding in sorted(_ENCODINGS.keys(), key=lambda e: -accepted[e]):
+        if accepted[encoding] > 0:
+            return encoding
+
+    return None
+
+
+def compress_stream(iterator, encoding):
+    """Compresses the chunks returned by *iterator* using *encoding*.
+
+    Args:
+        iterator: iterator of str chunks
+        encoding (str): content encoding, gzip or deflate
+    """
+    compressor = zlib.compressobj(
+        COMPRESSION_LEVEL,
+        zlib.DEFLATED,
+        _ENCODINGS[encoding]
+    )
+
+    raw_size = 0
+    compressed_size = 0
+
+    buffer = []
+    buffer_size = 0
+    for chunk in iterator:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+
+        raw_size += len(chunk)
+
+        cchunk = compressor.compress(chunk)
+        if not cchunk:
+            continue
+
+        buffer.append(cchunk)
+        buffer_size += len(cchunk)
+        if buffer_size >= MIN_CHUNK_SIZE:
+            compressed_size += buffer_size
+            yield ''.join(buffer)
+            buffer = []
+            buffer_size = 0
+
+    buffer.append(compressor.flush())
+    cchunk = ''.join(buffer)
+    compressed_size += len(cchunk)
+    yield cchunk
+
+    STATISTICS['responses.'+encoding] += 1
+    STATISTICS['bytes.raw'] += raw_size
+    STATISTICS['bytes.compressed'] += compressed_size
+    STATISTICS['bytes.saved'] += raw_size - compressed_size
@@ -0,0 +1,87 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Cache of rendered feeds.
+
+Rendered feeds are keyed by feed name, feed generation and request
+arguments. The RedisSet node bumps the generation of the feed each time
+the content changes, so entries never need to be invalidated: entries of
+old generations are simply not requested anymore and are evicted by the
+LRU policy.
+"""
+
+from collections import OrderedDict, defaultdict
+
+from . import config
+
+
+__all__ = ['FEED_CACHE']
+
+
+class FeedCache(object):
+    """LRU cache with a cap on the total size of the cached bodies.
+
+    Args:
+        max_size (int): max total size of the cached entries in bytes
+        max_entry_size (int): max size of a single entry in bytes
+    """
+    def __init__(self, max_size, max_entry_size):
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+
+        self.size = 0
+        self.statistics = defaultdict(int)
+
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.statistics['miss'] += 1
+            return None
+
+        # move entry to the end, most recently used
+        self._entries[key] = entry
+        self.statistics['hit'] += 1
+
+        return entry
+
+    def put(self, key, entry):
+        if len(entry) > self.max_entry_size:
+            self.statistics['too_big'] += 1
+            return False
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+
+        self._entries[key] = entry
+        self.size += len(entry)
+
+        while self.size > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.statistics['evicted'] += 1
+
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+
+FEED_CACHE = FeedCache(
+    max_size=int(config.get('FEEDS_CACHE_SIZE', 64 * 1024 * 1024)),
+    max_entry_size=int(config.get('FEEDS_CACHE_MAX_ENTRY_SIZE', 16 * 1024 * 1024))
+)
@@ -15,24 +15,32 @@
 import cStringIO
 import json
 import re
+import hashlib
+from datetime import datetime
 from collections import defaultdict
 from contextlib import contextmanager
+from itertools import izip
 
 import unicodecsv
 from flask import request, jsonify, Response, stream_with_context
 from flask.ext.login import current_user
 from gevent import sleep
 from netaddr import IPRange, IPNetwork, IPSet, iprange_to_cidrs
+from werkzeug.http import is_resource_modified
 
+from . import config
 from .aaa import MMBlueprint
 from .cbfeed import CbFeedInfo, CbReport
+from .compression import accepted_encoding, compress_stream
+from .feedcache import FEED_CACHE
 from .logger import LOG
-from .mmrpc import MMMaster
+from .noderegistry import NODE_REGISTRY
 from .redisclient import SR
 
 __all__ = ['BLUEPRINT']
 
-FEED_INTERVAL = 100
+# number of indicators retrieved from Redis per request
+FEED_PAGE_SIZE = int(config.get('FEEDS_PAGE_SIZE', 1000))
 _PROTOCOL_RE = re.compile('^(?:[a-z]+:)*//')
 _PORT_RE = re.compile('^([a-z0-9\-\.]+)(?:\:[0-9]+)*')
 _INVALID_TOKEN_RE = re.compile('(?:[^\./+=\?&]+\*[^\./+=\?&]*)|(?:[^\./+=\?&]*\*[^\./+=\?&]+)')
@@ -67,17 +75,7 @@ def _extract_cidrs(indicator):
     return parsed
 
 
-@contextmanager
-def _buffer():
-    result = cStringIO.StringIO()
-
-    try:
-        yield result
-    finally:
-        result.close()
-
-
-def generate_panosurl_feed(feed, start, num, desc, value, **kwargs):
+def _indicator_pages(feed, start, num, desc):
     zrange = SR.zrange
     if desc:
         zrange = SR.zrevrange
@@ -89,8 +87,37 @@ def generate_panosurl_feed(feed, start, num, desc, value, **kwargs):
 
     while cstart < (start + num):
         ilist = zrange(feed, cstart,
-                       cstart - 1 + min(start + num - cstart, FEED_INTERVAL))
+                       cstart - 1 + min(start + num - cstart, FEED_PAGE_SIZE))
+
+        yield ilist
+
+        if len(ilist) < FEED_PAGE_SIZE:
+            break
+
+        cstart += FEED_PAGE_SIZE
 
+
+def _indicator_values(feed, ilist):
+    """Yields the JSON encoded values of the indicators in ilist,
+    fetched with one HMGET per page.
+    """
+    for j in xrange(0, len(ilist), FEED_PAGE_SIZE):
+        for v in SR.hmget(feed + '.value', ilist[j:j+FEED_PAGE_SIZE]):
+            yield v
+
+
+@contextmanager
+def _buffer():
+    result = cStringIO.StringIO()
+
+    try:
+        yield result
+    finally:
+        result.close()
+
+
+def generate_panosurl_feed(feed, start, num, desc, value, **kwargs):
+    for ilist in _indicator_pages(feed, start, num, desc):
         for i in ilist:
             i = i.lower()
 
@@ -130,20 +157,8 @@ def generate_panosurl_feed(feed, start, num, desc, value, **kwargs):
 
             yield i + '\n'
 
-        if len(ilist) < 100:
-            break
-
-        cstart += 100
-
 
 def generate_plain_feed(feed, start, num, desc, value, **kwargs):
-    zrange = SR.zrange
-    if desc:
-        zrange = SR.zrevrange
-
-    if num is None:
-        num = (1 << 32) - 1
-
     translate_ip_ranges = kwargs.pop('translate_ip_ranges', False)
 
     should_aggregate = 'sum' in kwargs
@@ -151,12 +166,7 @@ def generate_plain_feed(feed, start, num, desc, value, **kwargs):
         translate_ip_ranges = False
         temp_set = set()
 
-    cstart = start
-
-    while cstart < (start + num):
-        ilist = zrange(feed, cstart,
-                       cstart - 1 + min(start + num - cstart, FEED_INTERVAL))
-
+    for ilist in _indicator_pages(feed, start, num, desc):
         if should_aggregate:
             for i in ilist:
                 for n in _extract_cidrs(i):
@@ -168,11 +178,6 @@ def generate_plain_feed(feed, start, num, desc, value, **kwargs):
 
             yield '\n'.join(ilist) + '\n'
 
-        if len(ilist) < 100:
-            break
-
-        cstart += 100
-
     if should_aggregate:
         ip_set = IPSet(temp_set)
         for cidr in ip_set.iter_cidrs():
@@ -180,30 +185,17 @@ def generate_plain_feed(feed, start, num, desc, value, **kwargs):
 
 
 def generate_json_feed(feed, start, num, desc, value, **kwargs):
-    zrange = SR.zrange
-    if desc:
-        zrange = SR.zrevrange
-
-    if num is None:
-        num = (1 << 32) - 1
-
     translate_ip_ranges = kwargs.pop('translate_ip_ranges', False)
 
     if value == 'json':
         yield '[\n'
 
-    cstart = start
     firstelement = True
 
-    while cstart < (start + num):
-        ilist = zrange(feed, cstart,
-                       cstart - 1 + min(start + num - cstart, FEED_INTERVAL))
-
+    for ilist in _indicator_pages(feed, start, num, desc):
         result = cStringIO.StringIO()
 
-        for indicator in ilist:
-            v = SR.hget(feed + '.value', indicator)
-
+        for indicator, v in izip(ilist, _indicator_values(feed, ilist)):
             xindicators = [indicator]
             if translate_ip_ranges and '-' in indicator:
                 xindicators = _translate_ip_ranges(indicator, None if v is None else json.loads(v))
@@ -233,11 +225,6 @@ def generate_json_feed(feed, start, num, desc, value, **kwargs):
 
         result.close()
 
-        if len(ilist) < 100:
-            break
-
-        cstart += 100
-
     if value == 'json':
         yield ']\n'
 
@@ -260,13 +247,6 @@ def generate_csv_feed(feed, start, num, desc, value, **kwargs):
 
         return json.dumps(fv)
 
-    zrange = SR.zrange
-    if desc:
-        zrange = SR.zrevrange
-
-    if num is None:
-        num = (1 << 32) - 1
-
     translate_ip_ranges = kwargs.pop('translate_ip_ranges', False)
 
     # extract name of fields and column names
@@ -300,8 +280,6 @@ def generate_csv_feed(feed, start, num, desc, value, **kwargs):
     else:
         ubom = int(ubom[0])
 
-    cstart = start
-
     if ubom:
         LOG.debug('BOM')
         yield '\xef\xbb\xbf'
@@ -317,12 +295,8 @@ def generate_csv_feed(feed, start, num, desc, value, **kwargs):
             w.writeheader()
             yield current_line.getvalue()
 
-        while cstart < (start + num):
-            ilist = zrange(feed, cstart,
-                           cstart - 1 + min(start + num - cstart, FEED_INTERVAL))
-
-            for indicator in ilist:
-                v = SR.hget(feed + '.value', indicator)
+        for ilist in _indicator_pages(feed, start, num, desc):
+            for indicator, v in izip(ilist, _indicator_values(feed, ilist)):
                 v = None if v is None else json.loads(v)
 
                 xindicators = [indicator]
@@ -344,20 +318,8 @@ def generate_csv_feed(feed, start, num, desc, value, **kwargs):
                     w.writerow(fieldvalues)
                     yield current_line.getvalue()
 
-            if len(ilist) < FEED_INTERVAL:
-                break
-
-            cstart += FEED_INTERVAL
-
 
 def generate_mwg_feed(feed, start, num, desc, value, **kwargs):
-    zrange = SR.zrange
-    if desc:
-        zrange = SR.zrevrange
-
-    if num is None:
-        num = (1 << 32) - 1
-
     translate_ip_ranges = kwargs.pop('translate_ip_ranges', False)
     type_ = kwargs.get('t', None)
     if type_ is None:
@@ -368,13 +330,8 @@ def generate_mwg_feed(feed, start, num, desc, value, **kwargs):
 
     yield 'type={}\n'.format(type_)
 
-    cstart = start
-    while cstart < (start + num):
-        ilist = zrange(feed, cstart,
-                       cstart - 1 + min(start + num - cstart, FEED_INTERVAL))
-
-        for indicator in ilist:
-            v = SR.hget(feed + '.value', indicator)
+    for ilist in _indicator_pages(feed, start, num, desc):
+        for indicator, v in izip(ilist, _indicator_values(feed, ilist)):
             v = None if v is None else json.loads(v)
 
             xindicators = [indicator]
@@ -393,11 +350,6 @@ def generate_mwg_feed(feed, start, num, desc, value, **kwargs):
                     sources.replace('"', '\\"')
                 )
 
-        if len(ilist) < 100:
-            break
-
-        cstart += 100
-
 
 # This formatter implements BlueCoat custom URL format as described at
 # https://www.bluecoat.com/documents/download/a366dc73-d455-4859-b92a-c96bd034cb4c/f849f1e3-a906-4ee8-924e-a2061dfe3cdf
@@ -414,9 +366,8 @@ def generate_bluecoat_feed(feed, start, num, desc, value, **kwargs):
     flag_category_default = kwargs.get('cd', None)
     flag_category_attr = kwargs.get('ca', ['bc_category'])[0]
 
-    for i in ilist:
+    for i, v in izip(ilist, _indicator_values(feed, ilist)):
         sleep(0)
-        v = SR.hget(feed + '.value', i)
         v = None if v is None else json.loads(v)
         i = i.lower()
         i = _PROTOCOL_RE.sub('', i)
@@ -490,9 +441,8 @@ def generate_carbon_black(feed, start, num, desc, value, **kwargs):
     # Loop though all indicators
     # Only indicators of type IPv4, domain and md5 can be exported to Carbon Black
     ipv4_line = None
-    for i in ilist:
+    for i, v in izip(ilist, _indicator_values(feed, ilist)):
         sleep(0)
-        v = SR.hget(feed + '.value', i)
         v = None if v is None else json.loads(v)
         if v is None:
             continue
@@ -520,6 +470,51 @@ def generate_carbon_black(feed, start, num, desc, value, **kwargs):
     yield "}}]}"
 
 
+def _feed_generation(feed):
+    """Returns generation and last modified time of the feed, None if
+    the feed node does not maintain a generation.
+    """
+    generation, last_modified = SR.mget(
+        feed + '.generation',
+        feed + '.last_modified'
+    )
+    if generation is None or last_modified is None:
+        return None
+
+    return generation, int(last_modified)
+
+
+def _caching_generator(cache_key, feed, generation, iterator):
+    chunks = []
+    size = 0
+    for chunk in iterator:
+        # too big to be cached, stop collecting to keep streaming
+        if chunks is not None:
+            size += len(chunk)
+            if size > FEED_CACHE.max_entry_size:
+                FEED_CACHE.statistics['too_big'] += 1
+                chunks = None
+            else:
+                chunks.append(chunk)
+
+        yield chunk
+
+    if chunks is None:
+        return
+
+    # feed changed while rendering, the result could be inconsistent
+    if _feed_generation(feed) != generation:
+        return
+
+    FEED_CACHE.put(cache_key, ''.join(chunks))
+
+
+def _set_content_encoding(response, encoding):
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.content_encoding = encoding
+
+
 _FEED_FORMATS = {
     'json': {
         'formatter': generate_json_feed,
@@ -558,16 +553,13 @@ def get_feed_content(feed):
         return '<html><body>Unauthorized</body></html>', 401
 
     # check if feed exists
-    status = MMMaster.status()
-    tr = status.get('result', None)
-    if tr is None:
-        LOG.error("Error retrieving status from MMMaster: {!r}".format(status.get('error', 'error')))
+    try:
+        nclass = NODE_REGISTRY.node_class(feed)
+
+    except RuntimeError as e:
+        LOG.error("Error retrieving status from MMMaster: {!r}".format(e))
         return '<html><body>Internal error</body></html>', 500
 
-    nname = 'mbus:slave:' + feed
-    if nname not in tr:
-        return '<html><body>Unknown feed</body></html>', 404
-    nclass = tr[nname].get('class', None)
     if nclass != 'minemeld.ft.redis.RedisSet':
         return '<html><body>Unknown feed</body></html>', 404
 
@@ -618,9 +610,44 @@ def get_feed_content(feed):
         formatter = _FEED_FORMATS[value]['formatter']
         mimetype = _FEED_FORMATS[value]['mimetype']
 
-    return Response(
-        stream_with_context(
-            formatter(feed, start, num, desc, value, **kwargs)
-        ),
-        mimetype=mimetype
-    )
+    encoding = accepted_encoding()
+
+    generation = _feed_generation(feed)
+    if generation is None:
+        body = formatter(feed, start, num, desc, value, **kwargs)
+        if encoding is not None:
+            body = compress_stream(body, encoding)
+
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        _set_content_encoding(response, encoding)
+
+        return response
+
+    # the cached content depends on the feed generation, on the content
+    # encoding and on all the request arguments
+    cache_key = (feed, generation, encoding, tuple(sorted(request.values.items(multi=True))))
+    etag = hashlib.md5(repr(cache_key)).hexdigest()
+    last_modified = datetime.utcfromtimestamp(generation[1] // 1000)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+        response.vary.add('Accept-Encoding')
+
+    else:
+        body = FEED_CACHE.get(cache_key)
+        if body is None:
+            body = formatter(feed, start, num, desc, value, **kwargs)
+            if encoding is not None:
+                body = compress_stream(body, encoding)
+
+            body = stream_with_context(
+                _caching_generator(cache_key, feed, generation, body)
+            )
+
+        response = Response(body, mimetype=mimetype)
+        _set_content_encoding(response, encoding)
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+
+    return response
@@ -0,0 +1,150 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Local registry of the nodes running in the engine.
+
+The registry maps node names to node classes and is used to check
+feed existence without a status request to the mgmtbus master for each
+HTTP request. It is kept up to date by the status events published by
+the engine on mm-engine-status.* and fully refreshed via MMMaster.status()
+when older than NODE_REGISTRY_TTL seconds or when the engine process
+changes state, to drop nodes removed from the config.
+"""
+
+import time
+from collections import defaultdict
+
+import gevent.lock
+from blinker import signal
+
+from . import config
+from .mmrpc import MMMaster
+from .logger import LOG
+
+
+__all__ = ['NODE_REGISTRY']
+
+
+class NodeRegistry(object):
+    """Cache of the class of each node.
+
+    Args:
+        ttl (int): max age in seconds of the full node list
+        miss_refresh_interval (int): min interval in seconds between
+            full refreshes triggered by lookups of unknown nodes
+    """
+    def __init__(self, ttl, miss_refresh_interval):
+        self.ttl = ttl
+        self.miss_refresh_interval = miss_refresh_interval
+
+        self.statistics = defaultdict(int)
+
+        self._nodes = None
+        self._last_refresh = 0
+        self._refresh_lock = gevent.lock.Semaphore()
+
+        self._signal = signal('mm-status')
+        self._signal.connect(self._signal_receiver)
+
+    def _signal_receiver(self, sender, data):
+        if self._nodes is None:
+            return
+
+        # engine process state changed, the config could be different
+        if sender == '<minemeld-engine>':
+            self._last_refresh = 0
+            return
+
+        status = data.get('status', None)
+        if status is None:
+            return
+
+        self._nodes[sender] = status.get('class', None)
+        self.statistics['event'] += 1
+
+    def _refresh(self):
+        status = MMMaster.status()
+        status = status.get('result', None)
+        if status is None:
+            raise RuntimeError('No result in engine status')
+
+        nodes = {}
+        for node, node_status in status.iteritems():
+            _, _, nodename = node.split(':', 2)
+            nodes[nodename] = node_status.get('class', None)
+
+        self._nodes = nodes
+        self._last_refresh = time.time()
+        self.statistics['refresh'] += 1
+
+    def _check_refresh(self, min_age):
+        if self._nodes is not None and time.time()-self._last_refresh < min_age:
+            return
+
+        last_refresh = self._last_refresh
+
+        with self._refresh_lock:
+            # another greenlet refreshed the registry while waiting
+            if self._last_refresh != last_refresh:
+                return
+
+            if self._nodes is not None and time.time()-self._last_refresh < min_age:
+                return
+
+            try:
+                self._refresh()
+
+            except Exception:
+                LOG.exception('Error refreshing node registry')
+                self.statistics['error'] += 1
+
+                if self._nodes is None:
+                    raise RuntimeError('Error retrieving engine status')
+
+                # stale data is better than no data, retry later
+                self._last_refresh = time.time()-self.ttl+self.miss_refresh_interval
+
+    def nodes(self):
+        """Returns a dictionary where keys are node names and
+        values node classes.
+
+        Raises RuntimeError if the registry can't be populated.
+        """
+        self._check_refresh(self.ttl)
+
+        return self._nodes
+
+    def node_class(self, nodename):
+        """Returns the class of the node, None if the node
+        does not exist.
+
+        Raises RuntimeError if the registry can't be populated.
+        """
+        nodes = self.nodes()
+        if nodename in nodes:
+            self.statistics['hit'] += 1
+            return nodes[nodename]
+
+        # the node could have been added since the last refresh
+        self.statistics['miss'] += 1
+        self._check_refresh(self.miss_refresh_interval)
+
+        return self._nodes.get(nodename, None)
+
+
+NODE_REGISTRY = NodeRegistry(
+    ttl=int(config.get('NODE_REGISTRY_TTL', 300)),
+    miss_refresh_interval=int(config.get('NODE_REGISTRY_MISS_REFRESH_INTERVAL', 10))
+)
@@ -35,6 +35,9 @@ from .logger import LOG
 from .jobs import JOBS_MANAGER
 from .utils import safe_remove, committed_config_path
 from .sns import SNS_OBJ, SNS_AVAILABLE
+from .feedcache import FEED_CACHE
+from .noderegistry import NODE_REGISTRY
+from . import compression
 from minemeld import __version__
 
 __all__ = ['BLUEPRINT']
@@ -73,7 +76,9 @@ class _PubSubWrapper(object):
             if message == '<EOQ>':
                 break
 
-            yield 'data: ' + message + '\n\n'
+            # a message can contain multiple newline separated events
+            for event in message.split('\n'):
+                yield 'data: ' + event + '\n\n'
 
         yield 'data: { "msg": "<EOQ>" }\n\n'
 
@@ -141,6 +146,18 @@ def get_system_info():
     return jsonify(result=res)
 
 
+@BLUEPRINT.route('/feeds', methods=['GET'], read_write=False)
+def get_feeds_status():
+    res = {}
+    res['cache'] = dict(FEED_CACHE.statistics)
+    res['cache']['entries'] = len(FEED_CACHE)
+    res['cache']['size'] = FEED_CACHE.size
+    res['compression'] = dict(compression.STATISTICS)
+    res['registry'] = dict(NODE_REGISTRY.statistics)
+
+    return jsonify(result=res, timestamp=int(time.time() * 1000))
+
+
 @BLUEPRINT.route('/minemeld', methods=['GET'], read_write=False)
 def get_minemeld_status():
     status = MMMaster.status()
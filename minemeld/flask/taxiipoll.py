@@ -13,8 +13,10 @@
 #  limitations under the License.
 
 import datetime
+import uuid
 
 import pytz
+import ujson
 import lz4.frame
 
 import libtaxii
@@ -24,9 +26,11 @@ import stix.core
 from flask import request, Response, stream_with_context
 from flask.ext.login import current_user
 
+from . import config
 from .redisclient import SR
 from .taxiiutils import taxii_check, get_taxii_feeds
 from .aaa import MMBlueprint
+from .compression import accepted_encoding, compress_stream
 from .logger import LOG
 from minemeld.ft.utils import dt_to_millisec
 
@@ -36,9 +40,20 @@ __all__ = ['BLUEPRINT']
 
 BLUEPRINT = MMBlueprint('taxiipoll', __name__, url_prefix='')
 
+# number of content blocks retrieved from Redis per request
+POLL_PAGE_SIZE = int(config.get('TAXII_POLL_PAGE_SIZE', 1000))
+# max number of content blocks in a Poll Response, 0 to disable
+# pagination of poll results. Disabled by default, clients not
+# sending Poll Fulfillment requests would get only the first part
+POLL_PART_SIZE = int(config.get('TAXII_POLL_PART_SIZE', 0))
+# seconds a poll result can be fulfilled after the last part
+POLL_RESULT_TTL = int(config.get('TAXII_POLL_RESULT_TTL', 3600))
+
+_POLL_RESULT_PREFIX = 'mm-taxii-poll-result:'
+
 
 _TAXII_POLL_RESPONSE_HEADER = """
-<taxii_11:Poll_Response xmlns:taxii="http://taxii.mitre.org/messages/taxii_xml_binding-1" xmlns:taxii_11="http://taxii.mitre.org/messages/taxii_xml_binding-1.1" xmlns:tdq="http://taxii.mitre.org/query/taxii_default_query-1" message_id="%(message_id)s" in_response_to="%(in_response_to)s" collection_name="%(collection_name)s" more="false" result_part_number="1">
+<taxii_11:Poll_Response xmlns:taxii="http://taxii.mitre.org/messages/taxii_xml_binding-1" xmlns:taxii_11="http://taxii.mitre.org/messages/taxii_xml_binding-1.1" xmlns:tdq="http://taxii.mitre.org/query/taxii_default_query-1" message_id="%(message_id)s" in_response_to="%(in_response_to)s" collection_name="%(collection_name)s" more="%(more)s"%(result_id)s result_part_number="%(result_part_number)d">
 <taxii_11:Inclusive_End_Timestamp>%(inclusive_end_timestamp_label)s</taxii_11:Inclusive_End_Timestamp>
 """
 
@@ -56,51 +71,139 @@ def _oldest_indicator_timestamp(feed):
     return datetime.datetime.fromtimestamp(ots, pytz.utc)
 
 
-def _indicators_feed(feed, excbegtime, incendtime):
-    if excbegtime is None:
-        excbegtime = 0
-    else:
-        excbegtime = dt_to_millisec(excbegtime) + 1
-    incendtime = dt_to_millisec(incendtime)
+def _legacy_content_block(value):
+    # values stored before content blocks were pre-rendered
+    # by the DataFeed node
+    if value.startswith('lz4'):
+        try:
+            value = lz4.frame.decompress(value[3:])
+            value = stix.core.STIXPackage.from_json(value)
+            value = value.to_xml(
+                ns_dict={'https://go.paloaltonetworks.com/minemeld': 'minemeld'}
+            )
+
+        except ValueError:
+            return None
+
+    cb1 = libtaxii.messages_11.ContentBlock(
+        content_binding=libtaxii.constants.CB_STIX_XML_11,
+        content=value
+    )
+    return cb1.to_xml()+'\n'
+
+
+def _content_blocks(feed, indicators):
+    for j in range(0, len(indicators), POLL_PAGE_SIZE):
+        page = indicators[j:j+POLL_PAGE_SIZE]
+
+        for value in SR.hmget(feed + '.value', page):
+            if value is None:
+                # removed in the meantime
+                continue
+
+            if value.startswith('lz4cb'):
+                yield lz4.frame.decompress(value[5:])
+                continue
+
+            value = _legacy_content_block(value)
+            if value is not None:
+                yield value
+
 
+def _content_blocks_feed(feed, excbegtime, incendtime):
     cstart = 0
     while True:
         indicators = SR.zrangebyscore(
             feed, excbegtime, incendtime,
-            start=cstart, num=100
+            start=cstart, num=POLL_PAGE_SIZE
         )
-        if indicators is None:
+        if indicators is None or len(indicators) == 0:
             break
 
-        for i in indicators:
-            value = SR.hget(feed + '.value', i)
+        for cb in _content_blocks(feed, indicators):
+            yield cb
 
-            if value.startswith('lz4'):
-                try:
-                    value = lz4.frame.decompress(value[3:])
-                    value = stix.core.STIXPackage.from_json(value)
-                    value = value.to_xml(
-                        ns_dict={'https://go.paloaltonetworks.com/minemeld': 'minemeld'}
-                    )
+        if len(indicators) < POLL_PAGE_SIZE:
+            break
 
-                except ValueError:
-                    continue
+        cstart += POLL_PAGE_SIZE
 
-            yield value
 
-        if len(indicators) < 100:
-            break
+def _part_indicators(feed, cursor, incendtime):
+    """Returns up to POLL_PART_SIZE+1 (indicator, score) tuples of the
+    part starting after *cursor*.
 
-        cstart += 100
+    *cursor* is a list with the min score and the last indicator
+    delivered with that score, None for the first part. Indicators
+    with the same score are sorted by value in the sorted set, this
+    keeps the cursor valid if indicators are aged out between parts.
+    """
+    min_score, last_indicator = cursor
 
+    result = []
+    cstart = 0
+    while len(result) <= POLL_PART_SIZE:
+        page = SR.zrangebyscore(
+            feed, min_score, incendtime,
+            start=cstart, num=POLL_PAGE_SIZE,
+            withscores=True
+        )
+        for indicator, score in page:
+            if last_indicator is not None and score == min_score and \
+               indicator <= last_indicator:
+                continue
 
-def data_feed_11(rmsgid, cname, excbegtime, incendtime):
-    tfeeds = get_taxii_feeds()
-    if cname not in tfeeds:
-        return 'Invalid message, unknown feed', 400
+            result.append((indicator, score))
+            if len(result) > POLL_PART_SIZE:
+                break
 
-    if not incendtime:
-        incendtime = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
+        if len(page) < POLL_PAGE_SIZE:
+            break
+
+        cstart += POLL_PAGE_SIZE
+
+    return result
+
+
+def _poll_response(rmsgid, cname, excbegtime, incendtime, incendtime_ms,
+                   result_id=None, part_number=1, cursor=None):
+    """Streams a Poll Response.
+
+    Args:
+        rmsgid (str): message id of the request
+        cname (str): collection name
+        excbegtime (str): exclusive begin timestamp label, or None
+        incendtime (str): inclusive end timestamp label
+        incendtime_ms (int): inclusive end timestamp in millisec
+        result_id (str): result id, if None the result is not paginated
+        part_number (int): result part number
+        cursor (list): start of the part
+    """
+    more = False
+    indicators = None
+    if result_id is not None:
+        indicators = _part_indicators(cname, cursor, incendtime_ms)
+
+        if len(indicators) > POLL_PART_SIZE:
+            more = True
+            indicators = indicators[:POLL_PART_SIZE]
+
+            # save the cursor of the next part
+            rkey = _POLL_RESULT_PREFIX + result_id
+            with SR.pipeline() as p:
+                p.hmset(rkey, {
+                    'collection': cname,
+                    'excbegtime': excbegtime if excbegtime is not None else '',
+                    'incendtime': incendtime,
+                    'incendtime_ms': incendtime_ms,
+                    'part:{}'.format(part_number+1): ujson.dumps(
+                        [indicators[-1][1], indicators[-1][0]]
+                    )
+                })
+                p.expire(rkey, POLL_RESULT_TTL)
+                p.execute()
+
+        indicators = [i for i, _ in indicators]
 
     def _resp_generator():
         # yield the opening tag of the Poll Response
@@ -108,45 +211,116 @@ def data_feed_11(rmsgid, cname, excbegtime, incendtime):
             'collection_name': cname,
             'message_id': libtaxii.messages_11.generate_message_id(),
             'in_response_to': rmsgid,
-            'inclusive_end_timestamp_label': incendtime.isoformat()
+            'more': 'true' if more else 'false',
+            'result_id': ' result_id="{}"'.format(result_id) if result_id is not None else '',
+            'result_part_number': part_number,
+            'inclusive_end_timestamp_label': incendtime
         }
         if excbegtime is not None:
             resp_header += (
                 '<taxii_11:Exclusive_Begin_Timestamp>' +
-                excbegtime.isoformat() +
+                excbegtime +
                 '</taxii_11:Exclusive_Begin_Timestamp>'
             )
 
         yield resp_header
 
-        # yield the content blocks
-        for i in _indicators_feed(cname, excbegtime, incendtime):
-            cb1 = libtaxii.messages_11.ContentBlock(
-                content_binding=libtaxii.constants.CB_STIX_XML_11,
-                content=i
-            )
-            yield cb1.to_xml()+'\n'
+        # yield the content blocks, pre-rendered by the DataFeed node
+        if indicators is None:
+            blocks = _content_blocks_feed(cname, cursor[0], incendtime_ms)
+        else:
+            blocks = _content_blocks(cname, indicators)
+        for cb in blocks:
+            yield cb
 
         # yield the closing tag
         yield '</taxii_11:Poll_Response>'
 
+    headers = {
+        'X-TAXII-Content-Type': 'urn:taxii.mitre.org:message:xml:1.1',
+        'X-TAXII-Protocol': 'urn:taxii.mitre.org:protocol:http:1.0',
+        'Vary': 'Accept-Encoding'
+    }
+
+    body = _resp_generator()
+    encoding = accepted_encoding()
+    if encoding is not None:
+        body = compress_stream(body, encoding)
+        headers['Content-Encoding'] = encoding
+
     return Response(
-        response=stream_with_context(_resp_generator()),
+        response=stream_with_context(body),
         status=200,
-        headers={
-            'X-TAXII-Content-Type': 'urn:taxii.mitre.org:message:xml:1.1',
-            'X-TAXII-Protocol': 'urn:taxii.mitre.org:protocol:http:1.0'
-        },
+        headers=headers,
         mimetype='application/xml'
     )
 
 
+def data_feed_11(rmsgid, cname, excbegtime, incendtime):
+    tfeeds = get_taxii_feeds()
+    if cname not in tfeeds:
+        return 'Invalid message, unknown feed', 400
+
+    if not incendtime:
+        incendtime = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
+
+    min_score = 0
+    if excbegtime is not None:
+        min_score = dt_to_millisec(excbegtime) + 1
+        excbegtime = excbegtime.isoformat()
+
+    result_id = None
+    if POLL_PART_SIZE > 0:
+        result_id = str(uuid.uuid4())
+
+    return _poll_response(
+        rmsgid, cname,
+        excbegtime, incendtime.isoformat(), dt_to_millisec(incendtime),
+        result_id=result_id,
+        part_number=1,
+        cursor=[min_score, None]
+    )
+
+
+def poll_fulfillment_11(rmsgid, cname, result_id, part_number):
+    presult = SR.hgetall(_POLL_RESULT_PREFIX + result_id)
+    if not presult or presult.get('collection', None) != cname:
+        return 'Invalid message, unknown result', 400
+
+    cursor = presult.get('part:{}'.format(part_number), None)
+    if cursor is None:
+        return 'Invalid message, unknown result part', 400
+
+    excbegtime = presult.get('excbegtime', None)
+    if not excbegtime:
+        excbegtime = None
+
+    return _poll_response(
+        rmsgid, cname,
+        excbegtime, presult['incendtime'], int(presult['incendtime_ms']),
+        result_id=result_id,
+        part_number=part_number,
+        cursor=ujson.loads(cursor)
+    )
+
+
 @BLUEPRINT.route('/taxii-poll-service', methods=['POST'], feeds=True, read_write=False)
 @taxii_check
 def taxii_poll_service():
     taxiict = request.headers['X-TAXII-Content-Type']
     if taxiict == 'urn:taxii.mitre.org:message:xml:1.1':
         tm = libtaxii.messages_11.get_message_from_xml(request.data)
+        if tm.message_type == libtaxii.constants.MSG_POLL_FULFILLMENT_REQUEST:
+            if not current_user.check_feed(tm.collection_name):
+                return 'Unauthorized', 401
+
+            return poll_fulfillment_11(
+                tm.message_id,
+                tm.collection_name,
+                tm.result_id,
+                tm.result_part_number
+            )
+
         if tm.message_type != libtaxii.constants.MSG_POLL_REQUEST:
             return 'Invalid message', 400
 
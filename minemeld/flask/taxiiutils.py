@@ -17,7 +17,7 @@ import functools
 from flask import request
 from flask import make_response
 
-from .mmrpc import MMMaster
+from .noderegistry import NODE_REGISTRY
 from .logger import LOG
 
 
@@ -67,19 +67,11 @@ def taxii_check(f):
 
 
 def get_taxii_feeds():
-    # check if feed exists
-    status = MMMaster.status()
-    status = status.get('result', None)
-    if status is None:
-        raise RuntimeError('Error retrieving engine status')
-
     result = []
-    for node, node_status in status.iteritems():
-        class_ = node_status.get('class', None)
+    for nodename, class_ in NODE_REGISTRY.nodes().iteritems():
         if class_ != 'minemeld.ft.taxii.DataFeed':
             continue
 
-        _, _, feedname = node.split(':', 2)
-        result.append(feedname)
+        result.append(nodename)
 
     return result
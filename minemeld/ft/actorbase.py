@@ -2,6 +2,7 @@ import logging
 from collections import namedtuple
 
 import gevent
+import gevent.event
 from gevent.queue import Queue
 
 from minemeld.ft.base import BaseFT, _counting
@@ -31,6 +32,15 @@ class ActorBaseFT(BaseFT):
     def update(self, **kwargs):
         self._actor_queue.put(ActorCommand(command='update', kwargs_=kwargs))
 
+    def update_bulk(self, **kwargs):
+        super(ActorBaseFT, self).update_bulk(**kwargs)
+
+        # the reply is the flow control of the bulk stream, return
+        # only when the actor has processed the whole chunk
+        done = gevent.event.Event()
+        self._actor_queue.put(ActorCommand(command='barrier', kwargs_={'event': done}))
+        done.wait()
+
     @_counting('withdraw.queued')
     def withdraw(self, **kwargs):
         self._actor_queue.put(ActorCommand(command='withdraw', kwargs_=kwargs))
@@ -47,6 +57,8 @@ class ActorBaseFT(BaseFT):
                 method = super(ActorBaseFT, self).withdraw
             elif acommand.command == 'rebuild':
                 method = self._rebuild
+            elif acommand.command == 'barrier':
+                method = self._barrier
             else:
                 LOG.error('{} - unknown command {}'.format(self.name, acommand.command))
 
@@ -57,6 +69,9 @@ class ActorBaseFT(BaseFT):
             except:
                 LOG.exception('{} - error executing {!r}'.format(self.name, acommand))
 
+    def _barrier(self, event):
+        event.set()
+
     def start(self):
         super(ActorBaseFT, self).start()
 
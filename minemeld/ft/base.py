@@ -21,6 +21,9 @@ from __future__ import absolute_import
 import logging
 import copy
 import os
+import re
+import time
+import operator
 import collections
 import json
 
@@ -33,29 +36,120 @@ from . import utils
 
 LOG = logging.getLogger(__name__)
 
+# max number of indicators per call in bulk transfers
+BULK_CHUNK_SIZE = 1000
+
+
+class _FilterContext(object):
+    """Message evaluated by a filter set.
+
+    The dictionary with the special attributes used by JMESPath
+    conditions is built only when one of them is evaluated.
+    """
+    __slots__ = ['origin', 'method', 'indicator', 'value', '_document']
+
+    def __init__(self, origin, method, indicator, value):
+        self.origin = origin
+        self.method = method
+        self.indicator = indicator
+        self.value = value
+        self._document = None
+
+    def document(self):
+        if self._document is not None:
+            return self._document
+
+        if self.value is None:
+            d = {}
+        else:
+            d = copy.copy(self.value)
+
+        if self.indicator is not None:
+            d['__indicator'] = self.indicator
+
+        if self.method is not None:
+            d['__method'] = self.method
+
+        if self.origin is not None:
+            d['__origin'] = self.origin
+
+        self._document = d
+        return d
+
+
+# special attributes and the corresponding _FilterContext slot
+_SPECIAL_ATTRIBUTES = {
+    '__indicator': 'indicator',
+    '__method': 'method',
+    '__origin': 'origin'
+}
+
+
+def _compile_condition(c):
+    """Compiles a condition into a function of a _FilterContext.
+
+    Conditions on simple fields are evaluated with direct key lookups,
+    JMESPath is used only for the other expressions.
+    """
+    comparator = c.comparator
+    cvalue = c.value
+
+    if c.field is None:
+        return lambda ctx: comparator(c.search(ctx.document()), cvalue)
+
+    slot = _SPECIAL_ATTRIBUTES.get(c.field, None)
+    if slot is not None:
+        getter = operator.attrgetter(slot)
+        return lambda ctx: comparator(getter(ctx), cvalue)
+
+    field = c.field
+    lookup = condition.lookup
+    return lambda ctx: comparator(lookup(ctx.value, field), cvalue)
+
 
 class _Filters(object):
     """Implements a set of filters to be applied to indicators.
     Used by mineneld.ft.base.BaseFT for ingress and egress filters.
 
+    Conditions are compiled once, the indicator value is returned as is
+    and copied only if a condition needs a JMESPath evaluation.
+
+    The number of hits and the total evaluation time in microseconds of
+    each filter are counted in *statistics*, as *<prefix>.<name>.hit*
+    and *<prefix>.<name>.time_us*.
+
     Args:
         filters (list): list of filters.
+        statistics (dict): counters, a new defaultdict if None
+        prefix (str): prefix of the counters
     """
-    def __init__(self, filters):
+    def __init__(self, filters, statistics=None, prefix='filter'):
         self.filters = []
 
+        if statistics is None:
+            statistics = collections.defaultdict(int)
+        self.statistics = statistics
+
         for f in filters:
+            name = f.get('name', 'filter_%d' % len(self.filters))
+            metric = '%s.%s' % (prefix, re.sub('[^a-zA-Z0-9]', '_', name))
+
             cf = {
-                'name': f.get('name', 'filter_%d' % len(self.filters)),
+                'name': name,
                 'conditions': [],
-                'actions': []
+                'compiled': [],
+                'actions': [],
+                'hit_metric': metric+'.hit',
+                'time_metric': metric+'.time_us'
             }
 
             fconditions = f.get('conditions', None)
             if fconditions is None:
                 fconditions = []
             for c in fconditions:
-                cf['conditions'].append(condition.Condition(c))
+                c = condition.Condition(c)
+                cf['conditions'].append(c)
+                cf['compiled'].append(_compile_condition(c))
 
             for a in f.get('actions'):
                 cf['actions'].append(a)
@@ -63,54 +157,38 @@ class _Filters(object):
             self.filters.append(cf)
 
     def apply(self, origin=None, method=None, indicator=None, value=None):
-        if value is None:
-            d = {}
-        else:
-            d = copy.copy(value)
-
-        if indicator is not None:
-            d['__indicator'] = indicator
+        if len(self.filters) == 0:
+            return indicator, value
 
-        if method is not None:
-            d['__method'] = method
-
-        if origin is not None:
-            d['__origin'] = origin
+        ctx = _FilterContext(origin, method, indicator, value)
+        statistics = self.statistics
 
         for f in self.filters:
             LOG.debug("evaluating filter %s", f['name'])
 
+            t0 = time.time()
             r = True
-            for c in f['conditions']:
-                r &= c.eval(d)
+            for c in f['compiled']:
+                if not c(ctx):
+                    r = False
+                    break
+            statistics[f['time_metric']] += (time.time()-t0)*1000000
 
             if not r:
                 continue
 
+            statistics[f['hit_metric']] += 1
+
             for a in f['actions']:
                 if a == 'accept':
-                    if value is None:
-                        return indicator, None
-
-                    d.pop('__indicator')
-                    d.pop('__origin', None)
-                    d.pop('__method', None)
-
-                    return indicator, d
+                    return indicator, value
 
                 elif a == 'drop':
                     return None, None
 
         LOG.debug("no matching filter, default accept")
 
-        if value is None:
-            return indicator, None
-
-        d.pop('__indicator')
-        d.pop('__origin', None)
-        d.pop('__method', None)
-
-        return indicator, d
+        return indicator, value
 
 
 def _counting(statsname):
@@ -158,6 +236,11 @@ class BaseFT(object):
         :__method: the method of the message, **update** or **withdraw**.
         :__origin: the name of the node who sent the indicator.
 
+        The number of hits and the evaluation time of each filter are
+        reported in the node statistics as *infilter.<name>.hit* and
+        *infilter.<name>.time_us* (*outfilter.* for outbound filters),
+        with non alphanumeric characters in the name replaced by *_*.
+
     **Condition**
         A condition in the filter, is boolean expression composed by a JMESPath
         expression, an operator (<, <=, ==, >=, >, !=) and a value.
@@ -196,13 +279,14 @@ class BaseFT(object):
 
         self._original_config = copy.deepcopy(config)
         self.config = config
+
+        self.statistics = collections.defaultdict(int)
+
         self.configure()
 
         self.inputs = []
         self.output = None
 
-        self.statistics = collections.defaultdict(int)
-
         self.read_checkpoint()
 
         self.chassis.request_mgmtbus_channel(self)
@@ -311,10 +395,17 @@ class BaseFT(object):
             'config': self._original_config
         }
 
+        try:
+            # used by the placement planner to estimate traffic
+            length = self.length()
+        except:
+            length = None
+
         contents = {
             'checkpoint': value,
             'config': json.dumps(config, sort_keys=True),
-            'state': self._saved_state_create()
+            'state': self._saved_state_create(),
+            'length': length
         }
 
         with open(self.name+'.chkp', 'w') as f:
@@ -342,8 +433,16 @@ class BaseFT(object):
         When this method is changed to add/remove new parameters, the class
         docstring should be updated.
         """
-        self.infilters = _Filters(self.config.get('infilters', []))
-        self.outfilters = _Filters(self.config.get('outfilters', []))
+        self.infilters = _Filters(
+            self.config.get('infilters', []),
+            statistics=self.statistics,
+            prefix='infilter'
+        )
+        self.outfilters = _Filters(
+            self.config.get('outfilters', []),
+            statistics=self.statistics,
+            prefix='outfilter'
+        )
 
     def connect(self, inputs, output):
         if self.state != ft_states.READY:
@@ -369,6 +468,7 @@ class BaseFT(object):
             self,
             allowed_methods=[
                 'update',
+                'update_bulk',
                 'withdraw',
                 'checkpoint',
                 'get',
@@ -400,6 +500,19 @@ class BaseFT(object):
         return self.chassis.send_rpc(self.name, dftname, method, kwargs,
                                      block=block, timeout=timeout)
 
+    def do_rpc_bulk(self, dftname, method, items,
+                    chunk_size=BULK_CHUNK_SIZE, timeout=30):
+        return self.chassis.send_rpc_bulk(self.name, dftname, method, items,
+                                          chunk_size=chunk_size,
+                                          timeout=timeout)
+
+    def send_updates(self, dftname, updates):
+        """Sends the (indicator, value) tuples from *updates* to
+        node *dftname* as a bulk stream of updates. Used to answer
+        get_all and get_range.
+        """
+        return self.do_rpc_bulk(dftname, 'update_bulk', updates)
+
     @_counting('update.tx')
     def emit_update(self, indicator, value):
         if self.output is None:
@@ -417,10 +530,12 @@ class BaseFT(object):
         if indicator is None:
             return
 
+        # filters return the value as is, strip the private
+        # attributes in a new dict
         if value is not None:
-            for k in value.keys():
-                if k[0] in ['_', '$']:
-                    value.pop(k)
+            value = {
+                k: v for k, v in value.iteritems() if k[0] not in ['_', '$']
+            }
 
         self.output.publish("update", {
             'source': self.name,
@@ -445,10 +560,12 @@ class BaseFT(object):
         if indicator is None:
             return
 
+        # filters return the value as is, strip the private
+        # attributes in a new dict
         if value is not None:
-            for k in value.keys():
-                if k[0] in ['_', '$']:
-                    value.pop(k)
+            value = {
+                k: v for k, v in value.iteritems() if k[0] not in ['_', '$']
+            }
 
         self.output.publish("withdraw", {
             'source': self.name,
@@ -516,6 +633,24 @@ class BaseFT(object):
     def filtered_update(self, source=None, indicator=None, value=None):
         raise NotImplementedError('%s: update' % self.name)
 
+    @_counting('update_bulk.rx')
+    def update_bulk(self, source=None, items=None, eos=False):
+        """Receives a chunk of a bulk stream of updates, see
+        send_updates.
+
+        The reply to the sender is the flow control of the stream,
+        subclasses that process updates asynchronously should return
+        only when the chunk has been processed.
+        """
+        if items is None:
+            items = []
+
+        for indicator, value in items:
+            self.update(source=source, indicator=indicator, value=value)
+
+        if eos:
+            LOG.info('%s - end of bulk updates from %s', self.name, source)
+
     @_counting('withdraw.rx')
     def withdraw(self, source=None, indicator=None, value=None):
         LOG.debug('%s {%s} - withdraw from %s value %s',
@@ -20,6 +20,7 @@ miners retrieving indicators by periodically polling an external source.
 import logging
 import copy
 import random
+import itertools
 import collections
 import sys
 import shutil
@@ -41,11 +42,30 @@ _MAX_AGE_OUT = ((1 << 32)-1)*1000  # 2106-02-07 6:28:15
 
 
 class _BaseBPTable(object):
-    def __init__(self, table):
+    """Wrapper around the Table of a polling miner.
+
+    If *run_marks* is True, the last run an indicator has been seen in
+    the feed can be updated with `touch`, without rewriting the value and
+    the indexes of the indicator. The run mark is merged into the
+    *_last_run* attribute of the values returned by `get` and `query`,
+    while the *_last_run* index still reflects the last `put`.
+    """
+    def __init__(self, table, run_marks=False):
         self.table = table
+        self.run_marks = run_marks
+
+    def _merge_run_mark(self, key, value):
+        if value is None or not self.run_marks:
+            return value
+
+        mark = self.table.get_mark(key)
+        if mark is not None and mark > value.get('_last_run', 0):
+            value['_last_run'] = mark
+
+        return value
 
     def get(self, indicator, itype=None):
-        return self.table.get(indicator)
+        return self._merge_run_mark(indicator, self.table.get(indicator))
 
     def delete(self, indicator, itype=None):
         self.table.delete(indicator)
@@ -53,9 +73,33 @@ class _BaseBPTable(object):
     def put(self, indicator, value):
         self.table.put(indicator, value)
 
+    def touch(self, indicator, last_run, itype=None):
+        return self.table.touch(indicator, last_run)
+
     def query(self, *args, **kwargs):
+        if self.run_marks and kwargs.get('include_value', False):
+            return self._query_with_run_marks(*args, **kwargs)
+
         return self.table.query(*args, **kwargs)
 
+    def _query_with_run_marks(self, *args, **kwargs):
+        for key, value in self.table.query(*args, **kwargs):
+            yield key, self._merge_run_mark(key, value)
+
+    def query_run_marks(self, to_run):
+        """Returns an iterator over (indicator, value) of the indicators
+        touched last time in a run up to *to_run*.
+        """
+        for key in self.table.query_marks(to_run):
+            value = self._merge_run_mark(key, self.table.get(key))
+            if value is None:
+                continue
+
+            yield self._key_indicator(key), value
+
+    def _key_indicator(self, key):
+        return key
+
     def length(self):
         return self.table.num_indicators
 
@@ -67,8 +111,8 @@ class _BaseBPTable(object):
 
 
 class _BPTable_v0(_BaseBPTable):
-    def __init__(self, table):
-        super(_BPTable_v0, self).__init__(table)
+    def __init__(self, table, run_marks=False):
+        super(_BPTable_v0, self).__init__(table, run_marks=run_marks)
 
         self.table.create_index('_age_out')
         self.table.create_index('_withdrawn')
@@ -76,8 +120,8 @@ class _BPTable_v0(_BaseBPTable):
 
 
 class _BPTable_v1(_BaseBPTable):
-    def __init__(self, table, type_in_key):
-        super(_BPTable_v1, self).__init__(table)
+    def __init__(self, table, type_in_key, run_marks=False):
+        super(_BPTable_v1, self).__init__(table, run_marks=run_marks)
 
         self.table.create_index('_age_out')
         self.table.create_index('_withdrawn')
@@ -97,7 +141,7 @@ class _BPTable_v1(_BaseBPTable):
         if self.type_in_key:
             indicator = self._type_key(indicator, itype)
 
-        return self.table.get(indicator)
+        return self._merge_run_mark(indicator, self.table.get(indicator))
 
     def delete(self, indicator, itype=None):
         if self.type_in_key:
@@ -112,9 +156,15 @@ class _BPTable_v1(_BaseBPTable):
 
         return self.table.put(indicator, value)
 
+    def touch(self, indicator, last_run, itype=None):
+        if self.type_in_key:
+            indicator = self._type_key(indicator, itype)
+
+        return self.table.touch(indicator, last_run)
+
     def query(self, *args, **kwargs):
         if not self.type_in_key:
-            return self.table.query(*args, **kwargs)
+            return super(_BPTable_v1, self).query(*args, **kwargs)
 
         if kwargs.get('include_value', False):
             return self._type_key_query_with_value(*args, **kwargs)
@@ -127,6 +177,7 @@ class _BPTable_v1(_BaseBPTable):
 
     def _type_key_query_with_value(self, *args, **kwargs):
         for key, value in self.table.query(*args, **kwargs):
+            value = self._merge_run_mark(key, value)
             yield self._type_key_indicator(key), value
 
     def _type_key(self, indicator, itype):
@@ -138,8 +189,14 @@ class _BPTable_v1(_BaseBPTable):
     def _type_key_indicator(self, key):
         return key.split('::', 1)[1]
 
+    def _key_indicator(self, key):
+        if self.type_in_key:
+            return self._type_key_indicator(key)
+
+        return key
+
 
-def _bptable_factory(name, truncate=False, type_in_key=False):
+def _bptable_factory(name, truncate=False, type_in_key=False, run_marks=False):
     table = Table(name, truncate=truncate)
 
     metadata = table.get_custom_metadata()
@@ -149,7 +206,7 @@ def _bptable_factory(name, truncate=False, type_in_key=False):
             raise RuntimeError('{} - table with metadata but no version'.format(name))
 
         if version == 1:
-            return _BPTable_v1(table, type_in_key=type_in_key)
+            return _BPTable_v1(table, type_in_key=type_in_key, run_marks=run_marks)
 
         raise RuntimeError('{} - table with unknown version: {}'.format(name, version))
 
@@ -158,10 +215,10 @@ def _bptable_factory(name, truncate=False, type_in_key=False):
         if type_in_key:
             raise RuntimeError('Old BPtable0 can\'t be used with multiple indicator types')
 
-        return _BPTable_v0(table)
+        return _BPTable_v0(table, run_marks=run_marks)
 
     # new table
-    return _BPTable_v1(table, type_in_key=type_in_key)
+    return _BPTable_v1(table, type_in_key=type_in_key, run_marks=run_marks)
 
 
 class IndicatorStatus(object):
@@ -311,6 +368,10 @@ class BasePollerFT(base.BaseFT):
         self.last_run = None
         self.last_successful_run = None
         self.last_ageout_run = None
+        # _last_run index entries below this run have been
+        # already checked by _sudden_death
+        self._sudden_death_from = None
+        self.conditional_request = None
         self._sub_state = None
         self._sub_state_message = None
 
@@ -354,22 +415,34 @@ class BasePollerFT(base.BaseFT):
             'last_successful_run',
             None
         )
+        if self.conditional_request is not None:
+            self.conditional_request.restore(
+                saved_state.get('conditional_request', None)
+            )
 
     def _saved_state_create(self):
-        return {
+        sstate = {
             'last_run': self.last_run,
             'last_successful_run': self.last_successful_run
         }
+        if self.conditional_request is not None:
+            sstate['conditional_request'] = self.conditional_request.create()
+
+        return sstate
 
     def _saved_state_reset(self):
         self.last_successful_run = None
         self.last_run = None
+        if self.conditional_request is not None:
+            self.conditional_request.reset()
 
     def _initialize_table(self, truncate=False):
+        self._sudden_death_from = None
         self.table = _bptable_factory(
             self.name,
             truncate=truncate,
-            type_in_key=self.multiple_indicator_types
+            type_in_key=self.multiple_indicator_types,
+            run_marks=True
         )
 
     def initialize(self):
@@ -446,6 +519,11 @@ class BasePollerFT(base.BaseFT):
             if self.state != ft_states.STARTED:
                 return
 
+            # indicators are withdrawn, the next poll should process
+            # the feed even if it did not change
+            if self.conditional_request is not None:
+                self.conditional_request.reset()
+
             try:
                 now = utc_millisec()
 
@@ -479,15 +557,30 @@ class BasePollerFT(base.BaseFT):
 
             LOG.debug('checking sudden death for %d', self.last_successful_run)
 
-            for i, v in self.table.query(index='_last_run',
-                                         to_key=self.last_successful_run-1,
-                                         include_value=True):
+            # the _last_run index is not updated by touch: indicators
+            # put since the last check are scanned via the index,
+            # touched indicators via their run marks
+            candidates = itertools.chain(
+                self.table.query(index='_last_run',
+                                 from_key=self._sudden_death_from,
+                                 to_key=self.last_successful_run-1,
+                                 include_value=True),
+                self.table.query_run_marks(self.last_successful_run-1)
+            )
+
+            for i, v in candidates:
+                # indicators touched after the last put
+                if v['_last_run'] >= self.last_successful_run:
+                    continue
+
                 LOG.debug('%s - %s %s sudden death', self.name, i, v)
 
                 v['_age_out'] = self.last_successful_run-1
                 self.table.put(i, v)
                 self.statistics['removed'] += 1
 
+            self._sudden_death_from = self.last_successful_run
+
     def _collect_garbage(self):
         now = utc_millisec()
 
@@ -666,20 +759,30 @@ class BasePollerFT(base.BaseFT):
                         LOG.debug('%s - added %s %s', self.name, indicator, v)
 
                     elif istatus.state == IndicatorStatus.XFNANW:
-                        v = istatus.cv
+                        cv = istatus.cv
 
-                        eq = self._compare_attributes(v, attributes)
+                        eq = self._compare_attributes(cv, attributes)
 
-                        old_last_run = v['_last_run']
-                        v['_last_run'] = now
+                        old_last_run = cv['_last_run']
+                        cv['_last_run'] = now
 
                         v = self._update_attributes(
-                            v, attributes,
+                            cv, attributes,
                             old_last_run, now
                         )
 
                         v['_age_out'] = self._calc_age_out(indicator, v)
 
+                        # unchanged indicator, just mark it as seen
+                        # in this run
+                        if eq and v == cv:
+                            self.table.touch(
+                                indicator, now,
+                                itype=v.get('type', None)
+                            )
+                            self.statistics['touched'] += 1
+                            continue
+
                         self.table.put(indicator, v)
 
                         # emit updates if different and not aged out
@@ -688,8 +791,10 @@ class BasePollerFT(base.BaseFT):
 
                     elif istatus.state == IndicatorStatus.XFXANW:
                         v = istatus.cv
-                        v['_last_run'] = now
-                        self.table.put(indicator, v)
+                        self.table.touch(
+                            indicator, now,
+                            itype=v.get('type', None)
+                        )
 
                     elif istatus.state in [IndicatorStatus.XFXAXW,
                                            IndicatorStatus.XFNAXW]:
@@ -949,6 +1054,10 @@ class BasePollerFT(base.BaseFT):
 
     def hup(self, source=None):
         LOG.info('%s - hup received, force polling', self.name)
+        # side config could have changed, process the feed
+        # even if not modified
+        if self.conditional_request is not None:
+            self.conditional_request.reset()
         self.poll_event.set()
 
     def length(self, source=None):
@@ -1,4 +1,4 @@
 from .BoolExprParser import BoolExprParser  # noqa
 from .BoolExprLexer import BoolExprLexer  # noqa
 from .BoolExprListener import BoolExprListener  # noqa
-from .interface import Condition  # noqa
+from .interface import Condition, lookup  # noqa
@@ -12,6 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import re
 import jmespath
 import logging
 import antlr4
@@ -24,10 +25,35 @@ from .BoolExprListener import BoolExprListener  # noqa
 
 LOG = logging.getLogger(__name__)
 
+# expressions made of a single identifier are evaluated
+# with a direct key lookup instead of JMESPath
+_FIELD_RE = re.compile('^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def lookup(i, field):
+    """Returns the value of *field* in *i*, with the same
+    semantics as the equivalent JMESPath expression.
+    """
+    try:
+        r = i.get(field)
+    except AttributeError:
+        return None
+
+    # XXX this is a workaround for a bug in JMESPath
+    if r == 'null':
+        r = None
+
+    return r
+
 
 class _BECompiler(BoolExprListener):
     def exitExpression(self, ctx):
-        self.expression = jmespath.compile(ctx.getText())
+        expression = ctx.getText()
+        self.expression = jmespath.compile(expression)
+
+        self.field = None
+        if _FIELD_RE.match(expression) is not None:
+            self.field = expression
 
     def exitComparator(self, ctx):
         comparator = ctx.getText()
@@ -58,8 +84,19 @@ class _BECompiler(BoolExprListener):
 
 
 class Condition(object):
+    """Boolean expression composed by a JMESPath expression,
+    a comparator and a value.
+
+    If the expression is a simple field reference (like *type*) the
+    field is read directly and its name is stored in *field*,
+    otherwise *field* is None.
+
+    Args:
+        s (str): the boolean expression
+    """
     def __init__(self, s):
-        self.expression, self.comparator, self.value = self._parse_boolexpr(s)
+        self.expression, self.field, self.comparator, self.value = \
+            self._parse_boolexpr(s)
 
     def _parse_boolexpr(self, s):
         lexer = BoolExprLexer(
@@ -73,9 +110,12 @@ class Condition(object):
         walker = antlr4.ParseTreeWalker()
         walker.walk(eb, tree)
 
-        return eb.expression, eb.comparator, eb.value
+        return eb.expression, eb.field, eb.comparator, eb.value
+
+    def search(self, i):
+        if self.field is not None:
+            return lookup(i, self.field)
 
-    def eval(self, i):
         try:
             r = self.expression.search(i)
         except jmespath.exceptions.JMESPathError:
@@ -86,4 +126,7 @@ class Condition(object):
         if r == 'null':
             r = None
 
-        return self.comparator(r, self.value)
+        return r
+
+    def eval(self, i):
+        return self.comparator(self.search(i), self.value)
@@ -0,0 +1,149 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This module implements minemeld.ft.conditional.ConditionalRequest, used by
+HTTP polling miners to skip the processing of feeds that did not change
+since the last poll.
+"""
+
+import hashlib
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class ConditionalRequest(object):
+    """Tracks the validators of the last response fully processed
+    by a polling miner.
+
+    The ETag and Last-Modified headers of the response are sent back
+    in the following requests as If-None-Match and If-Modified-Since.
+    If the server does not support validators and *content_hash* is
+    set, the body of the response is read in memory and its hash
+    compared with the hash of the last processed body.
+
+    Validators are updated only when the iterator returned by `track`
+    is exhausted, i.e. when the whole response has been processed.
+
+    Args:
+        name (str): name of the node
+        content_hash (bool): if *true* the hash of the body is checked
+            when the server does not support validators, the whole
+            body is read in memory. Default: *false*
+    """
+    def __init__(self, name, content_hash=False):
+        self.name = name
+        self.use_content_hash = content_hash
+
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+
+        self._pending = (None, None, None)
+
+    def headers(self):
+        """Returns the conditional headers for the next request."""
+        result = {}
+
+        if self.etag is not None:
+            result['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            result['If-Modified-Since'] = self.last_modified
+
+        return result
+
+    def read_content(self, response):
+        """Returns the body of *response* if it should be hashed,
+        i.e. if content hash is enabled and the server does not support
+        validators, otherwise None.
+        """
+        if not self.use_content_hash or response.status_code == 304:
+            return None
+
+        if 'etag' in response.headers or 'last-modified' in response.headers:
+            return None
+
+        return response.content
+
+    def unchanged(self, response, content=None):
+        """Checks if the content of *response* is the same as the
+        content of the last processed response.
+
+        Args:
+            response (requests.Response): the response, already checked
+                for errors
+            content (str): the body of *response* as returned by
+                `read_content`, if None `read_content` is called here
+        """
+        etag = response.headers.get('etag', None)
+        last_modified = response.headers.get('last-modified', None)
+
+        if content is None:
+            content = self.read_content(response)
+
+        content_hash = None
+        if content is not None:
+            content_hash = hashlib.sha1(content).hexdigest()
+
+        self._pending = (etag, last_modified, content_hash)
+
+        if response.status_code == 304:
+            LOG.info('%s - feed not modified', self.name)
+            return True
+
+        if etag is not None and etag == self.etag:
+            LOG.info('%s - feed ETag not changed', self.name)
+            return True
+
+        if content_hash is not None and content_hash == self.content_hash:
+            LOG.info('%s - feed content not changed', self.name)
+            return True
+
+        return False
+
+    def track(self, iterator):
+        """Returns a wrapper of *iterator* that saves the validators
+        of the response last checked with `unchanged` once *iterator*
+        is exhausted.
+        """
+        def _tracker(etag, last_modified, content_hash):
+            for item in iterator:
+                yield item
+
+            self.etag = etag
+            self.last_modified = last_modified
+            self.content_hash = content_hash
+
+        return _tracker(*self._pending)
+
+    def restore(self, saved_state):
+        if saved_state is None:
+            saved_state = {}
+
+        self.etag = saved_state.get('etag', None)
+        self.last_modified = saved_state.get('last_modified', None)
+        self.content_hash = saved_state.get('content_hash', None)
+
+    def create(self):
+        return {
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'content_hash': self.content_hash
+        }
+
+    def reset(self):
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
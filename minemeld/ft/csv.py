@@ -27,9 +27,11 @@ import csv
 import requests
 import yaml
 import shutil
+import cStringIO
 from urllib3.response import GzipDecoder
 
 from . import basepoller
+from .conditional import ConditionalRequest
 
 LOG = logging.getLogger(__name__)
 
@@ -57,6 +59,14 @@ class CSVFT(basepoller.BasePollerFT):
             Default: "
         :skipinitialspace: see `csv Python module <https://docs.python.org/2/library/csv.html#dialects-and-formatting-parameters>`_.
             Default: false
+        :conditional_requests: boolean, if *true* ETag and Last-Modified
+            of the feed are used to send conditional requests, and the
+            feed is not processed if not modified since the last poll.
+            Default: *true*
+        :conditional_content_hash: boolean, if *true* and the server
+            does not support ETag and Last-Modified, the feed is read in
+            memory and its hash compared with the hash of the last
+            processed feed. Default: *false*
 
     Example:
         Example config in YAML::
@@ -99,6 +109,12 @@ class CSVFT(basepoller.BasePollerFT):
 
         self.decode_gzip = self.config.get('decode_gzip', False)
 
+        if self.config.get('conditional_requests', True):
+            self.conditional_request = ConditionalRequest(
+                self.name,
+                content_hash=self.config.get('conditional_content_hash', False)
+            )
+
         self.side_config_path = self.config.get('side_config', None)
         if self.side_config_path is None:
             self.side_config_path = os.path.join(
@@ -154,6 +170,8 @@ class CSVFT(basepoller.BasePollerFT):
         _session = requests.Session()
 
         prepreq = self._build_request(now)
+        if self.conditional_request is not None:
+            prepreq.headers.update(self.conditional_request.headers())
 
         # this is to honour the proxy environment variables
         rkwargs = _session.merge_environment_settings(
@@ -173,7 +191,19 @@ class CSVFT(basepoller.BasePollerFT):
                       self.name, r.status_code, r.content)
             raise
 
+        content = None
+        if self.conditional_request is not None:
+            content = self.conditional_request.read_content(r)
+
+            if self.conditional_request.unchanged(r, content=content):
+                self.statistics['unchanged'] += 1
+                r.close()
+                return None
+
         response = r.raw
+        if content is not None:
+            # body already read to compute the hash
+            response = cStringIO.StringIO(content)
         if self.decode_gzip:
             response = self._gzipped_line_splitter(r)
 
@@ -189,6 +219,9 @@ class CSVFT(basepoller.BasePollerFT):
             **self.dialect
         )
 
+        if self.conditional_request is not None:
+            return self.conditional_request.track(csvreader)
+
         return csvreader
 
     def _gzipped_line_splitter(self, response):
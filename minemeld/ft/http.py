@@ -25,6 +25,7 @@ import itertools
 from minemeld import __version__ as MM_VERSION
 
 from . import basepoller
+from .conditional import ConditionalRequest
 
 LOG = logging.getLogger(__name__)
 
@@ -51,6 +52,14 @@ class HttpFT(basepoller.BasePollerFT):
         :encoding: encoding of the feed, if not UTF-8. See
             ``str.decode`` for options. Default: *null*, meaning do
             nothing, (Assumes UTF-8).
+        :conditional_requests: boolean, if *true* ETag and Last-Modified
+            of the feed are used to send conditional requests, and the
+            feed is not processed if not modified since the last poll.
+            Default: *true*
+        :conditional_content_hash: boolean, if *true* and the server
+            does not support ETag and Last-Modified, the feed is read in
+            memory and its hash compared with the hash of the last
+            processed feed. Default: *false*
 
     **Extraction dictionary**
         Extraction dictionaries contain the following keys:
@@ -106,6 +115,12 @@ class HttpFT(basepoller.BasePollerFT):
         self.user_agent = self.config.get('user_agent', None)
         self.encoding = self.config.get('encoding', None)
 
+        if self.config.get('conditional_requests', True):
+            self.conditional_request = ConditionalRequest(
+                self.name,
+                content_hash=self.config.get('conditional_content_hash', False)
+            )
+
         self.username = self.config.get('username', None)
         self.password = self.config.get('password', None)
 
@@ -182,16 +197,19 @@ class HttpFT(basepoller.BasePollerFT):
             timeout=self.polling_timeout
         )
 
+        headers = {}
         if self.user_agent is not None:
             if self.user_agent == 'MineMeld':
-                rkwargs['headers'] = {
-                    'User-Agent': 'MineMeld/%s' % MM_VERSION
-                }
+                headers['User-Agent'] = 'MineMeld/%s' % MM_VERSION
 
             else:
-                rkwargs['headers'] = {
-                    'User-Agent': self.user_agent
-                }
+                headers['User-Agent'] = self.user_agent
+
+        if self.conditional_request is not None:
+            headers.update(self.conditional_request.headers())
+
+        if headers:
+            rkwargs['headers'] = headers
 
         if self.username is not None and self.password is not None:
             rkwargs['auth'] = (self.username, self.password)
@@ -208,6 +226,12 @@ class HttpFT(basepoller.BasePollerFT):
                       self.name, r.status_code, r.content)
             raise
 
+        if self.conditional_request is not None and \
+           self.conditional_request.unchanged(r):
+            self.statistics['unchanged'] += 1
+            r.close()
+            return None
+
         result = r.iter_lines()
         if self.ignore_regex is not None:
             result = itertools.ifilter(
@@ -220,4 +244,7 @@ class HttpFT(basepoller.BasePollerFT):
                 result
             )
 
+        if self.conditional_request is not None:
+            result = self.conditional_request.track(result)
+
         return result
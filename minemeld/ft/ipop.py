@@ -30,15 +30,21 @@ WL_LEVEL = st.MAX_LEVEL
 
 
 class MWUpdate(object):
-    def __init__(self, start, end, uuids):
+    def __init__(self, start, end, uuids, version=4):
         self.start = start
         self.end = end
         self.uuids = set(uuids)
 
-        s = netaddr.IPAddress(start)
-        e = netaddr.IPAddress(end)
+        s = netaddr.IPAddress(start, version)
+        e = netaddr.IPAddress(end, version)
         self._indicator = '%s-%s' % (s, e)
 
+        if version == 6:
+            # IPv6 ranges matching a single network are sent in CIDR format
+            size = end-start+1
+            if (size & (size-1)) == 0 and (start % size) == 0:
+                self._indicator = '%s/%d' % (s, 129-size.bit_length())
+
     def indicator(self):
         return self._indicator
 
@@ -54,6 +60,10 @@ class MWUpdate(object):
 
 
 class AggregateIPv4FT(actorbase.ActorBaseFT):
+    _indicator_type = 'IPv4'
+    _ip_version = 4
+    _epsize = 32
+
     def __init__(self, name, chassis, config):
         self.active_requests = []
 
@@ -64,6 +74,8 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
 
         self.whitelist_prefixes = self.config.get('whitelist_prefixes', [])
         self.enable_list_merge = self.config.get('enable_list_merge', False)
+        # segment tree queries served from memory, see st.MemoryST
+        self.in_memory_index = self.config.get('in_memory_index', False)
 
     def _initialize_tables(self, truncate=False):
         self.table = table.Table(
@@ -72,7 +84,9 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
             truncate=truncate
         )
         self.table.create_index('_id')
-        self.st = st.ST(self.name+'_st', 32, truncate=truncate)
+
+        st_class = st.MemoryST if self.in_memory_index else st.ST
+        self.st = st_class(self.name+'_st', self._epsize, truncate=truncate)
 
     def initialize(self):
         self._initialize_tables()
@@ -204,7 +218,7 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
                 if oep is not None and oep != epaddr and len(live_ids) != 0:
                     if oeplevel != WL_LEVEL:
                         result.add(MWUpdate(oep, epaddr-1,
-                                            live_ids))
+                                            live_ids, self._ip_version))
 
                 oep = epaddr
                 oeplevel = eplevel
@@ -213,7 +227,8 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
             if len(end_ids) != 0:
                 if oep is not None and len(live_ids) != 0:
                     if eplevel < WL_LEVEL:
-                        result.add(MWUpdate(oep, epaddr, live_ids))
+                        result.add(MWUpdate(oep, epaddr, live_ids,
+                                            self._ip_version))
 
                 oep = epaddr+1
                 live_ids = live_ids - end_ids
@@ -225,23 +240,28 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
         return result
 
     def _range_from_indicator(self, indicator):
-        if '-' in indicator:
-            start, end = map(
-                lambda x: int(netaddr.IPAddress(x)),
-                indicator.split('-', 1)
-            )
-        elif '/' in indicator:
-            ipnet = netaddr.IPNetwork(indicator)
-            start = int(ipnet.ip)
-            end = start+ipnet.size-1
-        else:
-            start = int(netaddr.IPAddress(indicator))
-            end = start
-
-        if (not (start >= 0 and start <= 0xFFFFFFFF)) or \
-           (not (end >= 0 and end <= 0xFFFFFFFF)):
-            LOG.error('%s - {%s} invalid IPv4 indicator',
-                      self.name, indicator)
+        try:
+            if '-' in indicator:
+                start, end = map(
+                    lambda x: int(netaddr.IPAddress(x, self._ip_version)),
+                    indicator.split('-', 1)
+                )
+            elif '/' in indicator:
+                ipnet = netaddr.IPNetwork(indicator, version=self._ip_version)
+                start = int(ipnet.ip)
+                end = start+ipnet.size-1
+            else:
+                start = int(netaddr.IPAddress(indicator, self._ip_version))
+                end = start
+
+        except (netaddr.AddrFormatError, ValueError):
+            start = end = None
+
+        if start is None or \
+           (not (start >= 0 and start <= self.st.max_endpoint)) or \
+           (not (end >= 0 and end <= self.st.max_endpoint)):
+            LOG.error('%s - {%s} invalid %s indicator',
+                      self.name, indicator, self._indicator_type)
             return None, None
 
         return start, end
@@ -282,7 +302,7 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
     @base._counting('update.processed')
     def filtered_update(self, source=None, indicator=None, value=None):
         vtype = value.get('type', None)
-        if vtype != 'IPv4':
+        if vtype != self._indicator_type:
             self.statistics['update.ignored'] += 1
             return
 
@@ -351,7 +371,7 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
     def filtered_withdraw(self, source=None, indicator=None, value=None):
         LOG.debug("%s - withdraw from %s - %s", self.name, source, indicator)
 
-        if value is not None and value.get('type', None) != 'IPv4':
+        if value is not None and value.get('type', None) != self._indicator_type:
             self.statistics['withdraw.ignored'] += 1
             return
 
@@ -421,16 +441,13 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
         if from_key is None:
             from_key = 0
         if to_key is None:
-            to_key = 0xFFFFFFFF
+            to_key = self.st.max_endpoint
 
         result = self._calc_ipranges(from_key, to_key)
-        for u in result:
-            self.do_rpc(
-                source,
-                "update",
-                indicator=u.indicator(),
-                value=self._calc_indicator_value(u.uuids)
-            )
+        self.send_updates(
+            source,
+            ((u.indicator(), self._calc_indicator_value(u.uuids)) for u in result)
+        )
 
     def get(self, source=None, indicator=None):
         if not type(indicator) in [str, unicode]:
@@ -485,3 +502,15 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
 
         shutil.rmtree(name, ignore_errors=True)
         shutil.rmtree('{}_st'.format(name), ignore_errors=True)
+
+
+class AggregateIPv6FT(AggregateIPv4FT):
+    """Aggregates IPv6 indicators, with the same logic of AggregateIPv4FT.
+
+    Overlapping ranges are merged and whitelisted ranges are subtracted
+    using a segment tree with 128-bit endpoints. Ranges matching a single
+    network are emitted in CIDR format.
+    """
+    _indicator_type = 'IPv6'
+    _ip_version = 6
+    _epsize = 128
@@ -24,6 +24,7 @@ import os
 import yaml
 
 from . import basepoller
+from .conditional import ConditionalRequest
 
 LOG = logging.getLogger(__name__)
 
@@ -49,6 +50,14 @@ class SimpleJSON(basepoller.BasePollerFT):
         :fields: list of JSON attributes to include in the indicator value.
             If *null* no additional attributes are extracted. Default: *null*
         :prefix: prefix to add to field names. Default: json
+        :conditional_requests: boolean, if *true* ETag and Last-Modified
+            of the feed are used to send conditional requests, and the
+            feed is not processed if not modified since the last poll.
+            Default: *true*
+        :conditional_content_hash: boolean, if *true* and the server
+            does not support ETag and Last-Modified, the feed is read in
+            memory and its hash compared with the hash of the last
+            processed feed. Default: *false*
 
         :headers: Header parameters are optional to sepcify a user-agent or an api-token
         Example: headers = {'user-agent': 'my-app/0.0.1'} or Authorization: Bearer 
@@ -96,6 +105,12 @@ class SimpleJSON(basepoller.BasePollerFT):
 
         self.headers = self.config.get('headers', None)
 
+        if self.config.get('conditional_requests', True):
+            self.conditional_request = ConditionalRequest(
+                self.name,
+                content_hash=self.config.get('conditional_content_hash', False)
+            )
+
         # option for enabling client cert, default disabled
         self.client_cert_required = self.config.get('client_cert_required', False)
         self.key_file = self.config.get('key_file', None)
@@ -231,8 +246,15 @@ class SimpleJSON(basepoller.BasePollerFT):
         if self.username is not None and self.password is not None:
             rkwargs['auth'] = (self.username, self.password)
 
+        headers = {}
         if self.headers is not None:
-            rkwargs['headers'] = self.headers
+            headers.update(self.headers)
+
+        if self.conditional_request is not None:
+            headers.update(self.conditional_request.headers())
+
+        if headers:
+            rkwargs['headers'] = headers
 
         if self.client_cert_required and self.key_file is not None and self.cert_file is not None:
             rkwargs['cert'] = (self.cert_file, self.key_file)
@@ -249,6 +271,14 @@ class SimpleJSON(basepoller.BasePollerFT):
                       self.name, r.status_code, r.content)
             raise
 
+        if self.conditional_request is not None and \
+           self.conditional_request.unchanged(r):
+            self.statistics['unchanged'] += 1
+            return None
+
         result = self.extractor.search(r.json())
 
+        if self.conditional_request is not None and result is not None:
+            result = self.conditional_request.track(result)
+
         return result
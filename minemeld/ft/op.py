@@ -31,6 +31,11 @@ class AggregateFT(actorbase.ActorBaseFT):
         self.active_requests = []
         self.table = None
 
+        # bits of the inputs in the presence bitmasks, see _presence
+        self._input_bits = {}
+        self._input_bits_inputs = None
+        self._whitelist_mask = 0
+
         super(AggregateFT, self).__init__(name, chassis, config)
 
     def configure(self):
@@ -60,15 +65,50 @@ class AggregateFT(actorbase.ActorBaseFT):
                 return True
         return False
 
-    def _emit_update_indicator(self, indicator):
+    def _indicator_entries(self, indicator):
+        """Returns a dictionary with the value of *indicator* from each
+        source. Entries of an indicator are adjacent in the table and
+        are retrieved with a single range scan.
+        """
+        result = {}
+        for k, v in self.table.get_prefix(self._indicator_key(indicator, '')):
+            _, source = k.rsplit('\x00', 1)
+            result[source] = v
+
+        return result
+
+    def _presence(self, entries):
+        """Returns the bitmasks of the whitelist and of the other inputs
+        with an entry for the indicator. Bits are assigned to inputs
+        following their order in self.inputs.
+        """
+        if self._input_bits_inputs != self.inputs:
+            self._input_bits = {}
+            self._whitelist_mask = 0
+            for j, i in enumerate(self.inputs):
+                self._input_bits[i] = 1 << j
+                if self._is_whitelist(i):
+                    self._whitelist_mask |= 1 << j
+            self._input_bits_inputs = list(self.inputs)
+
+        mask = 0
+        for s in entries:
+            mask |= self._input_bits.get(s, 0)
+
+        return (mask & self._whitelist_mask), (mask & ~self._whitelist_mask)
+
+    def _emit_update_indicator(self, indicator, entries=None):
         LOG.debug("%s - emitting update: %s", self.name, indicator)
 
+        if entries is None:
+            entries = self._indicator_entries(indicator)
+
         mv = {'sources': []}
         for s in self.inputs:
             if self._is_whitelist(s):
                 continue
 
-            v = self.table.get(self._indicator_key(indicator, s))
+            v = entries.get(s, None)
             if v is None:
                 continue
 
@@ -91,10 +131,10 @@ class AggregateFT(actorbase.ActorBaseFT):
 
         return result
 
-    def _add_indicator(self, source, indicator, value):
+    def _add_indicator(self, source, indicator, value, ov=None):
         now = utc_millisec()
 
-        v = self.table.get(self._indicator_key(indicator, source))
+        v = ov
         if v is None:
             v = {
                 '_added': now,
@@ -112,16 +152,15 @@ class AggregateFT(actorbase.ActorBaseFT):
         if self.ignore_cases:
             indicator = indicator.lower()
 
-        ebl = False
-        ewl = False
-        for i in self.inputs:
-            v = self.table.exists(self._indicator_key(indicator, i))
-            if self._is_whitelist(i):
-                ewl |= v
-            else:
-                ebl |= v
+        entries = self._indicator_entries(indicator)
+        ewl, ebl = self._presence(entries)
 
-        v = self._add_indicator(source, indicator, value)
+        entries[source] = self._add_indicator(
+            source,
+            indicator,
+            value,
+            ov=entries.get(source, None)
+        )
 
         if self._is_whitelist(source):
             # update from whitelist
@@ -135,7 +174,7 @@ class AggregateFT(actorbase.ActorBaseFT):
         else:
             if ewl:
                 return
-            self._emit_update_indicator(indicator)
+            self._emit_update_indicator(indicator, entries)
 
     @base._counting('withdraw.processed')
     def filtered_withdraw(self, source=None, indicator=None, value=None):
@@ -144,23 +183,21 @@ class AggregateFT(actorbase.ActorBaseFT):
 
         ikey = self._indicator_key(indicator, source)
 
-        cvalue = self.table.get(ikey)
+        entries = self._indicator_entries(indicator)
+
+        cvalue = entries.get(source, None)
         e = (cvalue is not None)
         if value is not None and cvalue is not None:
             if value.get('type', None) != cvalue.get('type', None):
                 self.statistics['withdraw.ignored'] += 1
                 return
 
-        ebl = 0
-        ewl = 0
-        for i in self.inputs:
-            v = int(self.table.exists(self._indicator_key(indicator, i)))
-            if self._is_whitelist(i):
-                ewl += v
-            else:
-                ebl += v
+        ewl, ebl = self._presence(entries)
+        ewl = bin(ewl).count('1')
+        ebl = bin(ebl).count('1')
 
         self.table.delete(ikey)
+        entries.pop(source, None)
 
         if self._is_whitelist(source):
             # withdraw from whitelist
@@ -168,7 +205,7 @@ class AggregateFT(actorbase.ActorBaseFT):
                 return
 
             if ebl != 0:
-                self._emit_update_indicator(indicator)
+                self._emit_update_indicator(indicator, entries)
 
         else:
             if ewl > 0:
@@ -176,14 +213,16 @@ class AggregateFT(actorbase.ActorBaseFT):
 
             if e:
                 if ebl > 1:
-                    self._emit_update_indicator(indicator)
+                    self._emit_update_indicator(indicator, entries)
                 else:
                     self.emit_withdraw(indicator, value=cvalue)
 
     def get(self, source=None, indicator=None):
+        entries = self._indicator_entries(indicator)
+
         mv = {}
         for s in self.inputs:
-            v = self.table.get(self._indicator_key(indicator, s))
+            v = entries.get(s, None)
             if v is None:
                 continue
 
@@ -198,13 +237,7 @@ class AggregateFT(actorbase.ActorBaseFT):
     def get_all(self, source=None):
         return self.get_range(source=source)
 
-    def get_range(self, source=None, index=None, from_key=None, to_key=None):
-        if index is not None:
-            raise ValueError("Index not found")
-
-        if to_key is not None:
-            to_key = self._indicator_key(to_key, '\x7F')
-
+    def _range_indicators(self, index=None, from_key=None, to_key=None):
         cindicator = None
         cvalue = {}
         for k, v in self.table.query(index=index, from_key=from_key,
@@ -219,14 +252,28 @@ class AggregateFT(actorbase.ActorBaseFT):
 
             else:
                 if cindicator is not None:
-                    self.do_rpc(source, "update", indicator=cindicator,
-                                value=cvalue)
+                    yield cindicator, cvalue
                 cindicator = indicator
                 cvalue = v
 
         if cindicator is not None:
-            self.do_rpc(source, "update", indicator=cindicator,
-                        value=cvalue)
+            yield cindicator, cvalue
+
+    def get_range(self, source=None, index=None, from_key=None, to_key=None):
+        if index is not None:
+            raise ValueError("Index not found")
+
+        if to_key is not None:
+            to_key = self._indicator_key(to_key, '\x7F')
+
+        self.send_updates(
+            source,
+            self._range_indicators(
+                index=index,
+                from_key=from_key,
+                to_key=to_key
+            )
+        )
 
         return 'OK'
 
@@ -17,22 +17,122 @@ from __future__ import absolute_import
 import logging
 import redis
 import os
+import time
+import collections
 import ujson as json
 
+import gevent
+import gevent.lock
+
 from . import base
 from . import actorbase
+from .utils import utc_millisec, interval_in_sec
 
 LOG = logging.getLogger(__name__)
 
 
+def age_out_sorted_set(client, skey, hkey, max_score, batch_size=1000,
+                       lock=None, on_batch=None):
+    """Removes the members of the sorted set *skey* with score lower
+    than *max_score*, and the corresponding fields of the hash *hkey*.
+
+    Members are removed in batches of at most *batch_size* members, each
+    batch is a ZRANGEBYSCORE followed by a single MULTI with ZREM and HDEL.
+    The greenlet yields between batches.
+
+    Args:
+        client (redis.StrictRedis): Redis client
+        skey (str): name of the sorted set
+        hkey (str): name of the hash, None if there is no hash
+        max_score (int): members with score < max_score are removed
+        batch_size (int): max number of members removed per batch
+        lock: if not None, held during each batch
+        on_batch (callable): called with the MULTI pipeline of each batch,
+            to add commands to the transaction
+
+    Returns the number of members removed.
+    """
+    removed = 0
+
+    while True:
+        if lock is not None:
+            lock.acquire()
+
+        try:
+            members = client.zrangebyscore(
+                skey, '-inf', '({}'.format(max_score),
+                start=0, num=batch_size
+            )
+            if len(members) == 0:
+                break
+
+            with client.pipeline() as p:
+                p.multi()
+
+                p.zrem(skey, *members)
+                if hkey is not None:
+                    p.hdel(hkey, *members)
+                if on_batch is not None:
+                    on_batch(p)
+
+                removed += p.execute()[0]
+
+        finally:
+            if lock is not None:
+                lock.release()
+
+        if len(members) < batch_size:
+            break
+
+        gevent.sleep(0)
+
+    return removed
+
+
 class RedisSet(actorbase.ActorBaseFT):
+    """Stores indicators in a Redis sorted set.
+
+    Updates and withdraws are coalesced per indicator and written to Redis
+    in batches, using a single pipeline per batch.
+
+    Each write bumps the feed generation counter stored in
+    *<node name>.generation* and sets *<node name>.last_modified* to the
+    current time in milliseconds. The feeds API uses them to cache the
+    rendered feeds.
+
+    **Config parameters**
+        :redis_url: URL of the Redis server.
+        :scoring_attribute: attribute used as score. Default: last_seen
+        :store_value: if *true* indicator values are stored in the hash
+            *<node name>.value*. Default: false
+        :max_entries: max number of indicators. Default: 1000000
+        :batch_size: max number of indicators in a batch. Default: 1000
+        :batch_timeout: max number of seconds an update or withdraw waits
+            before being written to Redis. Default: 0.1
+        :age_out_interval: if set, indicators with score older than
+            this interval are removed from the set. Scores should be
+            timestamps in milliseconds, like last_seen. Default: null
+
+    Args:
+        name (str): node name, should be unique inside the graph
+        chassis (object): parent chassis instance
+        config (dict): node config.
+    """
     def __init__(self, name, chassis, config):
         self.redis_skey = name
         self.redis_skey_value = name+'.value'
         self.redis_skey_chkp = name+'.chkp'
+        self.redis_skey_generation = name+'.generation'
+        self.redis_skey_last_modified = name+'.last_modified'
 
         self.SR = None
 
+        self._batch = collections.OrderedDict()
+        self._flush_glet = None
+        self._flush_lock = gevent.lock.Semaphore()
+        self._cardinality = None
+        self._ageout_glet = None
+
         super(RedisSet, self).__init__(name, chassis, config)
 
     def configure(self):
@@ -47,6 +147,12 @@ class RedisSet(actorbase.ActorBaseFT):
         )
         self.store_value = self.config.get('store_value', False)
         self.max_entries = self.config.get('max_entries', 1000 * 1000)
+        self.batch_size = self.config.get('batch_size', 1000)
+        self.batch_timeout = self.config.get('batch_timeout', 0.1)
+
+        self.age_out_interval = self.config.get('age_out_interval', None)
+        if self.age_out_interval is not None:
+            self.age_out_interval = interval_in_sec(self.age_out_interval)
 
     def connect(self, inputs, output):
         output = False
@@ -106,6 +212,7 @@ class RedisSet(actorbase.ActorBaseFT):
 
     def create_checkpoint(self, value):
         self._connect_redis()
+        self._flush()
 
         config = {
             'class': (self.__class__.__module__+'.'+self.__class__.__name__),
@@ -134,42 +241,158 @@ class RedisSet(actorbase.ActorBaseFT):
 
     def initialize(self):
         self._connect_redis()
+        self._cardinality = self.SR.zcard(self.redis_skey)
 
     def rebuild(self):
         self._connect_redis()
+        self._batch = collections.OrderedDict()
         self.SR.delete(self.redis_skey)
         self.SR.delete(self.redis_skey_value)
+        self._bump_generation(self.SR)
+        self._cardinality = 0
 
     def reset(self):
         self._connect_redis()
+        self._batch = collections.OrderedDict()
         self.SR.delete(self.redis_skey)
         self.SR.delete(self.redis_skey_value)
+        self._bump_generation(self.SR)
+        self._cardinality = 0
+
+    def _bump_generation(self, client):
+        client.incr(self.redis_skey_generation)
+        client.set(self.redis_skey_last_modified, utc_millisec())
 
     def _add_indicator(self, score, indicator, value):
-        if self.length() >= self.max_entries:
-            self.statistics['drop.overflow'] += 1
+        self._enqueue(indicator, (score, value))
+
+    def _delete_indicator(self, indicator):
+        self._enqueue(indicator, None)
+
+    def _enqueue(self, indicator, operation):
+        # last operation on an indicator wins
+        self._batch[indicator] = operation
+
+        if len(self._batch) >= self.batch_size:
+            self._flush()
             return
 
+        if self._flush_glet is None:
+            self._flush_glet = gevent.spawn_later(
+                self.batch_timeout,
+                self._flush_later
+            )
+
+    def _flush_later(self):
+        self._flush_glet = None
+
+        try:
+            self._flush()
+
+        except gevent.GreenletExit:
+            raise
+
+        except:
+            LOG.exception('{} - error flushing batch'.format(self.name))
+
+    def _flush(self):
+        if self._flush_glet is not None:
+            self._flush_glet.kill()
+            self._flush_glet = None
+
+        # batches are written in order
+        with self._flush_lock:
+            if len(self._batch) == 0:
+                return
+
+            batch = self._batch
+            self._batch = collections.OrderedDict()
+
+            t1 = time.time()
+            self._write_batch(batch)
+            t2 = time.time()
+
+            self.statistics['batch.flushed'] += 1
+            self.statistics['batch.indicators'] += len(batch)
+            self.statistics['batch.latency'] += int((t2-t1)*1000)
+
+    def _write_batch(self, batch):
+        deletes = [i for i, op in batch.iteritems() if op is None]
+        adds = [(i, op) for i, op in batch.iteritems() if op is not None]
+
+        if self._cardinality is None:
+            self._cardinality = self.SR.zcard(self.redis_skey)
+
+        if self._cardinality+len(adds) > self.max_entries:
+            # we could overflow, check which indicators are new
+            # before adding
+            self._write_deletes(deletes)
+            deletes = []
+
+            with self.SR.pipeline(transaction=False) as p:
+                for i, _ in adds:
+                    p.zscore(self.redis_skey, i)
+                scores = p.execute()
+
+            room = self.max_entries-self._cardinality
+            checked = []
+            for (i, op), cscore in zip(adds, scores):
+                if cscore is None:
+                    if room <= 0:
+                        self.statistics['drop.overflow'] += 1
+                        continue
+                    room -= 1
+                checked.append((i, op))
+            adds = checked
+
         with self.SR.pipeline() as p:
             p.multi()
 
-            p.zadd(self.redis_skey, score, indicator)
-            if self.store_value:
-                p.hset(self.redis_skey_value, indicator, json.dumps(value))
+            if len(deletes) != 0:
+                p.zrem(self.redis_skey, *deletes)
+                p.hdel(self.redis_skey_value, *deletes)
 
-            result = p.execute()[0]
+            if len(adds) != 0:
+                zargs = []
+                for i, (score, _) in adds:
+                    zargs.append(score)
+                    zargs.append(i)
+                p.zadd(self.redis_skey, *zargs)
 
-        self.statistics['added'] += result
+                if self.store_value:
+                    p.hmset(
+                        self.redis_skey_value,
+                        {i: json.dumps(value) for i, (_, value) in adds}
+                    )
+
+            if len(deletes) != 0 or len(adds) != 0:
+                self._bump_generation(p)
+
+            result = p.execute()
+
+        if len(deletes) != 0:
+            self._cardinality -= result[0]
+            self.statistics['removed'] += result[0]
+            result = result[2:]
+
+        if len(adds) != 0:
+            self._cardinality += result[0]
+            self.statistics['added'] += result[0]
+
+    def _write_deletes(self, deletes):
+        if len(deletes) == 0:
+            return
 
-    def _delete_indicator(self, indicator):
         with self.SR.pipeline() as p:
             p.multi()
 
-            p.zrem(self.redis_skey, indicator)
-            p.hdel(self.redis_skey_value, indicator)
+            p.zrem(self.redis_skey, *deletes)
+            p.hdel(self.redis_skey_value, *deletes)
+            self._bump_generation(p)
 
             result = p.execute()[0]
 
+        self._cardinality -= result
         self.statistics['removed'] += result
 
     @base._counting('update.processed')
@@ -190,7 +413,55 @@ class RedisSet(actorbase.ActorBaseFT):
         self._delete_indicator(indicator)
 
     def length(self, source=None):
-        return self.SR.zcard(self.redis_skey)
+        if self._cardinality is None:
+            self._cardinality = self.SR.zcard(self.redis_skey)
+
+        return self._cardinality
+
+    def _age_out(self):
+        removed = age_out_sorted_set(
+            self.SR,
+            self.redis_skey, self.redis_skey_value,
+            utc_millisec() - self.age_out_interval*1000,
+            batch_size=self.batch_size,
+            lock=self._flush_lock,
+            on_batch=self._bump_generation
+        )
+        if removed != 0:
+            self._cardinality = None
+            self.statistics['aged_out'] += removed
+
+    def _age_out_run(self):
+        while True:
+            try:
+                self._age_out()
+
+            except gevent.GreenletExit:
+                raise
+
+            except:
+                LOG.exception('{} - error aging out indicators'.format(self.name))
+
+            gevent.sleep(min(self.age_out_interval, 60))
+
+    def start(self):
+        super(RedisSet, self).start()
+
+        if self.age_out_interval is not None:
+            self._ageout_glet = gevent.spawn(self._age_out_run)
+
+    def stop(self):
+        super(RedisSet, self).stop()
+
+        if self._ageout_glet is not None:
+            self._ageout_glet.kill()
+            self._ageout_glet = None
+
+        try:
+            self._flush()
+
+        except:
+            LOG.exception('{} - error flushing batch'.format(self.name))
 
     @staticmethod
     def gc(name, config=None):
@@ -202,6 +473,8 @@ class RedisSet(actorbase.ActorBaseFT):
         redis_skey = name
         redis_skey_value = '{}.value'.format(name)
         redis_skey_chkp = '{}.chkp'.format(name)
+        redis_skey_generation = '{}.generation'.format(name)
+        redis_skey_last_modified = '{}.last_modified'.format(name)
         redis_url = config.get('redis_url',
             os.environ.get('REDIS_URL', 'unix:///var/run/redis/redis.sock')
         )
@@ -217,6 +490,8 @@ class RedisSet(actorbase.ActorBaseFT):
             SR.delete(redis_skey)
             SR.delete(redis_skey_value)
             SR.delete(redis_skey_chkp)
+            SR.delete(redis_skey_generation)
+            SR.delete(redis_skey_last_modified)
 
         except Exception as e:
             raise RuntimeError(str(e))
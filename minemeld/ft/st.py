@@ -20,18 +20,28 @@ Simple segment tree implementation based on LevelDB.
 Numbers are 8-bit unsigned.
 
 - Segment key: (1, <start>, <end>, <level>, <uuid>)
-- Endpoint key: (1, <endpoint>, <type>, <level>, <uuid>)
+- Endpoint key: (2, <endpoint>, <level>, <type>, <uuid>)
+
+Endpoints are encoded as 64-bit big endian unsigned ints, or as 128-bit
+big endian unsigned ints if the endpoint size is larger than 64 bits.
 
 **ENDPOINT**
 
 - Type: 0: START, 1: END
+
+**MEMORYST**
+
+MemoryST keeps a copy of the segment tree in memory and serves cover
+and endpoint queries from it. Segments and endpoints are still written
+to LevelDB using the same layout, the in memory copy is rebuilt from
+the endpoint keys when the tree is opened.
 """
 
 import plyvel
 import struct
 import logging
 import shutil
-import array
+import bisect
 
 LOG = logging.getLogger(__name__)
 
@@ -57,6 +67,8 @@ class ST(object):
         )
         self.epsize = epsize
         self.max_endpoint = (1 << epsize)-1
+        # endpoints are stored as 64-bit or 128-bit unsigned ints
+        self.epbytes = 8 if epsize <= 64 else 16
 
         self.num_endpoints = 0
         self.num_segments = 0
@@ -75,62 +87,79 @@ class ST(object):
 
         return result
 
+    def _pack_endpoint(self, endpoint):
+        if self.epbytes == 8:
+            return struct.pack(">Q", endpoint)
+
+        return struct.pack(">QQ", endpoint >> 64, endpoint & 0xFFFFFFFFFFFFFFFF)
+
+    def _unpack_endpoint(self, packed):
+        if self.epbytes == 8:
+            return struct.unpack(">Q", packed)[0]
+
+        high, low = struct.unpack(">QQ", packed)
+        return (high << 64) | low
+
+    def _uuid_bytes(self, uuid_):
+        # uuids read back from the indicator table are unicode
+        if isinstance(uuid_, unicode):
+            return uuid_.encode('latin-1')
+        return uuid_
+
     def _segment_key(self, start, end, uuid_=None, level=None):
-        res = array.array('B', [
-            1,
-            (start >> 56) & 0xFF, (start >> 48) & 0xFF,
-            (start >> 40) & 0xFF, (start >> 32) & 0xFF,
-            (start >> 24) & 0xFF, (start >> 16) & 0xFF,
-            (start >> 8) & 0xFF, start & 0xFF,
-            (end >> 56) & 0xFF, (end >> 48) & 0xFF,
-            (end >> 40) & 0xFF, (end >> 32) & 0xFF,
-            (end >> 24) & 0xFF, (end >> 16) & 0xFF,
-            (end >> 8) & 0xFF, end & 0xFF,
-        ])
+        res = '\x01' + self._pack_endpoint(start) + self._pack_endpoint(end)
 
         if level is not None:
-            res.append(level)
+            res += chr(level)
             if uuid_ is not None:
-                for c in uuid_:
-                    res.append(ord(c))
+                res += self._uuid_bytes(uuid_)
 
-        return res.tostring()
+        return res
 
     def _split_segment_key(self, key):
-        _, start, end, level = struct.unpack(">BQQB", key[:18])
-        return start, end, level, key[18:]
+        epb = self.epbytes
+        start = self._unpack_endpoint(key[1:1+epb])
+        end = self._unpack_endpoint(key[1+epb:1+2*epb])
+        level = ord(key[1+2*epb])
+        return start, end, level, key[2+2*epb:]
+
+    def _segment_value(self, start, end):
+        return self._pack_endpoint(start) + self._pack_endpoint(end)
+
+    def _split_segment_value(self, value):
+        return (
+            self._unpack_endpoint(value[:self.epbytes]),
+            self._unpack_endpoint(value[self.epbytes:])
+        )
 
     def _endpoint_key(self, endpoint, level=None, type_=None, uuid_=None):
-        res = array.array('B', [
-            2,
-            (endpoint >> 56) & 0xFF, (endpoint >> 48) & 0xFF,
-            (endpoint >> 40) & 0xFF, (endpoint >> 32) & 0xFF,
-            (endpoint >> 24) & 0xFF, (endpoint >> 16) & 0xFF,
-            (endpoint >> 8) & 0xFF, endpoint & 0xFF
-        ])
+        res = '\x02' + self._pack_endpoint(endpoint)
 
         if level is not None:
-            res.append(level)
+            res += chr(level)
             if type_ is not None:
-                res.append(type_)
+                res += chr(type_)
                 if uuid_ is not None:
-                    for c in uuid_:
-                        res.append(ord(c))
+                    res += self._uuid_bytes(uuid_)
 
-        return res.tostring()
+        return res
 
     def _split_endpoint_key(self, k):
-        _, endpoint, level, type_ = struct.unpack(">BQBB", k[:11])
-        type_ = (True if type_ == TYPE_START else False)
-        return endpoint, level, type_, k[11:]
+        epb = self.epbytes
+        endpoint = self._unpack_endpoint(k[1:1+epb])
+        level = ord(k[1+epb])
+        type_ = (True if ord(k[2+epb]) == TYPE_START else False)
+        return endpoint, level, type_, k[3+epb:]
 
     def close(self):
         self.db.close()
 
     def put(self, uuid_, start, end, level=0):
         si = self._split_interval(start, end, 0, self.max_endpoint)
+        self._put_segments(uuid_, start, end, level, si)
 
-        value = struct.pack(">QQ", start, end)
+    def _put_segments(self, uuid_, start, end, level, si):
+        value = self._segment_value(start, end)
 
         batch = self.db.write_batch()
 
@@ -159,9 +188,12 @@ class ST(object):
         self.num_segments += len(si)
 
     def delete(self, uuid_, start, end, level=0):
+        si = self._split_interval(start, end, 0, self.max_endpoint)
+        self._delete_segments(uuid_, start, end, level, si)
+
+    def _delete_segments(self, uuid_, start, end, level, si):
         batch = self.db.write_batch()
 
-        si = self._split_interval(start, end, 0, self.max_endpoint)
         for i in si:
             k = self._segment_key(i[0], i[1], uuid_=uuid_, level=level)
             batch.delete(k)
@@ -211,7 +243,7 @@ class ST(object):
                                          reverse=True, include_start=False,
                                          include_stop=False):
                 _, _, level, uuid_ = self._split_segment_key(k)
-                start, end = struct.unpack(">QQ", v)
+                start, end = self._split_segment_value(v)
 
                 yield uuid_, level, start, end
 
@@ -249,3 +281,143 @@ class ST(object):
         )
         for k in di:
             yield self._split_endpoint_key(k)
+
+
+class MemoryST(ST):
+    """Segment tree with the same interface of ST, queries are answered
+    from an in memory copy of the tree.
+
+    Canonical segments are stored in a dictionary, a cover query is a
+    dictionary lookup per level of the tree. Endpoints are stored in a
+    sorted list of (endpoint, level, type, uuid) tuples, the same order
+    of the endpoint keys in LevelDB.
+    """
+    def __init__(self, name, epsize, truncate=False,
+                 bloom_filter_bits=10, write_buffer_size=(4 << 20)):
+        super(MemoryST, self).__init__(
+            name,
+            epsize,
+            truncate=truncate,
+            bloom_filter_bits=bloom_filter_bits,
+            write_buffer_size=write_buffer_size
+        )
+
+        # (lower, upper) -> {(level, uuid): (start, end)}
+        self._segments = {}
+        self._endpoints = []
+
+        self._load()
+
+    def _add_segments(self, uuid_, start, end, level, si):
+        for i in si:
+            self._segments.setdefault(i, {})[(level, uuid_)] = (start, end)
+
+    def _load(self):
+        starts = {}
+
+        ri = self.db.iterator(
+            start=self._endpoint_key(0),
+            stop=self._endpoint_key(self.max_endpoint, level=MAX_LEVEL+1),
+            include_value=False
+        )
+        with ri:
+            for k in ri:
+                endpoint, level, type_, uuid_ = self._split_endpoint_key(k)
+                self._endpoints.append((
+                    endpoint,
+                    level,
+                    TYPE_START if type_ else TYPE_END,
+                    uuid_
+                ))
+
+                if type_:
+                    starts[(level, uuid_)] = endpoint
+                    continue
+
+                start = starts.pop((level, uuid_), None)
+                if start is None:
+                    LOG.error('Missing start endpoint for segment %r', uuid_)
+                    continue
+
+                si = self._split_interval(start, endpoint, 0, self.max_endpoint)
+                self._add_segments(uuid_, start, endpoint, level, si)
+                self.num_segments += len(si)
+                self.num_endpoints += 2
+
+    def _add_endpoint(self, ep):
+        idx = bisect.bisect_left(self._endpoints, ep)
+        if idx == len(self._endpoints) or self._endpoints[idx] != ep:
+            self._endpoints.insert(idx, ep)
+
+    def _remove_endpoint(self, ep):
+        idx = bisect.bisect_left(self._endpoints, ep)
+        if idx != len(self._endpoints) and self._endpoints[idx] == ep:
+            del self._endpoints[idx]
+
+    def put(self, uuid_, start, end, level=0):
+        si = self._split_interval(start, end, 0, self.max_endpoint)
+        self._put_segments(uuid_, start, end, level, si)
+
+        self._add_segments(uuid_, start, end, level, si)
+        self._add_endpoint((start, level, TYPE_START, uuid_))
+        self._add_endpoint((end, level, TYPE_END, uuid_))
+
+    def delete(self, uuid_, start, end, level=0):
+        si = self._split_interval(start, end, 0, self.max_endpoint)
+        self._delete_segments(uuid_, start, end, level, si)
+
+        for i in si:
+            segment = self._segments.get(i, None)
+            if segment is None:
+                continue
+
+            segment.pop((level, uuid_), None)
+            if len(segment) == 0:
+                self._segments.pop(i)
+
+        self._remove_endpoint((start, level, TYPE_START, uuid_))
+        self._remove_endpoint((end, level, TYPE_END, uuid_))
+
+    def cover(self, value):
+        lower = 0
+        upper = self.max_endpoint*2
+
+        while True:
+            mid = (lower+upper)/2
+            if value <= mid:
+                upper = mid
+            else:
+                lower = mid+1
+
+            segment = self._segments.get((lower, upper), None)
+            if segment is not None:
+                # same order of ST.cover
+                for (level, uuid_), (start, end) in sorted(segment.items(), reverse=True):
+                    yield uuid_, level, start, end
+
+            if lower == upper:
+                break
+
+    def query_endpoints(self, start=None, stop=None, reverse=False,
+                        include_start=True, include_stop=True):
+        """Iterate over endpoints between start and stop, see
+        ST.query_endpoints. Endpoint keys never match the boundaries
+        of the iterator in ST, *include_start* and *include_stop*
+        have no effect.
+        """
+        if start is None:
+            start = 0
+        if stop is None:
+            stop = self.max_endpoint
+
+        lo = bisect.bisect_left(self._endpoints, (start,))
+        hi = bisect.bisect_left(self._endpoints, (stop+1,))
+
+        if reverse:
+            indexes = xrange(hi-1, lo-1, -1)
+        else:
+            indexes = xrange(lo, hi)
+
+        for idx in indexes:
+            endpoint, level, type_, uuid_ = self._endpoints[idx]
+            yield endpoint, level, (type_ == TYPE_START), uuid_
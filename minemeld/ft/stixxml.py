@@ -0,0 +1,344 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This module implements a template based serializer of the STIX 1.1.1
+packages published by minemeld.ft.taxii.DataFeed.
+
+Packages are rendered directly from the indicator value with string
+templates, without building python-stix object graphs. The XML produced
+is the same as the one produced by python-stix for the same indicator,
+except for the order of the namespace declarations in the root element.
+"""
+
+import uuid
+from datetime import datetime
+
+import pytz
+import netaddr
+import werkzeug.urls
+
+__all__ = ['SUPPORTED_TYPES', 'stix_content_block']
+
+
+_NAMESPACES = [
+    ('stix', 'http://stix.mitre.org/stix-1'),
+    ('indicator', 'http://stix.mitre.org/Indicator-2'),
+    ('stixCommon', 'http://stix.mitre.org/common-1'),
+    ('stixVocabs', 'http://stix.mitre.org/default_vocabularies-1'),
+    ('cybox', 'http://cybox.mitre.org/cybox-2'),
+    ('cyboxCommon', 'http://cybox.mitre.org/common-2'),
+    ('xsi', 'http://www.w3.org/2001/XMLSchema-instance'),
+    ('xs', 'http://www.w3.org/2001/XMLSchema'),
+    ('ds', 'http://www.w3.org/2000/09/xmldsig#'),
+    ('xlink', 'http://www.w3.org/1999/xlink')
+]
+
+_MARKING_NAMESPACES = [
+    ('marking', 'http://data-marking.mitre.org/Marking-1'),
+    ('tlpMarking', 'http://data-marking.mitre.org/extensions/MarkingStructure#TLP-1')
+]
+
+_CONTENT_BLOCK_HEADER = (
+    '<taxii_11:Content_Block'
+    ' xmlns:taxii="http://taxii.mitre.org/messages/taxii_xml_binding-1"'
+    ' xmlns:taxii_11="http://taxii.mitre.org/messages/taxii_xml_binding-1.1"'
+    ' xmlns:tdq="http://taxii.mitre.org/query/taxii_default_query-1">'
+    '<taxii_11:Content_Binding binding_id="urn:stix.mitre.org:xml:1.1"/>'
+    '<taxii_11:Content>'
+)
+
+_CONTENT_BLOCK_FOOTER = '</taxii_11:Content></taxii_11:Content_Block>'
+
+_INDICATOR_TEMPLATE = u"""\
+        <stix:Indicator id="%(id)s" timestamp="%(timestamp)s" \
+xsi:type="indicator:IndicatorType">
+            <indicator:Title>%(title)s</indicator:Title>
+            <indicator:Type xsi:type="stixVocabs:IndicatorTypeVocab-1.1">\
+%(indicator_type)s</indicator:Type>
+            <indicator:Description>%(description)s</indicator:Description>
+            <indicator:Observable id="%(observable_id)s">
+                <cybox:Title>%(observable_title)s</cybox:Title>
+                <cybox:Object id="%(object_id)s">
+%(properties)s
+                </cybox:Object>
+            </indicator:Observable>
+            <indicator:Confidence timestamp="%(timestamp)s">
+                <stixCommon:Value>%(confidence)s</stixCommon:Value>
+            </indicator:Confidence>
+        </stix:Indicator>
+"""
+
+_ADDRESS_TEMPLATE = u"""\
+                    <cybox:Properties xsi:type="AddressObj:AddressObjectType" \
+category="%s">
+                        <AddressObj:Address_Value>%s</AddressObj:Address_Value>
+                    </cybox:Properties>"""
+
+_DOMAIN_TEMPLATE = u"""\
+                    <cybox:Properties xsi:type="DomainNameObj:DomainNameObjectType" \
+type="FQDN">
+                        <DomainNameObj:Value>%s</DomainNameObj:Value>
+                    </cybox:Properties>"""
+
+_URL_TEMPLATE = u"""\
+                    <cybox:Properties xsi:type="URIObj:URIObjectType" type="URL">
+                        <URIObj:Value>%s</URIObj:Value>
+                    </cybox:Properties>"""
+
+_HASH_TEMPLATE = u"""\
+                    <cybox:Properties xsi:type="FileObj:FileObjectType">
+                        <FileObj:Hashes>
+                            <cyboxCommon:Hash>
+                                %s
+                                <cyboxCommon:Simple_Hash_Value>%s</cyboxCommon:Simple_Hash_Value>
+                            </cyboxCommon:Hash>
+                        </FileObj:Hashes>
+                    </cybox:Properties>"""
+
+# hash type from the hash length, same as cybox
+_HASH_TYPES = {
+    32: 'MD5',
+    40: 'SHA1',
+    56: 'SHA224',
+    64: 'SHA256',
+    96: 'SHA384',
+    128: 'SHA512'
+}
+
+
+def _escape(s):
+    return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _ip_observables(type_, indicator):
+    category = 'ipv6-addr' if type_ == 'IPv6' else 'ipv4-addr'
+
+    indicators = [indicator]
+    if '-' in indicator:
+        # looks like an IP Range, let's try to make it a CIDR
+        a1, a2 = indicator.split('-', 1)
+        if a1 == a2:
+            # same IP
+            indicators = [a1]
+        else:
+            # use netaddr builtin algo to summarize range into CIDR
+            iprange = netaddr.IPRange(a1, a2)
+            indicators = map(str, iprange.cidrs())
+
+    return [
+        (
+            'Address',
+            u'{}: {}'.format(type_, i),
+            _ADDRESS_TEMPLATE % (category, _escape(i))
+        ) for i in indicators
+    ]
+
+
+def _email_addr_observables(type_, indicator):
+    return [(
+        'Address',
+        u'{}: {}'.format(type_, indicator),
+        _ADDRESS_TEMPLATE % ('e-mail', _escape(indicator))
+    )]
+
+
+def _domain_observables(type_, indicator):
+    return [(
+        'DomainName',
+        u'FQDN: ' + indicator,
+        _DOMAIN_TEMPLATE % _escape(indicator)
+    )]
+
+
+def _url_observables(type_, indicator):
+    return [(
+        'URI',
+        u'URL: ' + indicator,
+        _URL_TEMPLATE % _escape(indicator)
+    )]
+
+
+def _hash_observables(type_, indicator):
+    hash_type = _HASH_TYPES.get(len(indicator), None)
+    if hash_type is None:
+        hash_type = '<cyboxCommon:Type>Other</cyboxCommon:Type>'
+    else:
+        hash_type = (
+            '<cyboxCommon:Type xsi:type="cyboxVocabs:HashNameVocab-1.0">'
+            '%s</cyboxCommon:Type>' % hash_type
+        )
+
+    return [(
+        'File',
+        u'{}: {}'.format(type_, indicator),
+        _HASH_TEMPLATE % (hash_type, _escape(indicator))
+    )]
+
+
+_ADDRESS_NAMESPACES = [('AddressObj', 'http://cybox.mitre.org/objects#AddressObject-2')]
+_HASH_NAMESPACES = [
+    ('FileObj', 'http://cybox.mitre.org/objects#FileObject-2'),
+    ('cyboxVocabs', 'http://cybox.mitre.org/default_vocabularies-2')
+]
+
+_TYPE_MAPPING = {
+    'IPv4': ('IP Watchlist', _ip_observables, _ADDRESS_NAMESPACES),
+    'IPv6': ('IP Watchlist', _ip_observables, _ADDRESS_NAMESPACES),
+    'URL': (
+        'URL Watchlist',
+        _url_observables,
+        [('URIObj', 'http://cybox.mitre.org/objects#URIObject-2')]
+    ),
+    'domain': (
+        'Domain Watchlist',
+        _domain_observables,
+        [('DomainNameObj', 'http://cybox.mitre.org/objects#DomainNameObject-1')]
+    ),
+    'sha256': ('File Hash Watchlist', _hash_observables, _HASH_NAMESPACES),
+    'sha1': ('File Hash Watchlist', _hash_observables, _HASH_NAMESPACES),
+    'md5': ('File Hash Watchlist', _hash_observables, _HASH_NAMESPACES),
+    'email-addr': ('Malicious E-mail', _email_addr_observables, _ADDRESS_NAMESPACES)
+}
+
+SUPPORTED_TYPES = frozenset(_TYPE_MAPPING.keys())
+
+
+def _confidence(value):
+    confidence = value.get('confidence', None)
+    if confidence is None:
+        return 'Unknown'
+    elif confidence < 50:
+        return 'Low'
+    elif confidence < 75:
+        return 'Medium'
+
+    return 'High'
+
+
+def _stix_header(title, description, short_description, tlp_color, information_source):
+    if title is None and description is None and short_description is None and \
+       tlp_color is None and information_source is None:
+        return u''
+
+    result = [u'    <stix:STIX_Header>\n']
+    if title is not None:
+        result.append(u'        <stix:Title>%s</stix:Title>\n' % _escape(title))
+    if description is not None:
+        result.append(
+            u'        <stix:Description>%s</stix:Description>\n' % _escape(description)
+        )
+    if short_description is not None:
+        result.append(
+            u'        <stix:Short_Description>%s</stix:Short_Description>\n'
+            % _escape(short_description)
+        )
+    if tlp_color is not None:
+        result.append(
+            u'        <stix:Handling>\n'
+            u'            <marking:Marking>\n'
+            u'                <marking:Controlled_Structure>//node() | //@*'
+            u'</marking:Controlled_Structure>\n'
+            u'                <marking:Marking_Structure'
+            u' xsi:type="tlpMarking:TLPMarkingStructureType" color="%s"/>\n'
+            u'            </marking:Marking>\n'
+            u'        </stix:Handling>\n' % tlp_color
+        )
+    if information_source is not None:
+        result.append(
+            u'        <stix:Information_Source>\n'
+            u'            <stixCommon:Identity>\n'
+            u'                <stixCommon:Name>%s</stixCommon:Name>\n'
+            u'            </stixCommon:Identity>\n'
+            u'        </stix:Information_Source>\n' % _escape(information_source)
+        )
+    result.append(u'    </stix:STIX_Header>\n')
+
+    return u''.join(result)
+
+
+def stix_content_block(namespace, namespaceuri, indicator, value,
+                       title=None, description=None, short_description=None,
+                       tlp_color=None, information_source=None):
+    """Renders the TAXII 1.1 content block with the STIX package of
+    an indicator.
+
+    Args:
+        namespace (str): prefix of the ids
+        namespaceuri (str): URI of the ids namespace
+        indicator (str): indicator
+        value (dict): indicator value, type should be in SUPPORTED_TYPES
+        title (str): title of the package
+        description (str): description of the package
+        short_description (str): short description of the package
+        tlp_color (str): TLP color of the package marking
+        information_source (str): name of the information source
+
+    Returns a tuple with the id of the package and the content block.
+    """
+    type_ = value['type']
+    indicator_type, observables, obj_namespaces = _TYPE_MAPPING[type_]
+
+    namespaces = _NAMESPACES + obj_namespaces
+    if tlp_color is not None:
+        namespaces = namespaces + _MARKING_NAMESPACES
+    namespaces = namespaces + [(namespace, namespaceuri)]
+
+    spid = '{}:indicator-{}'.format(namespace, uuid.uuid4())
+
+    result = [
+        _CONTENT_BLOCK_HEADER,
+        u'<stix:STIX_Package ',
+        u' '.join(
+            u'xmlns:{}="{}"'.format(p, _escape(uri).replace('"', '&quot;'))
+            for p, uri in namespaces
+        ),
+        u' id="%s" version="1.1.1">\n' % spid,
+        _stix_header(
+            title, description, short_description,
+            tlp_color, information_source
+        ),
+        u'    <stix:Indicators>\n'
+    ]
+
+    if type_ == 'URL':
+        eindicator = werkzeug.urls.iri_to_uri(indicator, safe_conversion=True)
+    else:
+        eindicator = indicator
+
+    ititle = _escape(u'{}: {}'.format(type_, eindicator))
+    idescription = _escape(u'{} indicator from {}'.format(
+        type_,
+        ', '.join(value['sources'])
+    ))
+    confidence = _confidence(value)
+
+    for object_type, otitle, properties in observables(type_, indicator):
+        result.append(_INDICATOR_TEMPLATE % {
+            'id': '{}:indicator-{}'.format(namespace, uuid.uuid4()),
+            'timestamp': datetime.utcnow().replace(tzinfo=pytz.utc).isoformat(),
+            'title': ititle,
+            'indicator_type': indicator_type,
+            'description': idescription,
+            'observable_id': '{}:observable-{}'.format(namespace, uuid.uuid4()),
+            'observable_title': _escape(otitle),
+            'object_id': '{}:{}-{}'.format(namespace, object_type, uuid.uuid4()),
+            'properties': properties,
+            'confidence': confidence
+        })
+
+    result.append(u'    </stix:Indicators>\n</stix:STIX_Package>')
+    result.append(_CONTENT_BLOCK_FOOTER)
+
+    return spid, u''.join(result).encode('ascii', 'xmlcharrefreplace')
@@ -28,6 +28,7 @@ Numbers are 8-bit unsigned.
 - Custom Metadata: (0,5)
 - Indicator Version: (1,0,<indicator>)
 - Indicator: (1,1,<indicator>)
+- Indicator Mark: (3,0,<indicator>)
 
 **INDICATORS**
 
@@ -70,6 +71,21 @@ deleted. This permits a sort of lazy garbage collection.
 To retrieve all the indicators with a specific attribute value just iterate
 over the keys (2,<index id>,0xF0,<encoded value>) and
 (2,<index id>,0xF0,<encoded value>,0xFF..FF)
+
+**MARKS**
+
+An indicator can have a mark, a 64-bit unsigned int stored outside of the
+indicator value. Setting a mark is a single write and does not touch the
+value nor the indexes of the indicator.
+
+The mark entry value is the indicator version followed by the mark. As for
+index entries, a mark is valid only if its version matches the current
+indicator version: a put of the indicator invalidates its mark.
+
+Marks are also indexed by value, with keys (3,1,<mark>,<indicator>) and
+value <version>, where <mark> is a 64-bit MSB unsigned int. The entry is
+moved when the mark is changed, entries of invalid marks are deleted
+lazily when iterating with `query_marks`.
 """
 
 import os
@@ -235,6 +251,19 @@ class Table(object):
         # skip version
         return ujson.loads(value[8:])
 
+    def get_prefix(self, prefix):
+        """Returns an iterator over (key, value) of the indicators with
+        key starting with *prefix*, retrieved with a single range scan.
+        """
+        if type(prefix) == unicode:
+            prefix = prefix.encode('utf8')
+
+        ri = self.db.iterator(prefix=self._indicator_key(prefix))
+        with ri:
+            for ekey, value in ri:
+                # skip version
+                yield ekey[2:].decode('utf8', 'ignore'), ujson.loads(value[8:])
+
     def delete(self, key):
         if type(key) == unicode:
             key = key.encode('utf8')
@@ -245,9 +274,14 @@ class Table(object):
         if self._get(ikeyv) is None:
             return
 
+        mark = self._get(self._indicator_key_mark(key))
+
         batch = self.db.write_batch()
         batch.delete(ikey)
         batch.delete(ikeyv)
+        if mark is not None:
+            batch.delete(self._mark_index_key(mark[8:], key))
+            batch.delete(self._indicator_key_mark(key))
         self.num_indicators -= 1
         batch.put(NUM_INDICATORS_KEY, struct.pack(">Q", self.num_indicators))
         batch.write()
@@ -258,6 +292,73 @@ class Table(object):
     def _indicator_key_version(self, key):
         return struct.pack("BB", 1, 0) + key
 
+    def _indicator_key_mark(self, key):
+        return struct.pack("BB", 3, 0) + key
+
+    def _mark_index_key(self, packed_mark, key):
+        return struct.pack("BB", 3, 1) + packed_mark + key
+
+    def touch(self, key, mark):
+        """Sets the mark of an existing indicator.
+
+        Returns False if the indicator does not exist.
+        """
+        if type(key) == unicode:
+            key = key.encode('utf8')
+
+        version = self._get(self._indicator_key_version(key))
+        if version is None:
+            return False
+
+        packed_mark = struct.pack(">Q", mark)
+        old_mark = self._get(self._indicator_key_mark(key))
+
+        batch = self.db.write_batch()
+        if old_mark is not None:
+            batch.delete(self._mark_index_key(old_mark[8:], key))
+        batch.put(self._indicator_key_mark(key), version+packed_mark)
+        batch.put(self._mark_index_key(packed_mark, key), version)
+        batch.write()
+
+        return True
+
+    def query_marks(self, to_mark):
+        """Returns an iterator over the keys of the indicators with a
+        valid mark lower than or equal to *to_mark*, in mark order.
+        """
+        ri = self.db.iterator(
+            start=self._mark_index_key(struct.pack(">Q", 0), ''),
+            stop=self._mark_index_key(struct.pack(">Q", to_mark+1), ''),
+            include_value=True
+        )
+        with ri:
+            for mkey, version in ri:
+                ekey = mkey[10:]
+
+                if self._get(self._indicator_key_version(ekey)) != version:
+                    # indicator deleted or put after the mark
+                    self.db.delete(mkey)
+                    continue
+
+                yield ekey.decode('utf8', 'ignore')
+
+    def get_mark(self, key):
+        """Returns the mark of the indicator, None if the indicator
+        has no valid mark.
+        """
+        if type(key) == unicode:
+            key = key.encode('utf8')
+
+        mark = self._get(self._indicator_key_mark(key))
+        if mark is None:
+            return None
+
+        version = self._get(self._indicator_key_version(key))
+        if version != mark[:8]:
+            return None
+
+        return struct.unpack(">Q", mark[8:])[0]
+
     def _index_key(self, idxid, value, lastidxid=None):
         key = struct.pack("BBB", 2, idxid, 0xF0)
 
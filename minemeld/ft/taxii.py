@@ -35,6 +35,7 @@ from six import string_types
 import libtaxii
 import libtaxii.clients
 import libtaxii.messages_11
+import libtaxii.constants
 from libtaxii.constants import MSG_STATUS_MESSAGE, ST_SUCCESS
 
 import stix.core.stix_package
@@ -61,6 +62,8 @@ import mixbox.namespaces
 from . import basepoller
 from . import base
 from . import actorbase
+from . import stixxml
+from .redis import age_out_sorted_set
 from .utils import dt_to_millisec, interval_in_sec, utc_millisec
 
 
@@ -1400,7 +1403,10 @@ class DataFeed(actorbase.ActorBaseFT):
             LOG.info('%s - age out interval too small, forced to 60 seconds')
             self.age_out_interval = 60
 
+        self.age_out_batch_size = self.config.get('age_out_batch_size', 1000)
+
         self.max_entries = self.config.get('max_entries', 1000 * 1000)
+        self.fast_stix_serializer = self.config.get('fast_stix_serializer', True)
 
         self.attributes_package_title = self.config.get('attributes_package_title', [])
         if not isinstance(self.attributes_package_title, list):
@@ -1483,8 +1489,6 @@ class DataFeed(actorbase.ActorBaseFT):
             LOG.error('%s - Unsupported indicator type: %s', self.name, type_)
             return
 
-        set_id_namespace(self.namespaceuri, self.namespace)
-
         title = None
         if len(self.attributes_package_title) != 0:
             for pt in self.attributes_package_title:
@@ -1521,18 +1525,68 @@ class DataFeed(actorbase.ActorBaseFT):
                 information_source = '{}'.format(value[isource])
                 break
 
-            if information_source is not None:
-                identity = stix.common.identity.Identity(name=information_source)
-                information_source = stix.common.information_source.InformationSource(identity=identity)
+        if value.get('confidence', None) is None:
+            LOG.error('%s - indicator without confidence', self.name)
 
-        handling = None
+        tlp_color = None
         share_level = value.get('share_level', None)
         if share_level in ['white', 'green', 'amber', 'red']:
+            tlp_color = share_level.upper()
+
+        # the TAXII content block is rendered here once, the poll
+        # service streams it as is
+        if self.fast_stix_serializer:
+            spid, content_block = stixxml.stix_content_block(
+                self.namespace, self.namespaceuri,
+                indicator, value,
+                title=title,
+                description=description,
+                short_description=sdescription,
+                tlp_color=tlp_color,
+                information_source=information_source
+            )
+
+        else:
+            spid, content_block = self._python_stix_content_block(
+                type_mapper, indicator, value,
+                title=title,
+                description=description,
+                short_description=sdescription,
+                tlp_color=tlp_color,
+                information_source=information_source
+            )
+
+        spackage = 'lz4cb'+lz4.frame.compress(
+            content_block+'\n',
+            compression_level=lz4.frame.COMPRESSIONLEVEL_MINHC
+        )
+        with self.SR.pipeline() as p:
+            p.multi()
+
+            p.zadd(self.redis_skey, score, spid)
+            p.hset(self.redis_skey_value, spid, spackage)
+
+            result = p.execute()[0]
+
+        self.statistics['added'] += result
+
+    def _python_stix_content_block(self, type_mapper, indicator, value,
+                                   title=None, description=None,
+                                   short_description=None, tlp_color=None,
+                                   information_source=None):
+        set_id_namespace(self.namespaceuri, self.namespace)
+
+        if information_source is not None:
+            identity = stix.common.identity.Identity(name=information_source)
+            information_source = stix.common.information_source.InformationSource(identity=identity)
+
+        handling = None
+        if tlp_color is not None:
             marking_specification = stix.data_marking.MarkingSpecification()
             marking_specification.controlled_structure = "//node() | //@*"
 
             tlp = stix.extensions.marking.tlp.TLPMarkingStructure()
-            tlp.color = share_level.upper()
+            tlp.color = tlp_color
             marking_specification.marking_structures.append(tlp)
 
             handling = stix.data_marking.Marking()
@@ -1542,13 +1596,13 @@ class DataFeed(actorbase.ActorBaseFT):
         if (title is not None or
             description is not None or
             handling is not None or
-            sdescription is not None or
+            short_description is not None or
             information_source is not None):
             header = stix.core.STIXHeader(
                 title=title,
                 description=description,
                 handling=handling,
-                short_description=sdescription,
+                short_description=short_description,
                 information_source=information_source
             )
 
@@ -1586,7 +1640,6 @@ class DataFeed(actorbase.ActorBaseFT):
 
             confidence = value.get('confidence', None)
             if confidence is None:
-                LOG.error('%s - indicator without confidence', self.name)
                 sindicator.confidence = "Unknown"  # We shouldn't be here
             elif confidence < 50:
                 sindicator.confidence = "Low"
@@ -1601,19 +1654,12 @@ class DataFeed(actorbase.ActorBaseFT):
 
             sp.add_indicator(sindicator)
 
-        spackage = 'lz4'+lz4.frame.compress(
-            sp.to_json(),
-            compression_level=lz4.frame.COMPRESSIONLEVEL_MINHC
+        content_block = libtaxii.messages_11.ContentBlock(
+            content_binding=libtaxii.constants.CB_STIX_XML_11,
+            content=sp.to_xml(ns_dict={self.namespaceuri: self.namespace})
         )
-        with self.SR.pipeline() as p:
-            p.multi()
 
-            p.zadd(self.redis_skey, score, spid)
-            p.hset(self.redis_skey_value, spid, spackage)
-
-            result = p.execute()[0]
-
-        self.statistics['added'] += result
+        return spid, content_block.to_xml()
 
     def _delete_indicator(self, indicator_id):
         with self.SR.pipeline() as p:
@@ -1631,17 +1677,23 @@ class DataFeed(actorbase.ActorBaseFT):
             now = utc_millisec()
             low_watermark = now - self.age_out_interval*1000
 
-            otimestamp, oindicator = self._read_oldest_indicator()
+            removed = age_out_sorted_set(
+                self.SR,
+                self.redis_skey, self.redis_skey_value,
+                low_watermark,
+                batch_size=self.age_out_batch_size
+            )
+            self.statistics['removed'] += removed
+
+            otimestamp, _ = self._read_oldest_indicator()
             LOG.debug(
-                '{} - low watermark: {} otimestamp: {}'.format(
+                '{} - low watermark: {} otimestamp: {} removed: {}'.format(
                     self.name,
                     low_watermark,
-                    otimestamp
+                    otimestamp,
+                    removed
                 )
             )
-            while otimestamp is not None and otimestamp < low_watermark:
-                self._delete_indicator(oindicator)
-                otimestamp, oindicator = self._read_oldest_indicator()
 
             wait_time = 30
             if otimestamp is not None:
@@ -16,10 +16,12 @@ from __future__ import absolute_import
 
 import logging
 import os
+import shutil
 import yaml
 from datetime import datetime, timedelta
 from uuid import UUID
 
+import plyvel
 import pytz
 import requests
 import requests.structures
@@ -45,6 +47,116 @@ _STIX2_TYPES_TO_MM_TYPES = {
     'sha-256': 'sha256'
 }
 
+_STIX2_TYPES = ['indicator', 'attack-pattern', 'relationship']
+
+
+def _parse_stix2_timestamp(ts):
+    try:
+        return datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S.%fZ')
+    except ValueError:
+        return datetime.strptime(ts, '%Y-%m-%dT%H:%M:%SZ')
+
+
+class _STIX2Index(object):
+    """Index of the indicators, relationships and attack patterns
+    received from a collection.
+
+    Objects are kept in memory until *max_objects* is exceeded, then
+    the whole index is moved to a temporary LevelDB database in *path*.
+    Relationships are indexed by *source_ref*, indicators and attack
+    patterns by *id*.
+
+    Args:
+        path (str): path of the temporary database
+        max_objects (int): max number of objects kept in memory
+    """
+    def __init__(self, path, max_objects):
+        self.path = path
+        self.max_objects = max_objects
+
+        self.num_objects = 0
+        self.db = None
+
+        self._indicators = {}
+        self._relationships = {}
+        self._attack_patterns = {}
+
+    def _spill(self):
+        LOG.info('%s - STIX2 index exceeded %d objects, moving to disk',
+                 self.path, self.max_objects)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.db = plyvel.DB(self.path, create_if_missing=True)
+
+        with self.db.write_batch() as batch:
+            for obj in self._indicators.itervalues():
+                self._db_put(batch, obj)
+            for rels in self._relationships.itervalues():
+                for obj in rels.itervalues():
+                    self._db_put(batch, obj)
+            for obj in self._attack_patterns.itervalues():
+                self._db_put(batch, obj)
+
+        self._indicators = None
+        self._relationships = None
+        self._attack_patterns = None
+
+    def _db_key(self, obj):
+        otype = obj['type']
+        if otype == 'relationship':
+            return 'r\x00{}\x00{}'.format(obj['source_ref'], obj['id'])
+        if otype == 'indicator':
+            return 'i\x00{}'.format(obj['id'])
+        return 'a\x00{}'.format(obj['id'])
+
+    def _db_put(self, db, obj):
+        db.put(self._db_key(obj).encode('utf-8'), ujson.dumps(obj))
+
+    def _db_get(self, key):
+        value = self.db.get(key.encode('utf-8'))
+        if value is None:
+            return None
+        return ujson.loads(value)
+
+    def put(self, obj):
+        self.num_objects += 1
+        if self.db is None and self.num_objects > self.max_objects:
+            self._spill()
+
+        if self.db is not None:
+            self._db_put(self.db, obj)
+            return
+
+        otype = obj['type']
+        if otype == 'indicator':
+            self._indicators[obj['id']] = obj
+        elif otype == 'relationship':
+            self._relationships.setdefault(obj['source_ref'], {})[obj['id']] = obj
+        elif otype == 'attack-pattern':
+            self._attack_patterns[obj['id']] = obj
+
+    def indicator(self, id_):
+        if self.db is not None:
+            return self._db_get('i\x00{}'.format(id_))
+        return self._indicators.get(id_, None)
+
+    def attack_pattern(self, id_):
+        if self.db is not None:
+            return self._db_get('a\x00{}'.format(id_))
+        return self._attack_patterns.get(id_, None)
+
+    def relationships(self, source_ref):
+        if self.db is not None:
+            prefix = 'r\x00{}\x00'.format(source_ref).encode('utf-8')
+            return [ujson.loads(v) for _, v in self.db.iterator(prefix=prefix)]
+        return self._relationships.get(source_ref, {}).values()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+            shutil.rmtree(self.path, ignore_errors=True)
+
 
 class Taxii2Client(basepoller.BasePollerFT):
     def __init__(self, name, chassis, config):
@@ -66,6 +178,9 @@ class Taxii2Client(basepoller.BasePollerFT):
 
         # options for processing
         self.lower_timestamp_precision = self.config.get('lower_timestamp_precision', False)
+        # max number of STIX2 objects indexed in memory during a poll,
+        # above this the index is moved to a temporary database on disk
+        self.max_objects_in_memory = self.config.get('max_objects_in_memory', 100000)
 
         self.auth_type = self.config.get('auth_type', 'none')
 
@@ -358,17 +473,37 @@ class Taxii2Client(basepoller.BasePollerFT):
             elif isinstance(obj, list):
                 objs.extend(obj)
 
+    def _max_modified(self, objs, current):
+        """Returns the most recent *modified* timestamp between *current*
+        and the timestamps of *objs*, as a (datetime, str) tuple.
+        """
+        for obj in objs:
+            modified = obj.get('modified', None)
+            if modified is None:
+                continue
+
+            try:
+                dt = _parse_stix2_timestamp(modified)
+            except ValueError:
+                LOG.error('%s - invalid modified timestamp %s', self.name, modified)
+                continue
+
+            if current is None or dt > current[0]:
+                current = (dt, modified)
+
+        return current
+
     def _poll_taxii21_server(self):
         """
         TAXII 2.1 uses a limit url query parameter and a 'more' true/false key in the returned data
         https://docs.oasis-open.org/cti/taxii/v2.1/csprd01/taxii-v2.1-csprd01.html#_Toc532988055
-        :return: list of objects
+        :return: iterator over the pages of objects
         """
 
-        data = []
         params = {'limit': '100'}
         if self.last_stix2_package_ts:
             params['added_after'] = self.last_stix2_package_ts
+        max_modified = None
         fetch_more = True
 
         while fetch_more:
@@ -383,41 +518,37 @@ class Taxii2Client(basepoller.BasePollerFT):
                 try:
                     r_json = ujson.loads(r.text)
                     # Filter objects by type in the data returned by the TAXII 2.x server
-                    types = ['indicator', 'attack-pattern', 'relationship']
-                    objs = self._explore(r_json, types)
-                    data.extend(objs)
-
-                    # Sort the objs in data by timestamp to find the most recent timestamp
-                    data.sort(key=lambda x: datetime.strptime(x['modified'], '%Y-%m-%dT%H:%M:%S.%fZ'))
-                    if len(data):
-                        ts = data[-1]['modified']
+                    objs = list(self._explore(r_json, _STIX2_TYPES))
+
+                    # Track the most recent timestamp
+                    max_modified = self._max_modified(objs, max_modified)
+                    if max_modified is not None:
+                        ts = max_modified[1]
                         params['added_after'] = ts
                         self.last_stix2_package_ts = ts
 
-                    if 'more' in r_json and r_json['more'] is True:
-                        pass
-                    else:
-                        break
                 except Exception as e:
                     LOG.exception(e)
                     break
+
+                yield objs
+
+                if 'more' not in r_json or r_json['more'] is not True:
+                    break
             else:
                 break
 
-        return data
-
     def _poll_taxii20_server(self):
         """
         TAXII 2.0 uses Range and Content-Range headers for pagination
         http://docs.oasis-open.org/cti/taxii/v2.0/cs01/taxii-v2.0-cs01.html#_Toc496542715
-        :return: list of objects
+        :return: iterator over the pages of objects
         """
 
-        data = []
-        size = 100
         params = {}
         if self.last_stix2_package_ts:
             params['added_after'] = self.last_stix2_package_ts
+        max_modified = None
         fetch_more = True
 
         while fetch_more:
@@ -433,16 +564,14 @@ class Taxii2Client(basepoller.BasePollerFT):
                 try:
                     r_json = ujson.loads(r.text)
                     # Filter objects by type in the data returned by the TAXII 2.x server
-                    types = ['indicator', 'attack-pattern', 'relationship']
-                    objs = self._explore(r_json, types)
-                    data.extend(objs)
+                    objs = list(self._explore(r_json, _STIX2_TYPES))
 
-                    # Sort the objs in data by timestamp to find the most recent timestamp
-                    data.sort(key=lambda x: datetime.strptime(x['modified'], '%Y-%m-%dT%H:%M:%S.%fZ'))
-
-                    if len(data):
-                        self.last_stix2_package_ts = data[-1]['modified']
+                    # Track the most recent timestamp
+                    max_modified = self._max_modified(objs, max_modified)
+                    if max_modified is not None:
+                        self.last_stix2_package_ts = max_modified[1]
 
+                    next_range = None
                     content_range = r.headers.get('Content-Range', None)
                     if content_range and content_range.startswith('items '):
                         content_range_start_end_size = content_range[6:]
@@ -454,65 +583,112 @@ class Taxii2Client(basepoller.BasePollerFT):
                         next_end = next_start + (int(content_range_end) - int(content_range_start)) + 1
 
                         if next_start < int(content_range_size):
-                            updated_content_range = 'items {}-{}'.format(next_start, next_end)
-                            self.client.headers.update({'Range': updated_content_range})
-                        else:
-                            break
-                    else:
-                        break
+                            next_range = 'items {}-{}'.format(next_start, next_end)
+
                 except Exception as e:
                     LOG.exception(e)
                     break
+
+                yield objs
+
+                if next_range is None:
+                    break
+                self.client.headers.update({'Range': next_range})
             else:
                 break
 
-        return data
+    def _resolve_indicator(self, index, indicator, pending_ttps):
+        """Converts *indicator* using the relationships and the attack
+        patterns in *index*. Attack patterns not received yet are
+        recorded in *pending_ttps*.
+        """
+        i_rels = index.relationships(indicator['id'])
+
+        i_ttps = []
+        for x in i_rels:
+            if not x['target_ref'].startswith('attack-pattern'):
+                continue
+
+            ttp = index.attack_pattern(x['target_ref'])
+            if ttp is None:
+                pending_ttps.setdefault(x['target_ref'], set()).add(indicator['id'])
+                continue
+
+            i_ttps.append(ttp)
+
+        return self._convert_stix2_obj_to_mm_obj(indicator, i_rels, i_ttps)
 
     def _poll_and_filter_collection(self, begin=None, end=None):
-        if self.client:
-            if self.taxii_collection:
-                if self.taxii_version == '2.0':
-                    data = self._poll_taxii20_server()
-                elif self.taxii_version == '2.1':
-                    data = self._poll_taxii21_server()
-                else:
-                    # Unsupported
-                    data = []
+        if not self.client:
+            raise RuntimeError('client does not exist {}'.format(self.collection))
 
-                raw_objs = data
+        if not self.taxii_collection:
+            raise RuntimeError('no collection {}'.format(self.collection))
 
-                # Sort objects by type in the data returned by the TAXII 2.x server
-                objs = {}
-                types = ['indicator', 'attack-pattern', 'relationship']
-                for k in types:
-                    objs[k] = []
+        if self.taxii_version == '2.0':
+            pages = self._poll_taxii20_server()
+        elif self.taxii_version == '2.1':
+            pages = self._poll_taxii21_server()
+        else:
+            # Unsupported
+            pages = []
+
+        # Relationships and attack patterns of an indicator can be received
+        # in any page. Indicators are converted at the end of the page where
+        # they are received, and converted again at the end of the poll
+        # if relationships or attack patterns are received later.
+        index = _STIX2Index(
+            '{}.stix2-temp'.format(self.name),
+            self.max_objects_in_memory
+        )
+        converted = set()
+        dirty = set()
+        pending_ttps = {}
 
-                for obj in raw_objs:
-                    if obj['type'] == 'indicator' and 'pattern' in obj:
-                        objs[obj['type']].append(obj)
-                    else:
-                        objs[obj['type']].append(obj)
+        try:
+            for page in pages:
+                new_indicators = []
+
+                for obj in page:
+                    otype = obj['type']
+
+                    if otype == 'indicator':
+                        if 'pattern' not in obj:
+                            continue
+                        index.put(obj)
+                        if obj['id'] in converted:
+                            dirty.add(obj['id'])
+                        else:
+                            new_indicators.append(obj['id'])
+
+                    elif otype == 'relationship':
+                        index.put(obj)
+                        if obj['source_ref'] in converted:
+                            dirty.add(obj['source_ref'])
 
-                ids_to_ttps = {}
-                for t in objs['attack-pattern']:
-                    ids_to_ttps[t['id']] = t
+                    elif otype == 'attack-pattern':
+                        index.put(obj)
+                        dirty.update(pending_ttps.pop(obj['id'], []))
 
-                indicators = []
-                for i in objs['indicator']:
-                    i_rels = [x for x in objs['relationship'] if i['id'] == x['source_ref']]
-                    i_ttp_rels = [x for x in i_rels if x['target_ref'].startswith('attack-pattern')]
-                    i_ttps = [ids_to_ttps[x['target_ref']] for x in i_ttp_rels]
+                for id_ in new_indicators:
+                    if id_ in converted:
+                        continue
+                    converted.add(id_)
 
-                    mm_is = self._convert_stix2_obj_to_mm_obj(i, i_rels, i_ttps)
+                    mm_is = self._resolve_indicator(index, index.indicator(id_), pending_ttps)
                     if mm_is:
                         # The indicator pattern is valid and was parsed
-                        indicators.extend(mm_is)
+                        for i in mm_is:
+                            yield i
 
-                return indicators
-            else:
-                raise RuntimeError('no collection {}'.format(self.collection))
-        else:
-            raise RuntimeError('client does not exist {}'.format(self.collection))
+            for id_ in dirty:
+                mm_is = self._resolve_indicator(index, index.indicator(id_), pending_ttps)
+                if mm_is:
+                    for i in mm_is:
+                        yield i
+
+        finally:
+            index.close()
 
     def _incremental_poll_collection(self, begin, end):
         cbegin = begin
@@ -609,6 +785,8 @@ class Taxii2Client(basepoller.BasePollerFT):
     def gc(name, config=None):
         basepoller.BasePollerFT.gc(name, config=config)
 
+        shutil.rmtree('{}.stix2-temp'.format(name), ignore_errors=True)
+
         side_config_path = None
         if config is not None:
             side_config_path = config.get('side_config', None)
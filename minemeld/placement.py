@@ -0,0 +1,303 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This module implements the placement of the nodes of the graph
+in the chassis.
+
+Nodes are placed to minimize the estimated traffic on edges crossing
+chassis, while keeping the estimated load and the number of nodes of
+each chassis balanced. Traffic on an edge is estimated from the number
+of indicators of the source node saved at the last checkpoint.
+"""
+
+import os.path
+import logging
+import json
+from collections import defaultdict
+
+from .startupplanner import _build_graph
+
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_LENGTH = 1000
+DEFAULT_CLASS_WEIGHT = 1.0
+CLASS_WEIGHTS = {
+    'minemeld.ft.op.AggregateFT': 2.0,
+    'minemeld.ft.ipop.AggregateIPv4FT': 4.0,
+    'minemeld.ft.ipop.AggregateIPv6FT': 4.0,
+    'minemeld.ft.taxii.DataFeed': 2.0
+}
+MAX_LOAD_IMBALANCE = 0.25
+MAX_REFINE_PASSES = 10
+
+
+def _checkpoint_length(nodename, state_dir):
+    try:
+        with open(os.path.join(state_dir, nodename+'.chkp'), 'r') as f:
+            contents = f.read()
+
+    except (IOError, OSError):
+        return None
+
+    if not contents.startswith('{'):
+        return None
+
+    try:
+        return json.loads(contents).get('length', None)
+
+    except ValueError:
+        LOG.error('Error parsing checkpoint of {}'.format(nodename))
+        return None
+
+
+def estimate_traffic(config, state_dir='.'):
+    """Estimates the number of indicators published by each node,
+    using the length saved at the last checkpoint.
+
+    Args:
+        config (MineMeldConfig): config
+        state_dir (str): directory of the checkpoint files
+
+    Returns a dictionary where keys are node names and values
+    the estimated number of indicators.
+    """
+    result = {}
+    for nodename in config.nodes.keys():
+        length = _checkpoint_length(nodename, state_dir)
+        if length is None:
+            length = DEFAULT_LENGTH
+        result[nodename] = length
+
+    return result
+
+
+def estimate_load(config, traffic, class_weights=None):
+    """Estimates the load of each node.
+
+    The load of a node is the weight of its class times the number of
+    indicators it handles, the larger between the number of indicators
+    received from the inputs and the number of indicators it holds.
+
+    Args:
+        config (MineMeldConfig): config
+        traffic (dict): estimated indicators published by each node
+        class_weights (dict): weight of each node class, overrides
+            the defaults in CLASS_WEIGHTS
+
+    Returns a dictionary where keys are node names and values
+    the estimated load.
+    """
+    weights = dict(CLASS_WEIGHTS)
+    if class_weights is not None:
+        weights.update(class_weights)
+
+    result = {}
+    for nodename, nodevalue in config.nodes.iteritems():
+        received = sum(
+            traffic.get(i, 0) for i in nodevalue.get('inputs', [])
+        )
+        weight = weights.get(nodevalue.get('class', None), DEFAULT_CLASS_WEIGHT)
+        result[nodename] = weight*max(received, traffic.get(nodename, 0), 1)
+
+    return result
+
+
+class _Placement(object):
+    def __init__(self, graph, num_chassis, max_nodes, max_load,
+                 traffic, load):
+        self.graph = graph
+        self.max_nodes = max_nodes
+        self.max_load = max_load
+        self.traffic = traffic
+        self.load = load
+
+        self.chassis = {}
+        self.chassis_nodes = [0]*num_chassis
+        self.chassis_load = [0]*num_chassis
+
+    def _neighbors_traffic(self, nodename):
+        result = defaultdict(int)
+
+        for p in self.graph.predecessors(nodename):
+            if p in self.chassis:
+                result[self.chassis[p]] += self.traffic.get(p, 0)
+
+        for s in self.graph.successors(nodename):
+            if s in self.chassis:
+                result[self.chassis[s]] += self.traffic.get(nodename, 0)
+
+        return result
+
+    def _fits(self, nodename, c):
+        if self.chassis_nodes[c] >= self.max_nodes:
+            return False
+
+        if self.chassis_nodes[c] == 0:
+            return True
+
+        return self.chassis_load[c]+self.load[nodename] <= self.max_load
+
+    def _assign(self, nodename, c):
+        self.chassis[nodename] = c
+        self.chassis_nodes[c] += 1
+        self.chassis_load[c] += self.load[nodename]
+
+    def _unassign(self, nodename):
+        c = self.chassis.pop(nodename)
+        self.chassis_nodes[c] -= 1
+        self.chassis_load[c] -= self.load[nodename]
+
+    def place(self, nodename):
+        ntraffic = self._neighbors_traffic(nodename)
+
+        candidates = [
+            c for c in range(len(self.chassis_nodes))
+            if self._fits(nodename, c)
+        ]
+        if len(candidates) == 0:
+            # no chassis has room for the load, fallback
+            # to the least loaded chassis with room for the node
+            candidates = [
+                c for c in range(len(self.chassis_nodes))
+                if self.chassis_nodes[c] < self.max_nodes
+            ]
+            candidates = [min(candidates, key=lambda c: self.chassis_load[c])]
+
+        best = max(
+            candidates,
+            key=lambda c: (ntraffic[c], -self.chassis_load[c], -c)
+        )
+        self._assign(nodename, best)
+
+    def refine(self):
+        """Moves single nodes between chassis while that reduces the
+        traffic crossing chassis.
+        """
+        for _ in range(MAX_REFINE_PASSES):
+            moved = False
+
+            for nodename in sorted(self.chassis.keys()):
+                current = self.chassis[nodename]
+
+                self._unassign(nodename)
+                ntraffic = self._neighbors_traffic(nodename)
+
+                best = current
+                for c in range(len(self.chassis_nodes)):
+                    if c == current or not self._fits(nodename, c):
+                        continue
+                    if ntraffic[c] > ntraffic[best]:
+                        best = c
+
+                self._assign(nodename, best)
+                if best != current:
+                    moved = True
+
+            if not moved:
+                break
+
+
+def plan(config, num_chassis, max_nodes, traffic=None, load=None):
+    """Assigns the nodes of the graph to the chassis.
+
+    Args:
+        config (MineMeldConfig): config
+        num_chassis (int): number of chassis
+        max_nodes (int): max number of nodes per chassis
+        traffic (dict): estimated indicators published by each node,
+            if None the same traffic is assumed for each node
+        load (dict): estimated load of each node, if None it is
+            estimated from *traffic*
+
+    Returns a list of lists of node names, one per chassis.
+    """
+    if num_chassis == 0:
+        return []
+
+    if traffic is None:
+        traffic = {n: DEFAULT_LENGTH for n in config.nodes.keys()}
+    if load is None:
+        load = estimate_load(config, traffic)
+
+    graph = _build_graph(config)
+
+    num_nodes = len(config.nodes)
+    max_nodes = max(max_nodes, (num_nodes+num_chassis-1)//num_chassis)
+    max_load = (1.0+MAX_LOAD_IMBALANCE)*sum(load.values())/num_chassis
+
+    placement = _Placement(
+        graph=graph,
+        num_chassis=num_chassis,
+        max_nodes=max_nodes,
+        max_load=max_load,
+        traffic=traffic,
+        load=load
+    )
+
+    # heaviest nodes first, so that they pull their neighbors
+    # in the same chassis
+    for nodename in sorted(config.nodes.keys(), key=lambda n: (-load[n], n)):
+        placement.place(nodename)
+    placement.refine()
+
+    result = [[] for _ in range(num_chassis)]
+    for nodename in sorted(placement.chassis.keys()):
+        result[placement.chassis[nodename]].append(nodename)
+
+    return result
+
+
+def round_robin(config, num_chassis):
+    """Assigns the nodes to the chassis in round robin, ignoring
+    the topology of the graph.
+
+    Returns a list of lists of node names, one per chassis.
+    """
+    result = [[] for _ in range(num_chassis)]
+    for j, nodename in enumerate(config.nodes.keys()):
+        result[j % num_chassis].append(nodename)
+
+    return result
+
+
+def cross_traffic(config, chassis_list, traffic):
+    """Computes edges and estimated traffic crossing chassis.
+
+    Args:
+        config (MineMeldConfig): config
+        chassis_list (list): list of lists of node names, one per chassis
+        traffic (dict): estimated indicators published by each node
+
+    Returns a tuple with the number of edges crossing chassis, the total
+    number of edges, the estimated indicators crossing chassis and the
+    total estimated indicators on edges.
+    """
+    chassis = {}
+    for c, nodes in enumerate(chassis_list):
+        for nodename in nodes:
+            chassis[nodename] = c
+
+    cross_edges, total_edges = 0, 0
+    cross_indicators, total_indicators = 0, 0
+    for src, dst in _build_graph(config).edges():
+        total_edges += 1
+        total_indicators += traffic.get(src, 0)
+
+        if chassis.get(src, None) != chassis.get(dst, None):
+            cross_edges += 1
+            cross_indicators += traffic.get(src, 0)
+
+    return cross_edges, total_edges, cross_indicators, total_indicators
@@ -49,6 +49,7 @@ RUNNING_CONFIG = 'running-config.yml'
 PROTOTYPE_ENV = 'MINEMELD_PROTOTYPE_PATH'
 MGMTBUS_NUM_CONNS_ENV = 'MGMTBUS_NUM_CONNS'
 FABRIC_NUM_CONNS_ENV = 'FABRIC_NUM_CONNS'
+FABRIC_BATCH_SIZE_ENV = 'FABRIC_BATCH_SIZE'
 
 CHANGE_ADDED = 0
 CHANGE_DELETED = 1
@@ -184,10 +185,15 @@ class MineMeldConfig(_Config):
                 os.getenv(FABRIC_NUM_CONNS_ENV, 50)
             )
 
+            fabric_batch_size = int(
+                os.getenv(FABRIC_BATCH_SIZE_ENV, 1)
+            )
+
             fabric = {
                 'class': 'ZMQRedis',
                 'config': {
                     'num_connections': fabric_num_conns,
+                    'batch_size': fabric_batch_size,
                     'priority': gevent.core.MINPRI  # pylint:disable=E1101
                 }
             }
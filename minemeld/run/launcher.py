@@ -31,6 +31,7 @@ import psutil
 import minemeld.chassis
 import minemeld.mgmtbus
 import minemeld.comm
+import minemeld.placement
 import minemeld.run.config
 
 from minemeld import __version__
@@ -38,7 +39,7 @@ from minemeld import __version__
 LOG = logging.getLogger(__name__)
 
 
-def _run_chassis(fabricconfig, mgmtbusconfig, fts):
+def _run_chassis(fabricconfig, mgmtbusconfig, fts, remote_topics=None):
     try:
         # lower priority to make master and web
         # more "responsive"
@@ -49,7 +50,7 @@ def _run_chassis(fabricconfig, mgmtbusconfig, fts):
             fabricconfig['config'],
             mgmtbusconfig
         )
-        c.configure(fts)
+        c.configure(fts, remote_topics=remote_topics)
 
         gevent.signal(signal.SIGUSR1, c.stop)
 
@@ -74,6 +75,45 @@ def _run_chassis(fabricconfig, mgmtbusconfig, fts):
         raise
 
 
+def _local_fabric():
+    """Returns True if messages between nodes in the same chassis
+    should be delivered in memory, instead of over the comm backend
+    """
+    return os.environ.get('MM_LOCAL_FABRIC', 'false').lower() in ['1', 'true', 'yes']
+
+
+def _remote_topics(ftlist, nodes):
+    """Returns the list of topics published by nodes in ftlist with
+    subscribers outside ftlist
+    """
+    result = set()
+    for nodename, nodevalue in nodes.iteritems():
+        if nodename in ftlist:
+            continue
+
+        for i in nodevalue.get('inputs', []):
+            if i in ftlist:
+                result.add(i)
+
+    return list(result)
+
+
+def _print_placement(ftlists, config, traffic, load):
+    for c, ftlist in enumerate(ftlists):
+        print('chassis {} - nodes: {} estimated load: {:.0f}'.format(
+            c, len(ftlist), sum(load[n] for n in ftlist)
+        ))
+        for nodename in ftlist:
+            print('  {} ({})'.format(nodename, config.nodes[nodename].get('class', None)))
+
+    cross_edges, total_edges, cross_indicators, total_indicators = \
+        minemeld.placement.cross_traffic(config, ftlists, traffic)
+    print('edges crossing chassis: {}/{}'.format(cross_edges, total_edges))
+    print('estimated indicators crossing chassis: {}/{}'.format(
+        cross_indicators, total_indicators
+    ))
+
+
 def _check_disk_space(num_nodes):
     free_disk_per_node = int(os.environ.get(
         'MM_DISK_SPACE_PER_NODE',
@@ -122,6 +162,18 @@ def _parse_args():
         metavar='NPC',
         help='number of nodes per chassis (default 15)'
     )
+    parser.add_argument(
+        '--placement',
+        default='graph',
+        choices=['graph', 'roundrobin'],
+        action='store',
+        help='strategy used to assign nodes to chassis (default graph)'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='print the placement of nodes in chassis and exit'
+    )
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -218,7 +270,7 @@ def main():
 
     LOG.info("mm-run.py config: %s", config)
 
-    if _check_disk_space(num_nodes=len(config.nodes)) is None:
+    if not args.dry_run and _check_disk_space(num_nodes=len(config.nodes)) is None:
         LOG.critical('Not enough disk space available, exit')
         return 2
 
@@ -239,12 +291,28 @@ def main():
     )
     LOG.info("Number of chassis: %d", np)
 
-    ftlists = [{} for j in range(np)]
-    j = 0
-    for ft in config.nodes:
-        pn = j % len(ftlists)
-        ftlists[pn][ft] = config.nodes[ft]
-        j += 1
+    traffic = minemeld.placement.estimate_traffic(config)
+    load = minemeld.placement.estimate_load(config, traffic)
+    if args.placement == 'roundrobin':
+        placement = minemeld.placement.round_robin(config, np)
+    else:
+        placement = minemeld.placement.plan(
+            config,
+            num_chassis=np,
+            max_nodes=int(math.ceil(npc)),
+            traffic=traffic,
+            load=load
+        )
+
+    if args.dry_run:
+        _print_placement(placement, config, traffic, load)
+        return 0
+
+    LOG.info('placement: %s', placement)
+    ftlists = [
+        {ft: config.nodes[ft] for ft in ftlist}
+        for ftlist in placement
+    ]
 
     # cleanup
     if config.mgmtbus['transport']['class'] != config.fabric['class']:
@@ -254,17 +322,25 @@ def main():
     signal.signal(signal.SIGINT, signal.SIG_IGN)
     signal.signal(signal.SIGTERM, signal.SIG_IGN)
 
+    local_fabric = _local_fabric()
+    LOG.info('local fabric delivery: %s', local_fabric)
+
     processes = []
     for g in ftlists:
         if len(g) == 0:
             continue
 
+        remote_topics = None
+        if local_fabric:
+            remote_topics = _remote_topics(g, config.nodes)
+
         p = multiprocessing.Process(
             target=_run_chassis,
             args=(
                 config.fabric,
                 config.mgmtbus,
-                g
+                g,
+                remote_topics
             )
         )
         processes.append(p)
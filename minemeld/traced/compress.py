@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+"""
+Conversion utility for MineMeld trace tables, compresses the logs of
+existing day tables with the format used by mm-traced when store
+compression is enabled.
+
+Tables opened by a running mm-traced are locked by LevelDB and skipped.
+"""
+
+import logging
+import os
+import sys
+import argparse
+import json
+
+import minemeld.traced.storage
+
+LOG = logging.getLogger(__name__)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compress existing MineMeld trace tables"
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Dry run'
+    )
+    parser.add_argument(
+        'config',
+        action='store',
+        metavar='CONFIG',
+        nargs='?',
+        help='path of the config file'
+    )
+    return parser.parse_args()
+
+
+def main():
+    trace_directory = '/opt/minemeld/local/trace'
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s: %(message)s'
+    )
+
+    args = _parse_args()
+
+    if args.config is not None:
+        try:
+            with open(args.config, 'r') as f:
+                config = json.load(f)
+
+        except (IOError, ValueError) as e:
+            LOG.critical(
+                'Error loading config file %s: %s' % (args.config, str(e))
+            )
+            sys.exit(1)
+
+        trace_directory = config.get('trace_directory', trace_directory)
+
+    trace_directory = os.environ.get(
+        'MINEMELD_TRACE_DIRECTORY',
+        trace_directory
+    )
+    if not os.path.isdir(trace_directory):
+        LOG.critical("%s is not a directory", trace_directory)
+        sys.exit(1)
+
+    os.chdir(trace_directory)
+
+    total_before = 0
+    total_after = 0
+    for t in minemeld.traced.storage.Table.list_tables():
+        size_before = minemeld.traced.storage.Table.disk_usage(t)
+
+        if args.dry_run:
+            LOG.info('Table %s: %d bytes', t, size_before)
+            continue
+
+        try:
+            table = minemeld.traced.storage.Table(t, create_if_missing=False)
+
+        except minemeld.traced.storage.TableNotFound as e:
+            LOG.error('Error opening table %s, skipped: %s', t, str(e))
+            continue
+
+        try:
+            num_logs = table.compress_logs()
+
+        except Exception:
+            LOG.exception('Error compressing table %s', t)
+            continue
+
+        finally:
+            table.close()
+
+        size_after = minemeld.traced.storage.Table.disk_usage(t)
+        total_before += size_before
+        total_after += size_after
+
+        LOG.info(
+            'Table %s: %d logs compressed, %d -> %d bytes',
+            t, num_logs, size_before, size_after
+        )
+
+    LOG.info('Total: %d -> %d bytes', total_before, total_after)
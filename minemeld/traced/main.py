@@ -103,6 +103,7 @@ def main():
     LOG.info('mm-traced config: %s', config)
 
     store = minemeld.traced.storage.Store(config.get('store', None))
+    store.start()
 
     transport_config = config.get('transport', {
         'class': 'ZMQRedis',
@@ -23,15 +23,24 @@ import ujson
 import re
 import os
 
+import collections
+
 import gevent
 import greenlet
 import gevent.lock
 import gevent.event
+import gevent.queue
 import redis
 
+from .storage import INDEXED_FIELDS
+
 LOG = logging.getLogger(__name__)
 
 QUERY_QUEUE = 'mmtraced:query'
+# max number of lines published in a single message
+PUBLISH_BATCH_SIZE = 100
+
+_END_OF_DAY = object()
 
 _REGEX_SPECIAL_CHARS = [
     '[', '\\', '^', '$', '.', '|', '?', '*', '+', '(', ')'
@@ -58,6 +67,7 @@ class Query(gevent.Greenlet):
 
         LOG.info("Query %s - %s", uuid, query)
         self._parse_query(query)
+        self._plan_query()
 
     def _parse_query(self, query):
         query = query.strip()
@@ -73,6 +83,8 @@ class Query(gevent.Greenlet):
                 c = c[1:]
 
             matching_re = c
+            field = None
+            value = None
             if field_specific.match(c) is not None:
                 field, value = c.split(':', 1)
 
@@ -99,11 +111,39 @@ class Query(gevent.Greenlet):
                 )
                 LOG.debug(matching_re)
 
+            # a quoted value, like indicator:"1.1.1.1", matches only the
+            # whole field value and can be looked up in the indexes
+            indexed = False
+            if field in INDEXED_FIELDS and len(value) > 2:
+                indexed = (value[0] == value[-1] == '"')
+                indexed = indexed and ('"' not in value[1:-1])
+            if indexed:
+                value = value[1:-1]
+                if isinstance(value, unicode):
+                    value = value.encode('utf-8')
+
             self.parsed_query.append({
                 're': re.compile(matching_re, re.IGNORECASE),
-                'negate': negate
+                'negate': negate,
+                'field': field if indexed else None,
+                'value': value if indexed else None
             })
 
+    def _plan_query(self):
+        """Selects the index used to retrieve the logs: the first
+        positive term with a quoted value on an indexed field. The index
+        only selects the candidate logs, all the terms are still checked
+        with regular expressions on the raw logs. Partial terms and
+        tables without indexes are scanned.
+        """
+        self.index = None
+        for q in self.parsed_query:
+            if q['field'] is not None and not q['negate']:
+                self.index = (q['field'], q['value'])
+                break
+
+        LOG.info("Query %s - index: %s", self.uuid, self.index)
+
     def _check_query(self, log):
         for q in self.parsed_query:
             occ = q['re'].search(log)
@@ -111,43 +151,120 @@ class Query(gevent.Greenlet):
                 return False
         return True
 
+    def _scan_day(self, table_name, out):
+        """Scans the table of a day and puts the matching lines
+        in the queue *out*, followed by _END_OF_DAY or by the
+        exception raised during the scan.
+        """
+        line_generator = self.store.iterate_table_backwards(
+            self.uuid,
+            table_name,
+            self.starting_timestamp,
+            self.starting_counter,
+            index=self.index
+        )
+
+        try:
+            num_matching_lines = 0
+            for line in line_generator:
+                gevent.sleep(0)
+
+                if not self._check_query(line['log']):
+                    continue
+
+                out.put(line)
+                num_matching_lines += 1
+                if num_matching_lines >= self.num_lines:
+                    break
+
+        except Exception as e:
+            out.put(e)
+            return
+
+        finally:
+            line_generator.close()
+
+        out.put(_END_OF_DAY)
+
+    def _release_query_slot(self, glet):
+        self.store.query_slots.release()
+
     def _core_run(self):
         LOG.debug("Query %s started", self.uuid)
 
         SR = redis.StrictRedis.from_url(
             self.redis_url
         )
+        channel = 'mm-traced-q.'+self.uuid
 
-        line_generator = self.store.iterate_backwards(
-            self.uuid,
-            self.starting_timestamp,
-            self.starting_counter
-        )
+        days, end_msg = self.store.days_backwards(self.starting_timestamp)
+        days = collections.deque(days)
+        scanners = collections.deque()
+
+        # results are sent in batches of newline separated JSON objects
+        batch = []
+
+        def _publish():
+            if batch:
+                SR.publish(channel, '\n'.join(batch))
+                del batch[:]
+
+        # scanner of the day being consumed
+        current = None
 
+        num_generated_lines = 0
         try:
-            num_generated_lines = 0
             while num_generated_lines < self.num_lines:
-                line = next(line_generator, None)
-                if not line:
+                # days are scanned in parallel using the query slots of
+                # the store free at the moment, but lines are published
+                # in timestamp order: days do not overlap and are
+                # consumed from the newest
+                while days:
+                    if not self.store.query_slots.acquire(
+                            blocking=(len(scanners) == 0)):
+                        break
+
+                    table_name, day = days.popleft()
+                    out = gevent.queue.Queue(maxsize=PUBLISH_BATCH_SIZE)
+                    glet = gevent.spawn(self._scan_day, table_name, out)
+                    # released also if the scanner is killed before start
+                    glet.link(self._release_query_slot)
+                    scanners.append((day, out, glet))
+
+                if not scanners:
+                    batch.append(ujson.dumps({'msg': end_msg}))
                     break
 
-                gevent.sleep(0)
+                day, out, current = scanners.popleft()
+                batch.append(ujson.dumps({'msg': 'Checking %s' % day}))
 
-                if 'log' not in line:
-                    SR.publish('mm-traced-q.'+self.uuid, ujson.dumps(line))
-                    continue
+                while num_generated_lines < self.num_lines:
+                    # do not keep lines while waiting for the scanner
+                    if out.empty() or len(batch) >= PUBLISH_BATCH_SIZE:
+                        _publish()
 
-                if self._check_query(line['log']):
-                    SR.publish('mm-traced-q.'+self.uuid, ujson.dumps(line))
+                    line = out.get()
+                    if line is _END_OF_DAY:
+                        break
+                    if isinstance(line, Exception):
+                        raise line
+
+                    batch.append(ujson.dumps(line))
                     num_generated_lines += 1
 
-            SR.publish(
-                'mm-traced-q.'+self.uuid,
-                '{"msg": "Loaded %d lines"}' % num_generated_lines
-            )
+            batch.append('{"msg": "Loaded %d lines"}' % num_generated_lines)
+            _publish()
 
         finally:
-            SR.publish('mm-traced-q.'+self.uuid, '<EOQ>')
+            # early termination, the scanners of the current and
+            # the remaining days are stopped before the tables are
+            # released
+            glets = [s[2] for s in scanners]
+            if current is not None:
+                glets.append(current)
+            gevent.killall(glets)
+
+            SR.publish(channel, '<EOQ>')
             LOG.info("Query %s finished - %d", self.uuid, num_generated_lines)
 
     def _run(self):
@@ -22,19 +22,79 @@ import time
 import Queue
 import os
 import os.path
+import shutil
+import collections
 
+import gevent
 import gevent.queue
 import gevent.event
 import gevent.lock
 
 import plyvel
 import pytz
+import lz4.block
 
 LOG = logging.getLogger(__name__)
 
 START_KEY = '%016x%015x' % (0, 0)
 
 TABLE_MAX_COUNTER_KEY = 'MAX_COUNTER'
+TABLE_INDEXED_KEY = 'INDEXED'
+TABLE_DICTIONARY_KEY = 'DICTIONARY'
+
+# compressed logs start with this prefix, raw logs are JSON objects
+COMPRESSED_PREFIX = '\x01'
+# logs are compressed with LZ4 using as dictionary a sample of the
+# first logs written to the table, trace logs of the same day share most
+# of the keys, node names and attribute values
+DICTIONARY_SIZE = 32 * 1024
+DICTIONARY_MIN_SIZE = 4 * 1024
+
+# fields of the trace logs indexed in the day tables
+INDEXED_FIELDS = ['source', 'indicator', 'op', 'source_node']
+
+# index keys sort after the log keys, that are hex strings
+INDEX_KEY_PREFIX = 'idx\x00'
+
+
+def _index_value(value):
+    if isinstance(value, unicode):
+        return value.lower().encode('utf-8')
+    if isinstance(value, str):
+        return value.lower()
+    return None
+
+
+def log_indexes(log):
+    """Returns the values of the indexed fields of a log.
+
+    Values are lower case, fields that are missing or not strings
+    are not indexed.
+
+    Args:
+        log (dict): log as received by the writer, the trace is in
+            the *log* key
+    """
+    result = {}
+
+    value = _index_value(log.get('source', None))
+    if value is not None:
+        result['source'] = value
+
+    trace = log.get('log', None)
+    if not isinstance(trace, dict):
+        return result
+
+    for field in INDEXED_FIELDS[1:]:
+        value = _index_value(trace.get(field, None))
+        if value is not None:
+            result[field] = value
+
+    return result
+
+
+def _index_key_prefix(field, value):
+    return INDEX_KEY_PREFIX + field + '\x00' + value + '\x00'
 
 
 class TableNotFound(Exception):
@@ -82,6 +142,82 @@ class Table(object):
 
         LOG.debug('Table %s - max id: %d', self.name, self.max_counter)
 
+        # tables written before indexing was introduced have no indexes
+        self.indexed = (self.db.get(TABLE_INDEXED_KEY) is not None)
+        if not self.indexed and self.max_counter == -1:
+            self.db.put(TABLE_INDEXED_KEY, '1')
+            self.indexed = True
+
+        # if True new logs are compressed, set by the Store
+        self.compress = False
+        self.dictionary = self.db.get(TABLE_DICTIONARY_KEY)
+        # logs collected for the dictionary
+        self._sample = None
+        self._sample_size = 0
+
+    def _decode(self, value):
+        if value.startswith(COMPRESSED_PREFIX):
+            return lz4.block.decompress(
+                value[len(COMPRESSED_PREFIX):],
+                dict=self.dictionary
+            )
+
+        return value
+
+    def _encode(self, value):
+        return COMPRESSED_PREFIX + lz4.block.compress(
+            value,
+            dict=self.dictionary
+        )
+
+    def _add_sample(self, values):
+        for v in values:
+            if self._sample_size >= DICTIONARY_SIZE:
+                break
+
+            self._sample.append(v)
+            self._sample_size += len(v)
+
+    def _init_dictionary(self, batch, values):
+        """Builds the dictionary from a sample of the logs, returns False
+        if there are not enough logs for a good dictionary yet.
+
+        The sample is accumulated across calls, starting from the raw
+        logs already in the table.
+        """
+        if self._sample is None:
+            self._sample = []
+            self._sample_size = 0
+            self._add_sample(
+                v for _, v in self._logs() if not v.startswith(COMPRESSED_PREFIX)
+            )
+
+        self._add_sample(values)
+
+        if self._sample_size < DICTIONARY_MIN_SIZE:
+            return False
+
+        self.dictionary = ''.join(self._sample)[:DICTIONARY_SIZE]
+        self._sample = None
+        self._sample_size = 0
+        batch.put(TABLE_DICTIONARY_KEY, self.dictionary)
+
+        return True
+
+    def _logs(self):
+        iterator = self.db.iterator(
+            start=START_KEY,
+            stop=('%016x%016x' % (0xFFFFFFFFFFFFFFFF, 0xFFFFFFFFFFFFFFFF)),
+            include_start=False,
+            include_stop=True
+        )
+        for key, value in iterator:
+            # skip MAX_COUNTER and the other metadata keys
+            if len(key) != 32:
+                continue
+
+            yield key, value
+
     def add_reference(self, refid):
         self.refs.append(refid)
 
@@ -101,39 +237,118 @@ class Table(object):
     def ref_count(self):
         return len(self.refs)
 
-    def put(self, key, value):
-        self.last_used = time.time()
+    def put(self, key, value, indexes=None):
+        self.put_batch([(key, value, indexes)])
 
-        self.max_counter += 1
-        new_max_counter = '%016x' % self.max_counter
+    def put_batch(self, entries):
+        """Writes a list of (key, value, indexes) entries in a single
+        write batch, MAX_COUNTER is updated once per batch.
+        """
+        self.last_used = time.time()
 
         batch = self.db.write_batch()
-        batch.put(key+new_max_counter, value)
-        batch.put(TABLE_MAX_COUNTER_KEY, new_max_counter)
+
+        compress = self.compress
+        if compress and self.dictionary is None:
+            compress = self._init_dictionary(batch, (v for _, v, _ in entries))
+
+        for key, value, indexes in entries:
+            self.max_counter += 1
+            new_max_counter = '%016x' % self.max_counter
+
+            if compress:
+                value = self._encode(value)
+
+            batch.put(key+new_max_counter, value)
+            if indexes is not None and self.indexed:
+                for field, fvalue in indexes.iteritems():
+                    batch.put(
+                        _index_key_prefix(field, fvalue)+key+new_max_counter,
+                        ''
+                    )
+        batch.put(TABLE_MAX_COUNTER_KEY, '%016x' % self.max_counter)
         batch.write()
 
     def backwards_iterator(self, timestamp, counter):
-        return self.db.iterator(
+        iterator = self.db.iterator(
             start=START_KEY,
             stop=('%016x%016x' % (timestamp, counter)),
             include_start=False,
             include_stop=True,
             reverse=True
         )
+        for key, line in iterator:
+            yield key, self._decode(line)
+
+    def compress_logs(self, batch_size=1000):
+        """Compresses the raw logs of the table, returns the number
+        of logs compressed.
+
+        Used to convert existing tables, the table should not be
+        written while converting.
+        """
+        if self.dictionary is None:
+            batch = self.db.write_batch()
+            if not self._init_dictionary(batch, []):
+                # not worth it
+                return 0
+            batch.write()
+
+        result = 0
+        batch = self.db.write_batch()
+        batch_len = 0
+        for key, value in self._logs():
+            if value.startswith(COMPRESSED_PREFIX):
+                continue
+
+            batch.put(key, self._encode(value))
+            batch_len += 1
+            result += 1
+
+            if batch_len >= batch_size:
+                batch.write()
+                batch = self.db.write_batch()
+                batch_len = 0
+
+        batch.write()
+
+        # reclaim the space used by the raw logs
+        self.db.compact_range()
+
+        return result
+
+    def backwards_index_iterator(self, field, value, timestamp, counter):
+        """Iterates backwards over the logs with *field* equal to *value*
+        """
+        prefix = _index_key_prefix(field, value)
+
+        index_iterator = self.db.iterator(
+            start=prefix,
+            stop=(prefix + '%016x%016x' % (timestamp, counter)),
+            include_start=False,
+            include_stop=True,
+            include_value=False,
+            reverse=True
+        )
+        for ikey in index_iterator:
+            key = ikey[len(prefix):]
+
+            line = self.db.get(key)
+            if line is None:
+                continue
+
+            yield key, self._decode(line)
 
     def close(self):
         LOG.debug('{} - close'.format(self.name))
         self.db.close()
 
     @staticmethod
-    def oldest_table():
-        # XXX we should switch to something iterative
-        entries = os.listdir('.')
-        if len(entries) == 0:
-            return None
-
+    def list_tables():
+        """Returns the sorted list of the tables on disk, oldest first
+        """
         tables = []
-        for e in entries:
+        for e in os.listdir('.'):
             try:
                 int(e, 16)
             except:
@@ -141,12 +356,32 @@ class Table(object):
 
             tables.append(e)
 
+        return sorted(tables)
+
+    @staticmethod
+    def oldest_table():
+        # XXX we should switch to something iterative
+        tables = Table.list_tables()
         if len(tables) == 0:
             return None
 
-        tables = sorted(tables)
         return tables[0]
 
+    @staticmethod
+    def disk_usage(name):
+        """Returns the size in bytes of the table files
+        """
+        result = 0
+        for root, _, files in os.walk(name):
+            for f in files:
+                try:
+                    result += os.path.getsize(os.path.join(root, f))
+                except OSError:
+                    # file removed by a compaction
+                    pass
+
+        return result
+
 
 def _lock_current_tables():
     """Decorator for locking current_tables
@@ -167,6 +402,34 @@ def _lock_current_tables():
 
 
 class Store(object):
+    """Stores the logs in daily tables.
+
+    Retention is enforced online by a greenlet started by `start`, only
+    if *num_days* or *max_size* are set: tables older than *num_days*
+    days are closed and removed, and if *max_size* is set the oldest
+    tables are removed until the size on disk is below *max_size*.
+    Tables referenced by a running query are never removed, they are
+    checked again at the next run. The table of the current day is never
+    removed.
+
+    **Config parameters**
+        :max_tables: max number of open tables. Default: 5
+        :num_days: number of days of logs to keep, including the current
+            day, null to disable the age based retention. Can be
+            overridden with the environment variable
+            MINEMELD_TRACE_NUM_DAYS, also used by mm-traced-purge.
+            Default: null
+        :max_size: max size on disk in bytes of all the tables,
+            null to disable the size cap. Default: null
+        :retention_interval: interval in seconds between retention
+            checks. Default: 3600
+        :compression: if *true* logs are stored compressed with LZ4,
+            using as dictionary a sample of the logs of the day. Tables
+            can be mixed, raw logs are still readable. Default: false
+
+    Args:
+        config (dict): config
+    """
     def __init__(self, config=None):
         if config is None:
             config = {}
@@ -175,8 +438,31 @@ class Store(object):
 
         self.max_tables = config.get('max_tables', 5)
 
+        self.num_days = os.environ.get(
+            'MINEMELD_TRACE_NUM_DAYS',
+            config.get('num_days', None)
+        )
+        if self.num_days is not None:
+            self.num_days = int(self.num_days)
+            if self.num_days < 1:
+                raise ValueError(
+                    'num_days should be greater than 0: %d' % self.num_days
+                )
+        self.max_size = config.get('max_size', None)
+        self.retention_interval = config.get('retention_interval', 3600)
+        self.compression = config.get('compression', False)
+        self._retention_glet = None
+
         self.current_tables = {}
         self.current_tables_lock = gevent.lock.BoundedSemaphore()
+        # tables being removed by the retention, cannot be opened
+        self._removing_tables = set()
+
+        # tables that can be referenced at the same time by the queries,
+        # a table is always left to the writer
+        self.query_slots = gevent.lock.BoundedSemaphore(
+            max(1, self.max_tables-1)
+        )
 
         self.max_written_timestamp = None
         self.max_written_counter = 0
@@ -184,7 +470,11 @@ class Store(object):
         self.add_queue = gevent.queue.PriorityQueue()
 
     def _open_table(self, name, create_if_missing):
+        if name in self._removing_tables:
+            raise TableNotFound('Table is being removed')
+
         table = Table(name, create_if_missing=create_if_missing)
+        table.compress = self.compression
         self.current_tables[name] = table
 
         return table
@@ -237,10 +527,15 @@ class Store(object):
             return True
 
         if len(self.current_tables) < self.max_tables:
-            new_table = self._open_table(
-                name,
-                create_if_missing=create_if_missing
-            )
+            try:
+                new_table = self._open_table(
+                    name,
+                    create_if_missing=create_if_missing
+                )
+            except TableNotFound as e:
+                ftable.set_exception(e)
+                return True
+
             ftable.set(new_table)
             return True
 
@@ -258,10 +553,15 @@ class Store(object):
 
         self._close_table(candidate)
 
-        new_table = self._open_table(
-            name,
-            create_if_missing=create_if_missing
-        )
+        try:
+            new_table = self._open_table(
+                name,
+                create_if_missing=create_if_missing
+            )
+        except TableNotFound as e:
+            ftable.set_exception(e)
+            return True
+
         ftable.set(new_table)
 
         return True
@@ -300,7 +600,7 @@ class Store(object):
 
         self._process_queue()
 
-    def write(self, timestamp, log):
+    def write(self, timestamp, log, indexes=None):
         if self._stop.is_set():
             raise RuntimeError('stopping')
 
@@ -312,29 +612,59 @@ class Store(object):
         try:
             table.put(
                 '%016x' % timestamp,
-                log
+                log,
+                indexes=indexes
             )
 
         finally:
             self._release(table, 'write')
 
-    def iterate_backwards(self, ref, timestamp, counter):
+    def write_batch(self, logs):
+        """Writes a list of (timestamp, log, indexes) tuples, with one
+        write batch per day table.
+        """
         if self._stop.is_set():
             raise RuntimeError('stopping')
 
+        days = collections.OrderedDict()
+        for timestamp, log, indexes in logs:
+            tssec = timestamp/1000
+            day = '%016x' % (tssec - (tssec % 86400))
+
+            entries = days.get(day, None)
+            if entries is None:
+                entries = []
+                days[day] = entries
+
+            entries.append(('%016x' % timestamp, log, indexes))
+
+        for day, entries in days.iteritems():
+            table = self._get_table(day, 'write')
+
+            try:
+                table.put_batch(entries)
+
+            finally:
+                self._release(table, 'write')
+
+    def days_backwards(self, timestamp):
+        """Returns the days to check for logs older than *timestamp*.
+
+        Returns a tuple with the list of (table name, day) of the days
+        to check, newest first, and the message for the end of the logs.
+        """
         tssec = timestamp/1000
         current_day = (tssec - (tssec % 86400))
 
         oldest_table = Table.oldest_table()
         if oldest_table is None:
-            yield {'msg': 'No more logs to check'}
-            return
+            return [], 'No more logs to check'
 
+        result = []
         while True:
             table_name = '%016x' % current_day
             if table_name < oldest_table:
-                yield {'msg': 'No more logs to check'}
-                return
+                return result, 'No more logs to check'
 
             day = datetime.datetime.fromtimestamp(
                 current_day,
@@ -345,27 +675,48 @@ class Store(object):
                 day.month,
                 day.day
             )
-            yield {'msg': 'Checking %s' % day}
+            result.append((table_name, day))
 
-            try:
-                table = self._get_table(
-                    table_name,
-                    ref,
-                    create_if_missing=False
-                )
-            except TableNotFound:
-                if current_day == 0:
-                    # XXX this is unreachable
-                    yield {'msg': 'This should be unreachable'}
-                    return
+            if current_day == 0:
+                return result, 'We haved reached the origins of time'
 
-                current_day -= 86400
-                continue
+            current_day -= 86400
+
+    def iterate_table_backwards(self, ref, table_name, timestamp, counter, index=None):
+        """Iterates backwards over the logs of the day table *table_name*,
+        starting from *timestamp* and *counter*.
 
-            table_iterator = table.backwards_iterator(
-                timestamp=timestamp,
-                counter=counter
+        If *index* is a (field, value) tuple only the logs with the
+        field equal to value are returned from indexed tables. Logs
+        from tables without indexes are all returned and should be
+        filtered by the caller.
+        """
+        if self._stop.is_set():
+            raise RuntimeError('stopping')
+
+        try:
+            table = self._get_table(
+                table_name,
+                ref,
+                create_if_missing=False
             )
+        except TableNotFound:
+            return
+
+        try:
+            if index is not None and table.indexed:
+                table_iterator = table.backwards_index_iterator(
+                    field=index[0],
+                    value=index[1],
+                    timestamp=timestamp,
+                    counter=counter
+                )
+
+            else:
+                table_iterator = table.backwards_iterator(
+                    timestamp=timestamp,
+                    counter=counter
+                )
 
             for linets, line in table_iterator:
                 yield {
@@ -374,13 +725,25 @@ class Store(object):
                     'log': line
                 }
 
+        finally:
             self._release(table, ref)
 
-            if current_day == 0:
-                yield {'msg': 'We haved reached the origins of time'}
-                return
+    def iterate_backwards(self, ref, timestamp, counter, index=None):
+        """Iterates backwards over the logs, starting from *timestamp*
+        and *counter*. See iterate_table_backwards for *index*.
+        """
+        if self._stop.is_set():
+            raise RuntimeError('stopping')
 
-            current_day -= 86400
+        days, end_msg = self.days_backwards(timestamp)
+        for table_name, day in days:
+            yield {'msg': 'Checking %s' % day}
+
+            for line in self.iterate_table_backwards(ref, table_name, timestamp,
+                                                     counter, index=index):
+                yield line
+
+        yield {'msg': end_msg}
 
     def release_all(self, ref):
         if self._stop.is_set():
@@ -393,6 +756,113 @@ class Store(object):
 
         self._process_queue()
 
+    def _drop_table(self, name):
+        """Closes a table to be removed and marks it as being removed,
+        returns False if the table is in use. Should be called with
+        current_tables_lock held.
+        """
+        table = self.current_tables.get(name, None)
+        if table is not None:
+            if table.ref_count() != 0:
+                LOG.info('Table %s in use, will be removed later', name)
+                return False
+
+            self._close_table(table)
+
+        self._removing_tables.add(name)
+
+        return True
+
+    def enforce_retention(self, now=None):
+        """Removes the tables past retention, returns the list of the
+        removed tables.
+
+        Tables are selected and closed with current_tables_lock held,
+        the files are removed after releasing the lock.
+        """
+        dropped = self._drop_tables_past_retention(now)
+
+        removed = []
+        try:
+            for t in dropped:
+                LOG.info('Removing table %s', t)
+                try:
+                    shutil.rmtree(t)
+
+                except OSError:
+                    LOG.exception('Error removing table %s', t)
+                    continue
+
+                removed.append(t)
+
+        finally:
+            self._removing_tables.difference_update(dropped)
+
+        return removed
+
+    @_lock_current_tables()
+    def _drop_tables_past_retention(self, now):
+        """Returns the list of the tables past retention, closed and
+        marked as being removed.
+        """
+        if now is None:
+            now = int(time.time())
+
+        today = now - (now % 86400)
+        oldest = None
+        if self.num_days is not None:
+            oldest = today - (self.num_days-1)*86400
+        current_table = '%016x' % today
+
+        dropped = []
+
+        tables = [t for t in Table.list_tables() if t < current_table]
+        for t in tables:
+            if self.num_days is None or int(t, 16) >= oldest:
+                break
+
+            if self._drop_table(t):
+                dropped.append(t)
+
+        if self.max_size is None:
+            return dropped
+
+        tables = [t for t in tables if t not in dropped]
+        sizes = {t: Table.disk_usage(t) for t in tables}
+        total_size = sum(sizes.values()) + Table.disk_usage(current_table)
+        for t in tables:
+            if total_size <= self.max_size:
+                break
+
+            if self._drop_table(t):
+                dropped.append(t)
+                total_size -= sizes[t]
+
+        return dropped
+
+    def _retention_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.enforce_retention()
+
+            except gevent.GreenletExit:
+                raise
+
+            except:
+                LOG.exception('Error enforcing trace retention')
+
+            self._stop.wait(timeout=self.retention_interval)
+
+    def start(self):
+        if self._retention_glet is not None:
+            return
+
+        if self.num_days is None and self.max_size is None:
+            LOG.info('Store - online retention disabled')
+            return
+
+        self._retention_glet = gevent.spawn(self._retention_loop)
+
     def stop(self):
         LOG.info('Store - stop called')
 
@@ -400,6 +870,11 @@ class Store(object):
             return
 
         self._stop.set()
+
+        if self._retention_glet is not None:
+            self._retention_glet.kill()
+            self._retention_glet = None
+
         self.current_tables_lock.acquire()
         for t in self.current_tables.keys():
             self.current_tables[t].close()
@@ -17,11 +17,16 @@ This module implements the writer class for logs
 """
 
 import logging
+import time
+import collections
 
 import psutil
 import ujson
 import gevent
 import gevent.event
+import gevent.lock
+
+from .storage import log_indexes
 
 LOG = logging.getLogger(__name__)
 
@@ -53,10 +58,39 @@ class DiskSpaceMonitor(gevent.Greenlet):
 
 
 class Writer(object):
+    """Writes the logs received on the log topic to the store.
+
+    Logs are buffered and written in batches, each batch is written with
+    one write batch per day table. A batch is written when it reaches
+    *batch_size* logs or *batch_timeout* seconds after the first log
+    of the batch has been received, and when the writer is stopped.
+
+    **Config parameters**
+        :threshold: max percentage of disk used, above this threshold
+            logs are dropped. Default: 70
+        :batch_size: max number of logs in a batch. Default: 1000
+        :batch_timeout: max number of seconds a log waits before being
+            written. Default: 0.5
+
+    Args:
+        comm: comm object
+        store (minemeld.traced.storage.Store): store
+        topic (str): log topic
+        config (dict): config
+    """
     def __init__(self, comm, store, topic, config):
         self._stop = gevent.event.Event()
         self._low_disk = gevent.event.Event()
 
+        self.batch_size = config.get('batch_size', 1000)
+        self.batch_timeout = config.get('batch_timeout', 0.5)
+
+        self.statistics = collections.defaultdict(int)
+
+        self._batch = []
+        self._flush_glet = None
+        self._flush_lock = gevent.lock.Semaphore()
+
         self.store = store
         self.comm = comm
         self.comm.request_sub_channel(
@@ -78,9 +112,61 @@ class Writer(object):
             return
 
         if self._low_disk.is_set():
+            self.statistics['dropped.low_disk'] += 1
+            return
+
+        self._batch.append((
+            timestamp,
+            ujson.dumps(kwargs),
+            log_indexes(kwargs)
+        ))
+
+        backlog = len(self._batch)
+        if backlog > self.statistics['backlog.max']:
+            self.statistics['backlog.max'] = backlog
+
+        if backlog >= self.batch_size:
+            self._flush()
             return
 
-        self.store.write(timestamp, ujson.dumps(kwargs))
+        if self._flush_glet is None:
+            self._flush_glet = gevent.spawn_later(
+                self.batch_timeout,
+                self._flush_later
+            )
+
+    def _flush_later(self):
+        self._flush_glet = None
+
+        try:
+            self._flush()
+
+        except gevent.GreenletExit:
+            raise
+
+        except:
+            LOG.exception('Error writing logs')
+
+    def _flush(self):
+        if self._flush_glet is not None:
+            self._flush_glet.kill()
+            self._flush_glet = None
+
+        # batches are written in order
+        with self._flush_lock:
+            if len(self._batch) == 0:
+                return
+
+            batch = self._batch
+            self._batch = []
+
+            t1 = time.time()
+            self.store.write_batch(batch)
+            t2 = time.time()
+
+            self.statistics['batch.flushed'] += 1
+            self.statistics['batch.logs'] += len(batch)
+            self.statistics['batch.latency'] += int((t2-t1)*1000)
 
     def stop(self):
         LOG.info('Writer - stop called')
@@ -90,3 +176,11 @@ class Writer(object):
 
         self._stop.set()
         self._disk_monitor_glet.kill()
+
+        try:
+            self._flush()
+
+        except:
+            LOG.exception('Error writing logs')
+
+        LOG.info('Writer - statistics: %s', dict(self.statistics))
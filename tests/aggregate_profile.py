@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Measures the update throughput of AggregateFT with 10, 40 and 100
+inputs.
+
+Each configuration is measured twice: once with the current code, where
+the entries of an indicator are retrieved with a single range scan, and
+once with a point lookup per input, as it was done before.
+"""
+
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+import mock
+
+import minemeld.ft.op
+
+FTNAME = tempfile.mktemp(prefix='minemeld.aggprof')
+
+
+class _NullChannel(object):
+    def publish(self, method, params=None):
+        pass
+
+
+def _point_lookups(aggregator):
+    def _indicator_entries(indicator):
+        result = {}
+        for i in aggregator.inputs:
+            v = aggregator.table.get(aggregator._indicator_key(indicator, i))
+            if v is not None:
+                result[i] = v
+        return result
+
+    return _indicator_entries
+
+
+def _run(num_inputs, num_updates, point_lookups=False):
+    chassis = mock.Mock()
+    chassis.request_pub_channel.return_value = _NullChannel()
+    chassis.log = lambda **kwargs: None
+
+    a = minemeld.ft.op.AggregateFT(FTNAME, chassis, {
+        'whitelist_prefixes': ['wl']
+    })
+    inputs = ['wl0'] + ['s%d' % j for j in range(num_inputs-1)]
+    a.connect(inputs, True)
+    a.mgmtbus_initialize()
+    a.start()
+    a.publish_status = lambda force=False: None
+
+    if point_lookups:
+        a._indicator_entries = _point_lookups(a)
+
+    random.seed(0)
+    num_indicators = max(1, num_updates / 10)
+    updates = [
+        ('10.0.%d.%d' % ((j >> 8) & 0xFF, j & 0xFF), random.choice(inputs[1:]))
+        for j in (random.randint(0, num_indicators-1) for _ in xrange(num_updates))
+    ]
+
+    t1 = time.time()
+    for indicator, source in updates:
+        a.filtered_update(source, indicator=indicator, value={
+            'type': 'IPv4',
+            'confidence': 50
+        })
+    t2 = time.time()
+
+    a.stop()
+    shutil.rmtree(FTNAME, ignore_errors=True)
+
+    return num_updates/(t2-t1)
+
+
+def main():
+    num_updates = 20000
+    if len(sys.argv) > 1:
+        num_updates = int(sys.argv[1])
+
+    for num_inputs in [10, 40, 100]:
+        print "%d inputs: range scan %.0f updates/s, point lookups %.0f updates/s" % (
+            num_inputs,
+            _run(num_inputs, num_updates),
+            _run(num_inputs, num_updates, point_lookups=True)
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Measures the cost of polling a feed that did not change, including
+the sudden death sweep that follows each poll.
+
+Polls after the first are measured three times: with the current code,
+where unchanged indicators are only touched and the sweep checks only
+the indicators written or touched before the last run; with a sweep of
+the whole _last_run index; and rewriting each indicator with a full put,
+as it was done before run marks.
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+
+import mock
+
+import minemeld.ft.basepoller
+from minemeld.ft import ft_states
+
+FTNAME = tempfile.mktemp(prefix='minemeld.bppoll')
+
+
+class StaticFeed(minemeld.ft.basepoller.BasePollerFT):
+    def __init__(self, name, chassis, num_indicators):
+        self.num_indicators = num_indicators
+        super(StaticFeed, self).__init__(name, chassis, {
+            'attributes': {'type': 'IPv4', 'confidence': 50}
+        })
+
+    def _build_iterator(self, now):
+        return xrange(self.num_indicators)
+
+    def _process_item(self, item):
+        return [['10.%d.%d.%d' % (item >> 16, (item >> 8) & 0xFF, item & 0xFF), {}]]
+
+
+class _CountingDB(object):
+    """Proxy of the LevelDB instance counting written keys"""
+    def __init__(self, db):
+        self.db = db
+        self.num_writes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def put(self, key, value):
+        self.num_writes += 1
+        self.db.put(key, value)
+
+    def write_batch(self):
+        return _CountingBatch(self, self.db.write_batch())
+
+
+class _CountingBatch(object):
+    def __init__(self, cdb, batch):
+        self.cdb = cdb
+        self.batch = batch
+
+    def put(self, key, value):
+        self.cdb.num_writes += 1
+        self.batch.put(key, value)
+
+    def delete(self, key):
+        self.cdb.num_writes += 1
+        self.batch.delete(key)
+
+    def write(self):
+        self.batch.write()
+
+
+def _poll(feed, label=None, full_sweep=False):
+    cdb = _CountingDB(feed.table.table.db)
+    feed.table.table.db = cdb
+
+    # runs must have different timestamps
+    time.sleep(0.002)
+
+    lastrun = minemeld.ft.basepoller.utc_millisec()
+    t1 = time.time()
+    feed._polling_loop()
+    t2 = time.time()
+    feed.last_successful_run = lastrun
+
+    if full_sweep:
+        feed._sudden_death_from = None
+    feed._sudden_death()
+    t3 = time.time()
+
+    feed.table.table.db = cdb.db
+
+    if label is not None:
+        msg = "%s: %d indicators polled in %.2fs, sudden death %.2fs, " \
+              "%d keys written to LevelDB"
+        print msg % (
+            label, feed.num_indicators, t2-t1, t3-t2, cdb.num_writes
+        )
+
+
+def main():
+    num_indicators = 100000
+    if len(sys.argv) > 1:
+        num_indicators = int(sys.argv[1])
+
+    chassis = mock.Mock()
+    feed = StaticFeed(FTNAME, chassis, num_indicators)
+    feed._initialize_table(truncate=True)
+    feed._state = ft_states.STARTED
+
+    # first poll, all indicators are added, and the second one
+    # touches all of them
+    _poll(feed)
+    _poll(feed)
+
+    _poll(feed, 'touch')
+    _poll(feed, 'touch, full index sweep', full_sweep=True)
+
+    # emulate the previous behavior, unchanged indicators are rewritten
+    feed.table.touch = lambda i, last_run, itype=None: feed.table.put(
+        i, dict(feed.table.get(i, itype=itype), _last_run=last_run)
+    )
+    _poll(feed, 'put')
+
+    feed.table.close()
+    shutil.rmtree(FTNAME)
+
+
+if __name__ == '__main__':
+    main()
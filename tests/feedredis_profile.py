@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Measures the throughput of the feed formatters.
+
+A feed is stored in the local Redis as RedisSet would, then the JSON and
+CSV formatters are run against it with bulk value fetching and again with
+one HGET per indicator, as it was done before.
+"""
+
+import sys
+import time
+import json
+
+import mock
+import redis
+
+import minemeld.flask.feedredis
+
+FEED = 'mm-feedredis-profile-%d' % int(time.time())
+
+
+def _populate(SR, num_indicators):
+    p = SR.pipeline(transaction=False)
+    for j in xrange(num_indicators):
+        indicator = '10.%d.%d.%d' % (j >> 16, (j >> 8) & 0xFF, j & 0xFF)
+        p.zadd(FEED, j, indicator)
+        p.hset(FEED+'.value', indicator, json.dumps({
+            'type': 'IPv4',
+            'confidence': 50,
+            'sources': ['profile']
+        }))
+
+        if j % 10000 == 0:
+            p.execute()
+    p.execute()
+
+
+class _HGetRedis(object):
+    """Redis client answering HMGET with one HGET per key"""
+    def __init__(self, SR):
+        self.SR = SR
+
+    def __getattr__(self, name):
+        return getattr(self.SR, name)
+
+    def hmget(self, name, keys):
+        return [self.SR.hget(name, k) for k in keys]
+
+
+def _measure(label, SR, formatter, value, **kwargs):
+    with mock.patch.object(minemeld.flask.feedredis, 'SR', SR):
+        t1 = time.time()
+        size = 0
+        for chunk in formatter(FEED, 0, None, False, value, **kwargs):
+            size += len(chunk)
+        t2 = time.time()
+
+    print "%s: %d bytes in %.2fs" % (label, size, t2-t1)
+
+
+def main():
+    num_indicators = 100000
+    if len(sys.argv) > 1:
+        num_indicators = int(sys.argv[1])
+
+    SR = redis.StrictRedis.from_url('unix:///var/run/redis/redis.sock')
+    _populate(SR, num_indicators)
+
+    try:
+        for label, client in [('hmget', SR), ('hget', _HGetRedis(SR))]:
+            _measure(
+                'json '+label, client,
+                minemeld.flask.feedredis.generate_json_feed, 'json'
+            )
+            _measure(
+                'csv '+label, client,
+                minemeld.flask.feedredis.generate_csv_feed, 'csv',
+                f=['indicator', 'confidence']
+            )
+
+    finally:
+        SR.delete(FEED)
+        SR.delete(FEED+'.value')
+
+
+if __name__ == '__main__':
+    main()
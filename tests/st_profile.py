@@ -14,6 +14,12 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+"""Measures insert and cover query times of the LevelDB segment tree
+(ST) and of the in memory segment tree (MemoryST), and the time needed
+to load MemoryST from LevelDB.
+"""
+
+import sys
 import uuid
 import random
 import tempfile
@@ -24,53 +30,84 @@ import minemeld.ft.st
 TABLENAME = tempfile.mktemp(prefix='minemeld.ftsttest')
 
 
-def queries(st):
-    # t1 = time.time()
-    # j = 0
-    # for j in xrange(num_queries):
-    #     q = random.randint(0, 0xFFFFFFFF)
-    # t2 = time.time()
-    # dt = t2-t1
+def intervals(num_intervals):
+    random.seed(0)
+
+    result = []
+    for j in xrange(num_intervals):
+        end = random.randint(0, 0xFFFFFFFF)
+        if random.randint(0, 1) == 0:
+            start = end & 0xFFFFFF00
+            end = start + 0xFF
+        else:
+            start = end
+        result.append((uuid.uuid4().bytes, start, end))
+
+    return result
+
 
-    # t1 = time.time()
+def queries(st, num_queries):
+    random.seed(1)
 
-    j = 0
+    t1 = time.time()
     for j in xrange(num_queries):
         q = random.randint(0, 0xFFFFFFFF)
-        next(st.cover(q), None)
-    # t2 = time.time()
+        for _ in st.cover(q):
+            pass
+    t2 = time.time()
 
-    # print "TIME: Queried %d times in %d" % (num_queries, (t2-t1-dt))
+    return t2-t1
 
-if __name__ == '__main__':
-    num_intervals = 100000
-    num_queries = num_intervals
 
-    st = minemeld.ft.st.ST(TABLENAME, 32, truncate=True)
+def endpoint_queries(st, num_queries):
+    random.seed(2)
 
     t1 = time.time()
-    for j in xrange(num_intervals):
-        end = random.randint(0, 0xFFFFFFFF)
-        if random.randint(0, 1) == 0:
-            end = end & 0xFFFFFF00
-            start = end + 0xFF
-        else:
-            start = end
-        sid = uuid.uuid4().bytes
+    for j in xrange(num_queries):
+        q = random.randint(0, 0xFFFFFF00)
+        for _ in st.query_endpoints(start=q, stop=q+0xFFFF):
+            pass
     t2 = time.time()
-    dt = t2-t1
+
+    return t2-t1
+
+
+def profile(st_class, ivs, num_queries):
+    st = st_class(TABLENAME, 32, truncate=True)
 
     t1 = time.time()
-    for j in xrange(num_intervals):
-        end = random.randint(0, 0xFFFFFFFF)
-        if random.randint(0, 1) == 0:
-            start = end & 0xFFFFFF00
-            end = start + 0xFF
-        else:
-            start = end
-        sid = uuid.uuid4().bytes
+    for sid, start, end in ivs:
         st.put(sid, start, end)
     t2 = time.time()
-    print "TIME: Inserted %d intervals in %d" % (num_intervals, (t2-t1-dt))
+    print "%s - TIME: Inserted %d intervals in %.2fs" % (
+        st_class.__name__, len(ivs), t2-t1
+    )
+
+    print "%s - TIME: %d cover queries in %.2fs" % (
+        st_class.__name__, num_queries, queries(st, num_queries)
+    )
+    print "%s - TIME: %d endpoint queries in %.2fs" % (
+        st_class.__name__, num_queries, endpoint_queries(st, num_queries)
+    )
 
-    queries(st)
+    st.close()
+
+
+if __name__ == '__main__':
+    num_intervals = 100000
+    if len(sys.argv) > 1:
+        num_intervals = int(sys.argv[1])
+    num_queries = num_intervals
+
+    ivs = intervals(num_intervals)
+
+    profile(minemeld.ft.st.ST, ivs, num_queries)
+    profile(minemeld.ft.st.MemoryST, ivs, num_queries)
+
+    t1 = time.time()
+    st = minemeld.ft.st.MemoryST(TABLENAME, 32)
+    t2 = time.time()
+    print "MemoryST - TIME: Loaded %d intervals in %.2fs" % (
+        st.num_endpoints/2, t2-t1
+    )
+    st.close()
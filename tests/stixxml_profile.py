@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Measures the STIX packages/second rendered by the DataFeed node
+with the template based serializer and with python-stix.
+"""
+
+import sys
+import time
+
+import mock
+
+import minemeld.ft.taxii
+import minemeld.ft.stixxml
+
+
+def _value(j):
+    return {
+        'type': 'IPv4',
+        'confidence': j % 100,
+        'sources': ['profile'],
+        'share_level': 'green'
+    }
+
+
+def _measure(label, f, num_packages):
+    t1 = time.time()
+    for j in xrange(num_packages):
+        f('10.%d.%d.%d' % (j >> 16, (j >> 8) & 0xFF, j & 0xFF), _value(j))
+    t2 = time.time()
+
+    print "%s: %d packages in %.2fs, %.0f packages/s" % (
+        label, num_packages, t2-t1, num_packages/(t2-t1)
+    )
+
+
+def main():
+    num_packages = 10000
+    if len(sys.argv) > 1:
+        num_packages = int(sys.argv[1])
+
+    df = minemeld.ft.taxii.DataFeed('profile', mock.Mock(), {})
+    type_mapper = minemeld.ft.taxii._TYPE_MAPPING['IPv4']
+
+    _measure(
+        'template',
+        lambda i, v: minemeld.ft.stixxml.stix_content_block(
+            df.namespace, df.namespaceuri, i, v, tlp_color='GREEN'
+        ),
+        num_packages
+    )
+    _measure(
+        'python-stix',
+        lambda i, v: df._python_stix_content_block(
+            type_mapper, i, v, tlp_color='GREEN'
+        ),
+        num_packages
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""ZMQRedis comm tests
+
+Unit tests for minemeld.comm.zmqredis
+"""
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import unittest
+import time
+
+import gevent
+import redis
+
+import minemeld.comm.zmqredis
+
+TOPIC = 'testtopic-%d' % int(time.time())
+
+
+class Receiver(object):
+    def __init__(self):
+        self.received = []
+
+    def update(self, indicator=None):
+        self.received.append(('update', indicator))
+
+    def checkpoint(self, value=None):
+        self.received.append(('checkpoint', value))
+
+    def update_bulk(self, items=None, eos=False):
+        if items == ['fail']:
+            raise RuntimeError('fail')
+        self.received.append(('update_bulk', items, eos))
+
+
+class MineMeldCommZMQRedisTests(unittest.TestCase):
+    def setUp(self):
+        minemeld.comm.zmqredis.ZMQRedis.cleanup({})
+
+    def tearDown(self):
+        minemeld.comm.zmqredis.ZMQRedis.cleanup({})
+
+    def _channels(self, batch_size):
+        cp = redis.ConnectionPool.from_url(
+            'unix:///var/run/redis/redis.sock'
+        )
+        receiver = Receiver()
+
+        sc = minemeld.comm.zmqredis.RedisSubChannel(
+            topic=TOPIC,
+            connection_pool=cp,
+            object_=receiver,
+            allowed_methods=['update', 'checkpoint']
+        )
+        sc.connect()
+
+        pc = minemeld.comm.zmqredis.RedisPubChannel(
+            topic=TOPIC,
+            connection_pool=cp,
+            batch_size=batch_size,
+            batch_timeout=0.05
+        )
+        pc.connect()
+
+        return receiver, sc, pc
+
+    def _drain(self, sc):
+        SR = redis.StrictRedis.from_url('unix:///var/run/redis/redis.sock')
+        for m in SR.lrange('{}:queue:{:013X}'.format(sc.prefix, 0), 0, -1):
+            sc._callback(m)
+
+    def test_unbatched(self):
+        receiver, sc, pc = self._channels(batch_size=1)
+
+        for j in range(5):
+            pc.publish('update', {'indicator': str(j)})
+
+        self.assertEqual(pc.num_publish, 5)
+        self.assertEqual(pc.num_messages, 5)
+
+        self._drain(sc)
+        self.assertEqual(
+            receiver.received,
+            [('update', str(j)) for j in range(5)]
+        )
+        self.assertEqual(sc.statistics['rx.messages'], 5)
+        self.assertEqual(sc.statistics['rx.entries'], 5)
+
+    def test_batched_size(self):
+        receiver, sc, pc = self._channels(batch_size=4)
+
+        for j in range(8):
+            pc.publish('update', {'indicator': str(j)})
+
+        self.assertEqual(pc.num_publish, 2)
+        self.assertEqual(pc.num_messages, 8)
+        self.assertEqual(pc.statistics['tx.messages'], 8)
+        self.assertEqual(pc.statistics['tx.entries'], 2)
+
+        self._drain(sc)
+        self.assertEqual(
+            receiver.received,
+            [('update', str(j)) for j in range(8)]
+        )
+        self.assertEqual(sc.statistics['rx.messages'], 8)
+        self.assertEqual(sc.statistics['rx.entries'], 2)
+
+    def test_batched_timeout(self):
+        receiver, sc, pc = self._channels(batch_size=100)
+
+        pc.publish('update', {'indicator': '1'})
+        pc.publish('update', {'indicator': '2'})
+        self.assertEqual(pc.num_publish, 0)
+
+        gevent.sleep(0.2)
+        self.assertEqual(pc.num_publish, 1)
+        self.assertEqual(pc.num_messages, 2)
+
+        self._drain(sc)
+        self.assertEqual(receiver.received, [('update', '1'), ('update', '2')])
+
+    def test_batched_params_snapshot(self):
+        receiver, sc, pc = self._channels(batch_size=100)
+
+        params = {'indicator': '1'}
+        pc.publish('update', params)
+        params['indicator'] = '2'
+        pc.flush()
+
+        self._drain(sc)
+        self.assertEqual(receiver.received, [('update', '1')])
+
+    def test_batched_checkpoint_flush(self):
+        receiver, sc, pc = self._channels(batch_size=100)
+
+        pc.publish('update', {'indicator': '1'})
+        pc.publish('checkpoint', {'value': 'x'})
+        self.assertEqual(pc.num_publish, 1)
+        self.assertEqual(pc._batch_glet, None)
+
+        self._drain(sc)
+        self.assertEqual(receiver.received, [('update', '1'), ('checkpoint', 'x')])
+
+    def test_batched_lagger_checkpoint(self):
+        receiver, sc, pc = self._channels(batch_size=100)
+
+        # the timed flush waits for the lagger
+        blocked = [True]
+        consumed = pc._consumed
+        pc._consumed = lambda lagger: (
+            -2048 if blocked[0] else consumed(lagger)
+        )
+        pc._last_lagger_check = -128
+
+        pc.publish('update', {'indicator': '1'})
+        pc.publish('update', {'indicator': '2'})
+        gevent.sleep(0.1)
+        self.assertEqual(pc.num_publish, 0)
+
+        g = gevent.spawn(pc.publish, 'checkpoint', {'value': 'x'})
+        gevent.sleep(0.2)
+        self.assertEqual(pc.num_publish, 0)
+
+        blocked[0] = False
+        g.join(timeout=1)
+        self.assertEqual(pc.num_publish, 2)
+
+        self._drain(sc)
+        self.assertEqual(
+            receiver.received,
+            [('update', '1'), ('update', '2'), ('checkpoint', 'x')]
+        )
+
+    def test_lagger_messages(self):
+        receiver, sc, pc = self._channels(batch_size=10)
+
+        for j in range(30):
+            pc.publish('update', {'indicator': str(j)})
+
+        # subscriber consumed 2 entries out of 3
+        SR = redis.StrictRedis.from_url('unix:///var/run/redis/redis.sock')
+        SR.lset('{}:subscribers'.format(sc.prefix), sc.sub_number, 2)
+
+        self.assertEqual(pc.lagger(), 2)
+        self.assertEqual(pc._consumed(pc.lagger()), 20)
+        self.assertEqual(pc.num_messages - pc._consumed(pc.lagger()), 10)
+
+    def test_rpc_stream(self):
+        receiver = Receiver()
+        name = '@testrpc-%d' % int(time.time())
+
+        comm = minemeld.comm.zmqredis.ZMQRedis({})
+        comm.request_rpc_server_channel(
+            name,
+            receiver,
+            allowed_methods=['update_bulk']
+        )
+        comm.start()
+
+        try:
+            num_calls = comm.send_rpc_stream(
+                name,
+                'update_bulk',
+                iter([
+                    {'items': [1, 2], 'eos': False},
+                    {'items': [3], 'eos': True}
+                ]),
+                timeout=5
+            )
+            self.assertEqual(num_calls, 2)
+            self.assertEqual(receiver.received, [
+                ('update_bulk', [1, 2], False),
+                ('update_bulk', [3], True)
+            ])
+
+            # the stream is aborted at the first error
+            with self.assertRaises(RuntimeError):
+                comm.send_rpc_stream(
+                    name,
+                    'update_bulk',
+                    iter([{'items': ['fail']}, {'items': [4]}]),
+                    timeout=5
+                )
+            self.assertEqual(len(receiver.received), 2)
+
+        finally:
+            comm.stop()
@@ -0,0 +1,161 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Fabric tests
+
+Unit tests for minemeld.fabric
+"""
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import unittest
+import mock
+
+import gevent
+
+import minemeld.fabric
+
+
+class Receiver(object):
+    def __init__(self):
+        self.received = []
+
+    def update(self, indicator=None, value=None):
+        self.received.append(('update', indicator, value))
+
+
+class MineMeldFabricTests(unittest.TestCase):
+    @mock.patch('minemeld.comm.factory')
+    def test_no_remote_topics(self, comm_factory):
+        f = minemeld.fabric.Fabric(None, {}, 'ZMQRedis')
+        comm = comm_factory.return_value
+
+        f.request_pub_channel('a')
+        f.request_sub_channel('b', Receiver(), 'a', ['update'])
+
+        comm.request_pub_channel.assert_called_once_with('a')
+        self.assertEqual(comm.request_sub_channel.call_count, 1)
+
+    @mock.patch('minemeld.comm.factory')
+    def test_local_delivery(self, comm_factory):
+        f = minemeld.fabric.Fabric(None, {}, 'ZMQRedis')
+        f.set_remote_topics([])
+        comm = comm_factory.return_value
+        comm.statistics.return_value = {}
+
+        receiver = Receiver()
+        pc = f.request_pub_channel('a')
+        f.request_sub_channel('b', receiver, 'a', ['update'])
+        f.start()
+        f.start_dispatching()
+
+        value = {'type': 'IPv4'}
+        pc.publish('update', {'indicator': '1.1.1.1', 'value': value})
+        value['type'] = 'URL'
+        gevent.sleep(0)
+
+        self.assertEqual(
+            receiver.received,
+            [('update', '1.1.1.1', {'type': 'IPv4'})]
+        )
+        self.assertFalse(comm.request_pub_channel.called)
+        self.assertFalse(comm.request_sub_channel.called)
+
+        stats = f.statistics()
+        self.assertEqual(stats['a']['tx.local.messages'], 1)
+        self.assertEqual(stats['a']['rx.local.messages'], 1)
+
+        f.stop()
+
+    @mock.patch('minemeld.comm.factory')
+    def test_local_publish_before_dispatching(self, comm_factory):
+        f = minemeld.fabric.Fabric(None, {}, 'ZMQRedis')
+        f.set_remote_topics([])
+
+        receiver = Receiver()
+        pc = f.request_pub_channel('a')
+        f.request_sub_channel('b', receiver, 'a', ['update'])
+        f.start()
+
+        # more than the size of the queue, the publisher does not block
+        num_messages = minemeld.fabric.LOCAL_QUEUE_SIZE + 10
+        for j in range(num_messages):
+            pc.publish('update', {'indicator': j})
+        self.assertEqual(receiver.received, [])
+
+        f.start_dispatching()
+        pc.publish('update', {'indicator': num_messages})
+        gevent.sleep(0.1)
+
+        self.assertEqual(
+            [r[1] for r in receiver.received],
+            range(num_messages+1)
+        )
+
+        f.stop()
+
+    @mock.patch('minemeld.comm.factory')
+    def test_remote_topics(self, comm_factory):
+        f = minemeld.fabric.Fabric(None, {}, 'ZMQRedis')
+        f.set_remote_topics(['a'])
+        comm = comm_factory.return_value
+
+        receiver = Receiver()
+        pc = f.request_pub_channel('a')
+        f.request_sub_channel('b', receiver, 'a', ['update'])
+        f.request_sub_channel('b', receiver, 'c', ['update'])
+        f.start()
+        f.start_dispatching()
+
+        comm.request_pub_channel.assert_called_once_with('a')
+        comm.request_sub_channel.assert_called_once_with(
+            'c', receiver, ['update']
+        )
+
+        pc.publish('update', {'indicator': '1.1.1.1'})
+        gevent.sleep(0)
+
+        self.assertEqual(receiver.received, [('update', '1.1.1.1', None)])
+        comm.request_pub_channel.return_value.publish.assert_called_once_with(
+            'update', {'indicator': '1.1.1.1'}
+        )
+
+        f.stop()
+
+    @mock.patch('minemeld.comm.factory')
+    def test_send_rpc_bulk(self, comm_factory):
+        f = minemeld.fabric.Fabric(None, {}, 'ZMQRedis')
+        comm = comm_factory.return_value
+
+        calls = []
+
+        def _send_rpc_stream(dest, method, params_iterator, timeout=None):
+            calls.extend(params_iterator)
+            return len(calls)
+
+        comm.send_rpc_stream.side_effect = _send_rpc_stream
+
+        f.send_rpc_bulk('a', 'b', 'update_bulk', iter(range(5)), chunk_size=2)
+
+        self.assertEqual(comm.send_rpc_stream.call_args[0][:2], ('b', 'update_bulk'))
+        self.assertEqual(calls, [
+            {'source': 'a', 'items': [0, 1], 'eos': False},
+            {'source': 'a', 'items': [2, 3], 'eos': False},
+            {'source': 'a', 'items': [4], 'eos': True}
+        ])
+
+        del calls[:]
+        f.send_rpc_bulk('a', 'b', 'update_bulk', [], chunk_size=2)
+        self.assertEqual(calls, [{'source': 'a', 'items': [], 'eos': True}])
@@ -0,0 +1,66 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Feed compression tests
+
+Unit tests for minemeld.flask.compression
+"""
+
+import unittest
+import zlib
+import gzip
+import cStringIO
+
+import flask
+
+import minemeld.flask.compression
+
+
+class MineMeldFeedCompressionTests(unittest.TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+
+    def _accepted_encoding(self, accept_encoding):
+        headers = {}
+        if accept_encoding is not None:
+            headers['Accept-Encoding'] = accept_encoding
+
+        with self.app.test_request_context('/', headers=headers):
+            return minemeld.flask.compression.accepted_encoding()
+
+    def test_accepted_encoding(self):
+        self.assertEqual(self._accepted_encoding(None), None)
+        self.assertEqual(self._accepted_encoding('br'), None)
+        self.assertEqual(self._accepted_encoding('gzip'), 'gzip')
+        self.assertEqual(self._accepted_encoding('deflate'), 'deflate')
+        self.assertEqual(self._accepted_encoding('deflate, gzip;q=0.5'), 'deflate')
+        self.assertEqual(self._accepted_encoding('gzip;q=0, deflate;q=0'), None)
+
+    def test_compress_stream(self):
+        chunks = ['10.0.0.%d\n' % j for j in range(256)]
+        chunks.append(u'\xe8\n')
+        expected = ''.join(chunks).encode('utf-8')
+
+        stats = minemeld.flask.compression.STATISTICS
+        saved = stats['bytes.saved']
+
+        body = ''.join(minemeld.flask.compression.compress_stream(iter(chunks), 'gzip'))
+        self.assertEqual(
+            gzip.GzipFile(fileobj=cStringIO.StringIO(body)).read(),
+            expected
+        )
+        self.assertEqual(stats['bytes.saved']-saved, len(expected)-len(body))
+
+        body = ''.join(minemeld.flask.compression.compress_stream(iter(chunks), 'deflate'))
+        self.assertEqual(zlib.decompress(body), expected)
@@ -0,0 +1,84 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Feed cache tests
+
+Unit tests for minemeld.flask.feedcache
+"""
+
+import unittest
+import mock
+
+from minemeld.flask.feedcache import FeedCache
+import minemeld.flask.feedredis
+
+
+class MineMeldFeedCacheTests(unittest.TestCase):
+    def test_get_put(self):
+        fc = FeedCache(max_size=100, max_entry_size=50)
+
+        self.assertEqual(fc.get('a'), None)
+        self.assertTrue(fc.put('a', 'x' * 10))
+        self.assertEqual(fc.get('a'), 'x' * 10)
+        self.assertEqual(fc.size, 10)
+
+        self.assertTrue(fc.put('a', 'y' * 20))
+        self.assertEqual(fc.get('a'), 'y' * 20)
+        self.assertEqual(fc.size, 20)
+
+        self.assertEqual(fc.statistics['hit'], 2)
+        self.assertEqual(fc.statistics['miss'], 1)
+
+    def test_too_big(self):
+        fc = FeedCache(max_size=100, max_entry_size=50)
+
+        self.assertFalse(fc.put('a', 'x' * 51))
+        self.assertEqual(fc.get('a'), None)
+        self.assertEqual(fc.size, 0)
+
+    def test_lru(self):
+        fc = FeedCache(max_size=100, max_entry_size=50)
+
+        fc.put('a', 'x' * 40)
+        fc.put('b', 'x' * 40)
+        fc.get('a')
+        fc.put('c', 'x' * 40)
+
+        # b is the least recently used
+        self.assertEqual(fc.get('b'), None)
+        self.assertNotEqual(fc.get('a'), None)
+        self.assertNotEqual(fc.get('c'), None)
+        self.assertEqual(fc.size, 80)
+        self.assertEqual(len(fc), 2)
+        self.assertEqual(fc.statistics['evicted'], 1)
+
+    @mock.patch.object(minemeld.flask.feedredis, '_feed_generation')
+    def test_caching_generator(self, feed_generation_mock):
+        fc = FeedCache(max_size=100, max_entry_size=50)
+        feed_generation_mock.return_value = ('1', 10)
+
+        with mock.patch.object(minemeld.flask.feedredis, 'FEED_CACHE', fc):
+            chunks = list(minemeld.flask.feedredis._caching_generator(
+                'a', 'feed', ('1', 10), iter(['x' * 20, 'y' * 20])
+            ))
+            self.assertEqual(chunks, ['x' * 20, 'y' * 20])
+            self.assertEqual(fc.get('a'), 'x' * 20 + 'y' * 20)
+
+            # chunks are not collected past max_entry_size
+            g = minemeld.flask.feedredis._caching_generator(
+                'b', 'feed', ('1', 10), iter(['x' * 40, 'y' * 40, 'z'])
+            )
+            self.assertEqual(list(g), ['x' * 40, 'y' * 40, 'z'])
+            self.assertEqual(fc.get('b'), None)
+            self.assertEqual(fc.statistics['too_big'], 1)
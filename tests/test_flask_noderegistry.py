@@ -0,0 +1,88 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Node registry tests
+
+Unit tests for minemeld.flask.noderegistry
+"""
+
+import unittest
+import mock
+
+from blinker import signal
+
+import minemeld.flask.noderegistry
+
+
+def _status(nodes):
+    return {
+        'result': {
+            'mbus:slave:'+n: {'class': c} for n, c in nodes.iteritems()
+        }
+    }
+
+
+class MineMeldNodeRegistryTests(unittest.TestCase):
+    @mock.patch.object(minemeld.flask.noderegistry, 'MMMaster')
+    def test_lookup(self, MMMaster):
+        MMMaster.status.return_value = _status({'f1': 'minemeld.ft.redis.RedisSet'})
+
+        nr = minemeld.flask.noderegistry.NodeRegistry(ttl=300, miss_refresh_interval=10)
+        self.assertEqual(nr.node_class('f1'), 'minemeld.ft.redis.RedisSet')
+        self.assertEqual(nr.node_class('f1'), 'minemeld.ft.redis.RedisSet')
+        self.assertEqual(MMMaster.status.call_count, 1)
+
+        # unknown nodes trigger a refresh at most once per interval
+        self.assertEqual(nr.node_class('f2'), None)
+        self.assertEqual(nr.node_class('f2'), None)
+        self.assertEqual(MMMaster.status.call_count, 1)
+
+        with mock.patch('time.time', return_value=nr._last_refresh+11):
+            MMMaster.status.return_value = _status({
+                'f1': 'minemeld.ft.redis.RedisSet',
+                'f2': 'minemeld.ft.taxii.DataFeed'
+            })
+            self.assertEqual(nr.node_class('f2'), 'minemeld.ft.taxii.DataFeed')
+            self.assertEqual(MMMaster.status.call_count, 2)
+
+    @mock.patch.object(minemeld.flask.noderegistry, 'MMMaster')
+    def test_events(self, MMMaster):
+        MMMaster.status.return_value = _status({'f1': 'minemeld.ft.redis.RedisSet'})
+
+        nr = minemeld.flask.noderegistry.NodeRegistry(ttl=300, miss_refresh_interval=10)
+        nr.nodes()
+
+        signal('mm-status').send('f2', data={'status': {'class': 'minemeld.ft.taxii.DataFeed'}})
+        self.assertEqual(nr.node_class('f2'), 'minemeld.ft.taxii.DataFeed')
+        self.assertEqual(MMMaster.status.call_count, 1)
+
+        # engine restarted, full refresh at next lookup
+        signal('mm-status').send('<minemeld-engine>', data={'status': {}})
+        self.assertEqual(nr.node_class('f2'), None)
+        self.assertEqual(MMMaster.status.call_count, 2)
+
+    @mock.patch.object(minemeld.flask.noderegistry, 'MMMaster')
+    def test_error(self, MMMaster):
+        MMMaster.status.return_value = {'error': 'timeout'}
+
+        nr = minemeld.flask.noderegistry.NodeRegistry(ttl=300, miss_refresh_interval=10)
+        self.assertRaises(RuntimeError, nr.node_class, 'f1')
+
+        MMMaster.status.return_value = _status({'f1': 'minemeld.ft.redis.RedisSet'})
+        self.assertEqual(nr.node_class('f1'), 'minemeld.ft.redis.RedisSet')
+
+        # stale data is kept on errors
+        MMMaster.status.return_value = {'error': 'timeout'}
+        with mock.patch('time.time', return_value=nr._last_refresh+301):
+            self.assertEqual(nr.node_class('f1'), 'minemeld.ft.redis.RedisSet')
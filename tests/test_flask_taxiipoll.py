@@ -0,0 +1,124 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""TAXII poll service tests
+
+Unit tests for minemeld.flask.taxiipoll
+"""
+
+import re
+import unittest
+import mock
+
+import flask
+import redis
+import lz4.frame
+
+import minemeld.flask.taxiipoll
+
+FEED = 'mm-test-taxiipoll'
+REDIS_URL = 'unix:///var/run/redis/redis.sock'
+
+
+class MineMeldTaxiiPollTests(unittest.TestCase):
+    def setUp(self):
+        self.SR = redis.StrictRedis.from_url(REDIS_URL)
+        self.SR.delete(FEED, FEED+'.value')
+
+        # 3 indicators per timestamp, to check parts boundaries
+        # inside groups of indicators with the same score
+        for j in range(25):
+            indicator = 'i%02d' % j
+            self.SR.zadd(FEED, j // 3 + 1, indicator)
+            self.SR.hset(
+                FEED+'.value', indicator,
+                'lz4cb'+lz4.frame.compress('<cb%d/>' % j)
+            )
+
+        self.app = flask.Flask(__name__)
+
+    def tearDown(self):
+        self.SR.delete(FEED, FEED+'.value')
+        for k in self.SR.keys(minemeld.flask.taxiipoll._POLL_RESULT_PREFIX+'*'):
+            self.SR.delete(k)
+
+    def _poll(self, f, *args):
+        with mock.patch.object(minemeld.flask.taxiipoll, 'SR', self.SR), \
+             mock.patch.object(minemeld.flask.taxiipoll, 'POLL_PAGE_SIZE', 4), \
+             mock.patch.object(minemeld.flask.taxiipoll, 'get_taxii_feeds', return_value=[FEED]), \
+             self.app.test_request_context('/'):
+            response = f(*args)
+            if isinstance(response, tuple):
+                return response
+
+            return ''.join(response.response)
+
+    def _blocks(self, body):
+        return [int(cb) for cb in re.findall(r'<cb(\d+)/>', body)]
+
+    @mock.patch.object(minemeld.flask.taxiipoll, 'POLL_PART_SIZE', 10)
+    def test_poll_fulfillment(self):
+        body = self._poll(
+            minemeld.flask.taxiipoll.data_feed_11,
+            '1', FEED, None, None
+        )
+        self.assertIn('more="true"', body)
+        self.assertIn('result_part_number="1"', body)
+        self.assertEqual(self._blocks(body), range(10))
+
+        result_id = re.search(r'result_id="([^"]+)"', body).group(1)
+
+        body = self._poll(
+            minemeld.flask.taxiipoll.poll_fulfillment_11,
+            '2', FEED, result_id, 2
+        )
+        self.assertIn('more="true"', body)
+        self.assertIn('result_part_number="2"', body)
+        self.assertEqual(self._blocks(body), range(10, 20))
+
+        body = self._poll(
+            minemeld.flask.taxiipoll.poll_fulfillment_11,
+            '3', FEED, result_id, 3
+        )
+        self.assertIn('more="false"', body)
+        self.assertEqual(self._blocks(body), range(20, 25))
+
+        # parts can be requested again
+        body = self._poll(
+            minemeld.flask.taxiipoll.poll_fulfillment_11,
+            '4', FEED, result_id, 2
+        )
+        self.assertEqual(self._blocks(body), range(10, 20))
+
+        response = self._poll(
+            minemeld.flask.taxiipoll.poll_fulfillment_11,
+            '5', FEED, result_id, 4
+        )
+        self.assertEqual(response[1], 400)
+
+        response = self._poll(
+            minemeld.flask.taxiipoll.poll_fulfillment_11,
+            '6', FEED, 'unknown', 2
+        )
+        self.assertEqual(response[1], 400)
+
+    @mock.patch.object(minemeld.flask.taxiipoll, 'POLL_PART_SIZE', 0)
+    def test_poll_no_pagination(self):
+        body = self._poll(
+            minemeld.flask.taxiipoll.data_feed_11,
+            '1', FEED, None, None
+        )
+        self.assertIn('more="false"', body)
+        self.assertNotIn('result_id=', body)
+        self.assertEqual(self._blocks(body), range(25))
@@ -82,6 +82,7 @@ class MineMeldFTBaseTests(unittest.TestCase):
             b,
             allowed_methods=[
                 'update',
+                'update_bulk',
                 'withdraw',
                 'checkpoint',
                 'get',
@@ -118,6 +119,7 @@ class MineMeldFTBaseTests(unittest.TestCase):
             b,
             allowed_methods=[
                 'update',
+                'update_bulk',
                 'withdraw',
                 'checkpoint',
                 'get',
@@ -138,6 +140,39 @@ class MineMeldFTBaseTests(unittest.TestCase):
             block=True
         )
 
+    def test_rpc_bulk(self):
+        ftname = 'test'
+
+        config = {}
+        chassis = mock.Mock()
+
+        b = minemeld.ft.base.BaseFT(ftname, chassis, config)
+        b.connect([], False)
+
+        updates = iter([('i1', {'a': 1}), ('i2', {'a': 2})])
+        b.send_updates('destft', updates)
+
+        chassis.send_rpc_bulk.assert_called_once_with(
+            ftname,
+            'destft',
+            'update_bulk',
+            updates,
+            chunk_size=minemeld.ft.base.BULK_CHUNK_SIZE,
+            timeout=30
+        )
+
+        b.update = mock.Mock()
+        b.update_bulk(
+            source='srcft',
+            items=[['i1', {'a': 1}], ['i2', None]],
+            eos=True
+        )
+        b.update.assert_has_calls([
+            mock.call(source='srcft', indicator='i1', value={'a': 1}),
+            mock.call(source='srcft', indicator='i2', value=None)
+        ])
+        self.assertEqual(b.statistics['update_bulk.rx'], 1)
+
     def test_emit(self):
         ftname = 'test'
 
@@ -163,6 +198,7 @@ class MineMeldFTBaseTests(unittest.TestCase):
             b,
             allowed_methods=[
                 'update',
+                'update_bulk',
                 'withdraw',
                 'checkpoint',
                 'get',
@@ -232,6 +268,7 @@ class MineMeldFTBaseTests(unittest.TestCase):
             b,
             allowed_methods=[
                 'update',
+                'update_bulk',
                 'withdraw',
                 'checkpoint',
                 'get',
@@ -264,6 +301,69 @@ class MineMeldFTBaseTests(unittest.TestCase):
         b.emit_update('testi', {'type': 'IPv6', 'direction': 'outbound'})
         self.assertEqual(ochannel.publish.call_count, 0)
 
+    def test_filters(self):
+        statistics = {
+            'filter.rule_1.hit': 0, 'filter.rule_1.time_us': 0,
+            'filter.rule2.hit': 0, 'filter.rule2.time_us': 0,
+            'filter.rule3.hit': 0, 'filter.rule3.time_us': 0
+        }
+        filters = minemeld.ft.base._Filters([
+            {
+                'name': 'rule 1',
+                'conditions': [
+                    "__method == 'withdraw'",
+                    "__origin != 'm2'"
+                ],
+                'actions': ['accept']
+            },
+            {
+                'name': 'rule2',
+                'conditions': [
+                    "confidence < 50",
+                    "direction == null"
+                ],
+                'actions': ['drop']
+            },
+            {
+                'name': 'rule3',
+                'conditions': [
+                    "length(sources) > `1`"
+                ],
+                'actions': ['drop']
+            }
+        ], statistics=statistics)
+
+        self.assertEqual(filters.filters[0]['conditions'][0].field, '__method')
+        self.assertEqual(filters.filters[2]['conditions'][0].field, None)
+
+        value = {'confidence': 10, 'sources': ['m1']}
+        i, v = filters.apply(origin='m1', method='withdraw',
+                             indicator='1.1.1.1', value=value)
+        self.assertEqual(i, '1.1.1.1')
+        self.assertIs(v, value)
+
+        i, v = filters.apply(origin='m1', method='update',
+                             indicator='1.1.1.1', value=value)
+        self.assertEqual(i, None)
+        self.assertEqual(v, None)
+
+        value = {'confidence': 80, 'sources': ['m1', 'm2']}
+        i, v = filters.apply(origin='m1', method='update',
+                             indicator='1.1.1.1', value=value)
+        self.assertEqual(i, None)
+        self.assertEqual(value, {'confidence': 80, 'sources': ['m1', 'm2']})
+
+        value = {'confidence': 90, 'sources': ['m1']}
+        i, v = filters.apply(origin='m2', method='withdraw',
+                             indicator='1.1.1.1', value=value)
+        self.assertEqual(i, '1.1.1.1')
+        self.assertIs(v, value)
+
+        self.assertEqual(statistics['filter.rule_1.hit'], 1)
+        self.assertEqual(statistics['filter.rule2.hit'], 1)
+        self.assertEqual(statistics['filter.rule3.hit'], 1)
+        self.assertGreater(statistics['filter.rule_1.time_us'], 0)
+
     def test_full_trace(self):
         config = {}
         chassis = mock.Mock()
@@ -763,6 +763,60 @@ class MineMeldFTBasePollerTests(unittest.TestCase):
 
         gc.collect()
 
+    @mock.patch.object(gevent, 'spawn')
+    @mock.patch.object(gevent, 'spawn_later')
+    @mock.patch.object(gevent, 'sleep', side_effect=gevent.GreenletExit())
+    @mock.patch('gevent.event.Event', side_effect=gevent_event_mock_factory)
+    @mock.patch('minemeld.ft.basepoller.utc_millisec', side_effect=logical_millisec)
+    def test_sudden_death_touched(self, um_mock, event_mock,
+                                  sleep_mock, spawnl_mock, spawn_mock):
+        global CUR_LOGICAL_TIME
+
+        chassis = mock.Mock()
+
+        a = PermanentFeed(FTNAME, chassis)
+        a.iterators = [
+            ['A', 'B', 'C'],
+            ['A', 'B', 'C'],
+            ['A', 'B', 'C'],
+            ['A', 'B']
+        ]
+
+        a.connect([], False)
+        a.mgmtbus_initialize()
+        a.start()
+
+        for t in range(2, 5):
+            CUR_LOGICAL_TIME = t
+            a._poll()
+
+            get_mock = mock.Mock(wraps=a.table.table.get)
+            a.table.table.get = get_mock
+            a._sudden_death()
+            del a.table.table.get
+
+        # touched indicators seen in the last run are not checked
+        self.assertEqual(get_mock.call_count, 0)
+        self.assertEqual(a.statistics.get('removed', 0), 0)
+        self.assertEqual(a.statistics['touched'], 6)
+
+        CUR_LOGICAL_TIME = 5
+        a._poll()
+        a._sudden_death()
+        self.assertEqual(a.statistics['removed'], 1)
+        self.assertEqual(a.table.get('C')['_age_out'], 4999)
+        self.assertEqual(
+            a.table.get('A')['_age_out'],
+            minemeld.ft.basepoller._MAX_AGE_OUT
+        )
+
+        a.stop()
+
+        a = None
+        chassis = None
+
+        gc.collect()
+
     @mock.patch.object(gevent, 'spawn')
     @mock.patch.object(gevent, 'spawn_later')
     @mock.patch.object(gevent, 'sleep', side_effect=gevent.GreenletExit())
@@ -816,6 +870,7 @@ class MineMeldFTBasePollerTests(unittest.TestCase):
         a._collect_garbage()
         self.assertEqual(a.statistics['added'], 4)
         self.assertEqual(a.statistics.get('removed', 0), 1)
+        self.assertEqual(a.statistics.get('touched', 0), 2)
         self.assertEqual(a.statistics.get('garbage_collected', 0), 1)
 
         CUR_LOGICAL_TIME = 5
@@ -1189,6 +1244,31 @@ class MineMeldFTBasePollerTests(unittest.TestCase):
 
         bpt1.close()
 
+    @mock.patch.object(gevent, 'spawn')
+    @mock.patch.object(gevent, 'spawn_later')
+    @mock.patch.object(gevent, 'sleep', side_effect=gevent.GreenletExit())
+    @mock.patch('gevent.event.Event', side_effect=gevent_event_mock_factory)
+    @mock.patch('minemeld.ft.basepoller.utc_millisec', side_effect=logical_millisec)
+    def test_bptable_run_marks(self, um_mock, event_mock,
+                               sleep_mock, spawnl_mock, spawn_mock):
+        t = minemeld.ft.table.Table(FTNAME, truncate=True)
+        bpt1 = minemeld.ft.basepoller._BPTable_v1(t, type_in_key=True, run_marks=True)
+
+        bpt1.put('A', {'type': 'IPv4', '_last_run': 1})
+        bpt1.touch('A', 5, itype='IPv4')
+
+        self.assertEqual(bpt1.get('A', itype='IPv4')['_last_run'], 5)
+        k, v = next(bpt1.query(include_value=True))
+        self.assertEqual(k, 'A')
+        self.assertEqual(v['_last_run'], 5)
+
+        # the _last_run index is not updated by touch
+        k, v = next(bpt1.query(index='_last_run', to_key=4, include_value=True))
+        self.assertEqual(k, 'A')
+        self.assertEqual(v['_last_run'], 5)
+
+        bpt1.close()
+
     @mock.patch.object(gevent, 'spawn')
     @mock.patch.object(gevent, 'spawn_later')
     @mock.patch.object(gevent, 'sleep', side_effect=gevent.GreenletExit())
@@ -0,0 +1,130 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""FT conditional requests tests
+
+Unit tests for minemeld.ft.conditional
+"""
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import unittest
+import mock
+import time
+import shutil
+
+import minemeld.ft.conditional
+import minemeld.ft.http
+from minemeld.ft import ft_states
+
+FTNAME = 'testft-%d' % int(time.time())
+
+
+def _response(status_code=200, headers=None, content='1.1.1.1\n2.2.2.2\n'):
+    r = mock.Mock()
+    r.status_code = status_code
+    r.headers = headers if headers is not None else {}
+    r.content = content
+    r.iter_lines.side_effect = lambda: iter(content.splitlines())
+
+    return r
+
+
+class MineMeldFTConditionalTests(unittest.TestCase):
+    def test_validators(self):
+        cr = minemeld.ft.conditional.ConditionalRequest('test')
+        self.assertEqual(cr.headers(), {})
+
+        r = _response(headers={'etag': '"a"', 'last-modified': 'Mon, 01 Jan 2018 00:00:00 GMT'})
+        self.assertFalse(cr.unchanged(r))
+        it = cr.track(iter([1, 2]))
+
+        # validators are saved only when the iterator is exhausted
+        next(it)
+        self.assertEqual(cr.headers(), {})
+        list(it)
+        self.assertEqual(cr.headers(), {
+            'If-None-Match': '"a"',
+            'If-Modified-Since': 'Mon, 01 Jan 2018 00:00:00 GMT'
+        })
+        self.assertEqual(cr.content_hash, None)
+
+        self.assertTrue(cr.unchanged(_response(status_code=304)))
+        self.assertTrue(cr.unchanged(_response(headers={'etag': '"a"'})))
+        self.assertFalse(cr.unchanged(_response(headers={'etag': '"b"'})))
+
+        saved = cr.create()
+        cr.reset()
+        self.assertEqual(cr.headers(), {})
+        cr.restore(saved)
+        self.assertEqual(cr.etag, '"a"')
+
+    def test_content_hash(self):
+        cr = minemeld.ft.conditional.ConditionalRequest('test', content_hash=True)
+
+        self.assertEqual(cr.read_content(_response()), '1.1.1.1\n2.2.2.2\n')
+        self.assertEqual(cr.read_content(_response(headers={'etag': '"a"'})), None)
+
+        self.assertFalse(cr.unchanged(_response()))
+        list(cr.track(iter([])))
+        self.assertNotEqual(cr.content_hash, None)
+
+        self.assertTrue(cr.unchanged(_response()))
+        self.assertFalse(cr.unchanged(_response(content='3.3.3.3\n')))
+        self.assertTrue(cr.unchanged(_response(content=None), content='1.1.1.1\n2.2.2.2\n'))
+
+        # the body is not read unless content hash is enabled
+        cr = minemeld.ft.conditional.ConditionalRequest('test')
+        self.assertEqual(cr.read_content(_response()), None)
+        self.assertFalse(cr.unchanged(_response()))
+        list(cr.track(iter([])))
+        self.assertFalse(cr.unchanged(_response()))
+
+    @mock.patch.object(minemeld.ft.http, 'requests')
+    def test_http_unchanged(self, requests_mock):
+        chassis = mock.Mock()
+        chassis.request_sub_channel.return_value = None
+        chassis.request_rpc_channel.return_value = None
+        chassis.request_pub_channel.return_value = mock.Mock()
+
+        a = minemeld.ft.http.HttpFT(FTNAME, chassis, {
+            'url': 'http://example.com/feed.txt',
+            'attributes': {'type': 'IPv4'}
+        })
+        a.connect([], ['output'])
+        a.mgmtbus_initialize()
+        a._state = ft_states.STARTED
+
+        try:
+            requests_mock.get.return_value = _response(headers={'etag': '"a"'})
+            self.assertTrue(a._polling_loop())
+            self.assertEqual(a.statistics['added'], 2)
+
+            requests_mock.get.return_value = _response(status_code=304)
+            self.assertFalse(a._polling_loop())
+            self.assertEqual(a.statistics['unchanged'], 1)
+            self.assertEqual(
+                requests_mock.get.call_args[1]['headers'],
+                {'If-None-Match': '"a"'}
+            )
+
+            self.assertEqual(
+                a._saved_state_create()['conditional_request']['etag'],
+                '"a"'
+            )
+
+        finally:
+            a.table.close()
+            shutil.rmtree(FTNAME, ignore_errors=True)
@@ -1219,6 +1219,144 @@ class MineMeldFTIPOpTests(unittest.TestCase):
         a.st.db.close()
         a = None
 
+    def test_ipv6(self):
+        config = {'whitelist_prefixes': ['wl']}
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        a = minemeld.ft.ipop.AggregateIPv6FT(FTNAME, chassis, config)
+
+        inputs = ['s1', 's2', 'wl1']
+        output = True
+
+        a.connect(inputs, output)
+        a.mgmtbus_initialize()
+        a.start()
+
+        def _emitted():
+            result = sorted(
+                (c[0][0], c[0][1]['indicator'])
+                for c in ochannel.publish.call_args_list
+            )
+            ochannel.publish.reset_mock()
+            return result
+
+        a.filtered_update('s1', indicator='2001:db8::/32', value={
+            'type': 'IPv6',
+            'sources': ['s1s']
+        })
+        self.assertEqual(_emitted(), [('update', '2001:db8::/32')])
+
+        # wrong type and invalid indicators are ignored
+        a.filtered_update('s1', indicator='10.0.0.1', value={
+            'type': 'IPv4'
+        })
+        a.filtered_update('s1', indicator='10.0.0.1', value={
+            'type': 'IPv6'
+        })
+        self.assertEqual(_emitted(), [])
+
+        # overlapping range is split
+        a.filtered_update('s2', indicator='2001:db8:8000::/33', value={
+            'type': 'IPv6',
+            'sources': ['s2s']
+        })
+        self.assertEqual(
+            ochannel.publish.call_args_list[0][0][1]['indicator'],
+            '2001:db8:8000::/33'
+        )
+        self.assertEqual(
+            sorted(ochannel.publish.call_args_list[0][0][1]['value']['sources']),
+            ['s1s', 's2s']
+        )
+        self.assertEqual(_emitted(), [
+            ('update', '2001:db8:8000::/33'),
+            ('update', '2001:db8::/33'),
+            ('withdraw', '2001:db8::/32')
+        ])
+
+        # whitelisted range is subtracted
+        a.filtered_update('wl1', indicator='2001:db8::1', value={
+            'type': 'IPv6'
+        })
+        self.assertEqual(_emitted(), [
+            ('update', '2001:db8::/128'),
+            ('update', '2001:db8::2-2001:db8:7fff:ffff:ffff:ffff:ffff:ffff'),
+            ('withdraw', '2001:db8::/33')
+        ])
+
+        a.filtered_withdraw('wl1', indicator='2001:db8::1', value={
+            'type': 'IPv6'
+        })
+        a.filtered_withdraw('s2', indicator='2001:db8:8000::/33', value={
+            'type': 'IPv6'
+        })
+        self.assertIn(('update', '2001:db8::/32'), _emitted())
+
+        a.stop()
+
+        a.st.db.close()
+        a = None
+
+    def test_in_memory_index(self):
+        random.seed(42)
+        ops = []
+        live = []
+        for j in xrange(300):
+            if live and random.randint(0, 3) == 0:
+                ops.append(('withdraw',) + live.pop(random.randint(0, len(live)-1)))
+                continue
+
+            source = random.choice(['s1', 's2', 'wl1'])
+            start = random.randint(0, 255)
+            end = random.randint(start, min(start+32, 255))
+            indicator = '10.0.0.%d-10.0.0.%d' % (start, end)
+            ops.append(('update', source, indicator))
+            live.append((source, indicator))
+
+        def _run(name, config):
+            chassis = mock.Mock()
+            ochannel = mock.Mock()
+            chassis.request_pub_channel.return_value = ochannel
+
+            a = minemeld.ft.ipop.AggregateIPv4FT(name, chassis, config)
+            a.connect(['s1', 's2', 'wl1'], True)
+            a.mgmtbus_initialize()
+            a.start()
+
+            for op, source, indicator in ops:
+                if op == 'update':
+                    a.filtered_update(source, indicator=indicator, value={
+                        'type': 'IPv4',
+                        'sources': [source]
+                    })
+                else:
+                    a.filtered_withdraw(source, indicator=indicator)
+
+            a.stop()
+            a.st.db.close()
+
+            return sorted(
+                (c[0][0], c[0][1]['indicator'], sorted(c[0][1]['value']['sources']))
+                for c in ochannel.publish.call_args_list
+            )
+
+        config = {'whitelist_prefixes': ['wl']}
+        emitted = _run(FTNAME, config)
+
+        config['in_memory_index'] = True
+        try:
+            memory_emitted = _run(FTNAME+'_mem', config)
+
+        finally:
+            shutil.rmtree(FTNAME+'_mem', ignore_errors=True)
+            shutil.rmtree(FTNAME+'_mem_st', ignore_errors=True)
+
+        self.assertGreater(len(emitted), 0)
+        self.assertEqual(emitted, memory_emitted)
+
     @attr('slow')
     def test_stress_1(self):
         num_intervals = 100000
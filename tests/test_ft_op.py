@@ -590,6 +590,37 @@ class MineMeldFTOpTests(unittest.TestCase):
         a = None
         gc.collect()
 
+    def test_update_bulk(self):
+        config = {}
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        a = minemeld.ft.op.AggregateFT(FTNAME, chassis, config)
+
+        inputs = ['s1']
+        output = True
+
+        a.connect(inputs, output)
+        a.mgmtbus_initialize()
+        a.start()
+
+        items = [
+            ['10.1.0.%d' % j, {'type': 'IPv4', 'confidence': j}]
+            for j in range(20)
+        ]
+
+        # the reply is sent when the actor has processed the chunk
+        a.update_bulk(source='s1', items=items, eos=True)
+        self.assertEqual(a.length(), 20)
+        self.assertEqual(a.statistics['update.processed'], 20)
+
+        a.stop()
+
+        a = None
+        chassis = None
+
     def test_get_all(self):
         config = {}
         chassis = mock.Mock()
@@ -597,7 +628,14 @@ class MineMeldFTOpTests(unittest.TestCase):
         ochannel = mock.Mock()
         chassis.request_pub_channel.return_value = ochannel
 
-        chassis.send_rpc.return_value = {'error': None, 'result': 'OK'}
+        updates = []
+
+        def _send_rpc_bulk(sftname, dftname, method, items, chunk_size, timeout):
+            self.assertEqual(method, 'update_bulk')
+            for indicator, value in items:
+                updates.append((('update', {'indicator': indicator, 'value': value}), {}))
+
+        chassis.send_rpc_bulk.side_effect = _send_rpc_bulk
 
         a = minemeld.ft.op.AggregateFT(FTNAME, chassis, config)
 
@@ -635,7 +673,7 @@ class MineMeldFTOpTests(unittest.TestCase):
         a.get_all(source='test')
         self.assertTrue(
             check_for_rpc(
-                chassis.send_rpc.call_args_list,
+                updates,
                 [
                     {
                         'method': 'update',
@@ -660,8 +698,7 @@ class MineMeldFTOpTests(unittest.TestCase):
                         }
                     }
                 ],
-                all_here=True,
-                offset=2
+                all_here=True
             )
         )
 
@@ -677,7 +714,14 @@ class MineMeldFTOpTests(unittest.TestCase):
         ochannel = mock.Mock()
         chassis.request_pub_channel.return_value = ochannel
 
-        chassis.send_rpc.return_value = {'error': None, 'result': 'OK'}
+        updates = []
+
+        def _send_rpc_bulk(sftname, dftname, method, items, chunk_size, timeout):
+            self.assertEqual(method, 'update_bulk')
+            for indicator, value in items:
+                updates.append((('update', {'indicator': indicator, 'value': value}), {}))
+
+        chassis.send_rpc_bulk.side_effect = _send_rpc_bulk
 
         a = minemeld.ft.op.AggregateFT(FTNAME, chassis, config)
 
@@ -716,7 +760,7 @@ class MineMeldFTOpTests(unittest.TestCase):
                     to_key='10.1.1.0/24')
         self.assertTrue(
             check_for_rpc(
-                chassis.send_rpc.call_args_list,
+                updates,
                 [
                     {
                         'method': 'update',
@@ -741,8 +785,7 @@ class MineMeldFTOpTests(unittest.TestCase):
                         }
                     }
                 ],
-                all_here=True,
-                offset=2
+                all_here=True
             )
         )
 
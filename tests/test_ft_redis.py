@@ -21,6 +21,7 @@ import gevent.monkey
 gevent.monkey.patch_all(thread=False, select=False)
 
 import unittest
+import gevent
 import mock
 import redis
 import time
@@ -34,10 +35,14 @@ class MineMeldFTRedisTests(unittest.TestCase):
     def setUp(self):
         SR = redis.StrictRedis()
         SR.delete(FTNAME)
+        SR.delete(FTNAME+'.generation')
+        SR.delete(FTNAME+'.last_modified')
 
     def tearDown(self):
         SR = redis.StrictRedis()
         SR.delete(FTNAME)
+        SR.delete(FTNAME+'.generation')
+        SR.delete(FTNAME+'.last_modified')
 
     def test_init(self):
         config = {}
@@ -94,6 +99,7 @@ class MineMeldFTRedisTests(unittest.TestCase):
             b,
             allowed_methods=[
                 'update',
+                'update_bulk',
                 'withdraw',
                 'checkpoint',
                 'get',
@@ -106,7 +112,7 @@ class MineMeldFTRedisTests(unittest.TestCase):
         chassis.request_pub_channel.assert_not_called()
 
     def test_uw(self):
-        config = {}
+        config = {'batch_size': 1}
         chassis = mock.Mock()
 
         chassis.request_sub_channel.return_value = None
@@ -143,7 +149,7 @@ class MineMeldFTRedisTests(unittest.TestCase):
         self.assertNotEqual(b.SR, None)
 
     def test_stats(self):
-        config = {}
+        config = {'batch_size': 1}
         chassis = mock.Mock()
 
         chassis.request_sub_channel.return_value = None
@@ -184,7 +190,7 @@ class MineMeldFTRedisTests(unittest.TestCase):
         b.stop()
 
     def test_store_value(self):
-        config = {'store_value': True}
+        config = {'store_value': True, 'batch_size': 1}
         chassis = mock.Mock()
 
         chassis.request_sub_channel.return_value = None
@@ -225,7 +231,7 @@ class MineMeldFTRedisTests(unittest.TestCase):
         self.assertNotEqual(b.SR, None)
 
     def test_store_value_overflow(self):
-        config = {'store_value': True}
+        config = {'store_value': True, 'batch_size': 1}
         chassis = mock.Mock()
 
         chassis.request_sub_channel.return_value = None
@@ -281,3 +287,147 @@ class MineMeldFTRedisTests(unittest.TestCase):
 
         b.stop()
         self.assertNotEqual(b.SR, None)
+
+    def _batched_node(self, config):
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        chassis.request_pub_channel.return_value = mock.Mock()
+        chassis.request_rpc_channel.return_value = None
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        b.connect(['a'], False)
+        b.mgmtbus_reset()
+        b.start()
+
+        return b
+
+    def test_batch_size(self):
+        b = self._batched_node({'batch_size': 3, 'batch_timeout': 10})
+        SR = redis.StrictRedis()
+
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        b.filtered_update('a', indicator='i2', value={'test': 'v'})
+        self.assertEqual(SR.zcard(FTNAME), 0)
+
+        # withdraw of a pending update replaces it in the batch
+        b.filtered_withdraw('a', indicator='i2')
+        self.assertEqual(SR.zcard(FTNAME), 0)
+
+        b.filtered_update('a', indicator='i3', value={'test': 'v'})
+        self.assertItemsEqual(SR.zrange(FTNAME, 0, -1), ['i1', 'i3'])
+        self.assertEqual(b.length(), 2)
+        self.assertEqual(b.statistics['added'], 2)
+        self.assertEqual(b.statistics['batch.flushed'], 1)
+        self.assertEqual(b.statistics['batch.indicators'], 3)
+
+        b.stop()
+
+    def test_batch_timeout(self):
+        b = self._batched_node({'batch_timeout': 0.1})
+        SR = redis.StrictRedis()
+
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        self.assertEqual(SR.zcard(FTNAME), 0)
+
+        gevent.sleep(0.3)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['i1'])
+        self.assertEqual(b.statistics['batch.flushed'], 1)
+
+        b.filtered_withdraw('a', indicator='i1')
+        b.stop()
+        self.assertEqual(SR.zcard(FTNAME), 0)
+        self.assertEqual(b.length(), 0)
+        self.assertEqual(b.statistics['removed'], 1)
+
+    def test_batch_overflow(self):
+        b = self._batched_node({'batch_size': 3, 'batch_timeout': 10})
+        b.max_entries = 2
+        SR = redis.StrictRedis()
+
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        b.filtered_update('a', indicator='i2', value={'test': 'v'})
+        b.filtered_update('a', indicator='i3', value={'test': 'v'})
+        self.assertEqual(SR.zcard(FTNAME), 2)
+        self.assertEqual(b.statistics['drop.overflow'], 1)
+
+        # existing indicators are updated, withdraws make room
+        b.filtered_update('a', indicator='i1', value={'test': 'v2'})
+        b.filtered_withdraw('a', indicator='i2')
+        b.filtered_update('a', indicator='i4', value={'test': 'v'})
+        self.assertEqual(SR.zcard(FTNAME), 2)
+        self.assertEqual(b.length(), 2)
+        self.assertEqual(b.statistics['drop.overflow'], 1)
+
+        b.stop()
+
+    def test_generation(self):
+        b = self._batched_node({'batch_size': 2, 'batch_timeout': 10})
+        SR = redis.StrictRedis()
+
+        # reset bumps the generation
+        self.assertEqual(SR.get(FTNAME+'.generation'), '1')
+        self.assertNotEqual(SR.get(FTNAME+'.last_modified'), None)
+
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        self.assertEqual(SR.get(FTNAME+'.generation'), '1')
+
+        b.filtered_update('a', indicator='i2', value={'test': 'v'})
+        self.assertEqual(SR.get(FTNAME+'.generation'), '2')
+
+        b.filtered_withdraw('a', indicator='i1')
+        b.stop()
+        self.assertEqual(SR.get(FTNAME+'.generation'), '3')
+
+    def test_age_out_sorted_set(self):
+        SR = redis.StrictRedis()
+
+        for j in range(10):
+            SR.zadd(FTNAME, j, 'i%d' % j)
+            SR.hset(FTNAME+'.value', 'i%d' % j, 'v')
+
+        on_batch = mock.Mock()
+        removed = minemeld.ft.redis.age_out_sorted_set(
+            SR, FTNAME, FTNAME+'.value', 7,
+            batch_size=3,
+            on_batch=on_batch
+        )
+        self.assertEqual(removed, 7)
+        self.assertEqual(on_batch.call_count, 3)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['i7', 'i8', 'i9'])
+        self.assertItemsEqual(SR.hkeys(FTNAME+'.value'), ['i7', 'i8', 'i9'])
+
+        removed = minemeld.ft.redis.age_out_sorted_set(
+            SR, FTNAME, FTNAME+'.value', 7
+        )
+        self.assertEqual(removed, 0)
+
+        SR.delete(FTNAME+'.value')
+
+    def test_age_out(self):
+        b = self._batched_node({
+            'batch_timeout': 10,
+            'store_value': True,
+            'age_out_interval': 60
+        })
+        SR = redis.StrictRedis()
+
+        now = minemeld.ft.redis.utc_millisec()
+        b.filtered_update('a', indicator='i1', value={'last_seen': now-120*1000})
+        b.filtered_update('a', indicator='i2', value={'last_seen': now})
+        b._flush()
+        self.assertEqual(b.length(), 2)
+
+        b._age_out()
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['i2'])
+        self.assertEqual(SR.hkeys(FTNAME+'.value'), ['i2'])
+        self.assertEqual(b.length(), 1)
+        self.assertEqual(b.statistics['aged_out'], 1)
+        self.assertEqual(SR.get(FTNAME+'.generation'), '3')
+
+        b.stop()
+        SR.delete(FTNAME+'.value')
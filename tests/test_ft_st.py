@@ -230,6 +230,66 @@ class MineMeldFTSTTests(unittest.TestCase):
     def test_random_map_fast2(self):
         self._random_map(nintervals=2000)
 
+    def test_memoryst(self):
+        nbits = 10
+        epmax = (1 << nbits)-1
+        mtablename = TABLENAME+'_mem'
+
+        st = minemeld.ft.st.ST(TABLENAME, nbits, truncate=True)
+        mst = minemeld.ft.st.MemoryST(mtablename, nbits, truncate=True)
+
+        intervals = []
+        for j in xrange(500):
+            sid = str(uuid.uuid4())
+            start = random.randint(0, epmax)
+            end = random.randint(0, epmax)
+            if end < start:
+                start, end = end, start
+            level = random.choice([1, minemeld.ft.st.MAX_LEVEL])
+
+            st.put(sid, start, end, level=level)
+            mst.put(sid, start, end, level=level)
+            intervals.append((sid, start, end, level))
+
+        def _check(mst):
+            self.assertEqual(
+                list(mst.query_endpoints()),
+                list(st.query_endpoints())
+            )
+            for j in xrange(50):
+                a = random.randint(0, epmax)
+                b = random.randint(a, epmax)
+                self.assertEqual(
+                    list(mst.query_endpoints(start=a, stop=b)),
+                    list(st.query_endpoints(start=a, stop=b))
+                )
+                self.assertEqual(
+                    list(mst.query_endpoints(start=a, stop=b, reverse=True)),
+                    list(st.query_endpoints(start=a, stop=b, reverse=True))
+                )
+
+            for e in xrange(0, epmax+1, 7):
+                self.assertEqual(list(mst.cover(e)), list(st.cover(e)))
+
+        _check(mst)
+
+        for sid, start, end, level in intervals[:250]:
+            st.delete(sid, start, end, level=level)
+            mst.delete(sid, start, end, level=level)
+        _check(mst)
+
+        # in memory copy is rebuilt from LevelDB
+        num_segments = mst.num_segments
+        mst.close()
+        mst = minemeld.ft.st.MemoryST(mtablename, nbits)
+        self.assertEqual(mst.num_endpoints, 500)
+        self.assertEqual(mst.num_segments, num_segments)
+        _check(mst)
+
+        mst.close()
+        st.close()
+        shutil.rmtree(mtablename, ignore_errors=True)
+
     def test_255(self):
         st = minemeld.ft.st.ST(TABLENAME, 32, truncate=True)
         sid = uuid.uuid4().bytes
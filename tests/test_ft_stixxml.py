@@ -0,0 +1,120 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""FT STIX XML serializer tests
+
+Conformance tests of minemeld.ft.stixxml against python-stix
+"""
+
+import re
+import unittest
+import mock
+
+import lxml.etree
+
+import minemeld.ft.taxii
+import minemeld.ft.stixxml
+
+NAMESPACE = 'minemeld'
+NAMESPACEURI = 'https://go.paloaltonetworks.com/minemeld'
+
+_ID_RE = re.compile(
+    r'minemeld:([A-Za-z]+)-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+)
+_TIMESTAMP_RE = re.compile(r'timestamp="[^"]+"')
+_PACKAGE_RE = re.compile(r'<stix:STIX_Package ([^>]*)>')
+
+CASES = [
+    ('1.1.1.1', {'type': 'IPv4', 'confidence': 80, 'sources': ['s1']}, {}),
+    ('1.1.1.1-1.1.1.1', {'type': 'IPv4', 'confidence': 50, 'sources': ['s1']}, {}),
+    ('10.0.0.1-10.0.0.6', {'type': 'IPv4', 'confidence': 20, 'sources': ['s1', 's2']}, {}),
+    ('2001:db8::/32', {'type': 'IPv6', 'confidence': 100, 'sources': ['s1']}, {}),
+    (u'http://www.example.com/\xe8?a=<1>&b=2',
+     {'type': 'URL', 'confidence': 60, 'sources': ['s1']}, {}),
+    ('www.example.com', {'type': 'domain', 'sources': ['s1']}, {}),
+    ('d41d8cd98f00b204e9800998ecf8427e', {'type': 'md5', 'confidence': 75, 'sources': ['s1']}, {}),
+    ('da39a3ee5e6b4b0d3255bfef95601890afd80709',
+     {'type': 'sha1', 'confidence': 75, 'sources': ['s1']}, {}),
+    ('e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855',
+     {'type': 'sha256', 'confidence': 75, 'sources': ['s1']}, {}),
+    ('invalidhash', {'type': 'sha256', 'confidence': 75, 'sources': ['s1']}, {}),
+    ('user@example.com', {'type': 'email-addr', 'confidence': 30, 'sources': ['s1']}, {}),
+    ('8.8.8.8', {'type': 'IPv4', 'confidence': 80, 'sources': ['s1']}, {
+        'title': 'Title <1>',
+        'description': 'Description & more',
+        'short_description': 'Short',
+        'tlp_color': 'AMBER',
+        'information_source': 'Source'
+    }),
+    ('www.example.com', {'type': 'domain', 'confidence': 80, 'sources': ['s1']}, {
+        'tlp_color': 'WHITE'
+    }),
+    ('www.example.com', {'type': 'domain', 'confidence': 80, 'sources': ['s1']}, {
+        'information_source': 'Source'
+    })
+]
+
+
+def _normalize(content_block):
+    """Replaces ids and timestamps, and returns the namespace declarations
+    of the STIX package as a set: python-stix declares them in random order.
+    """
+    content_block = _ID_RE.sub(r'minemeld:\1-ID', content_block)
+    content_block = _TIMESTAMP_RE.sub('timestamp="TS"', content_block)
+
+    attributes = set(re.findall(
+        r'\S+="[^"]*"',
+        _PACKAGE_RE.search(content_block).group(1)
+    ))
+    content_block = _PACKAGE_RE.sub('<stix:STIX_Package>', content_block)
+
+    return content_block, attributes
+
+
+class MineMeldFTSTIXXMLTests(unittest.TestCase):
+    def setUp(self):
+        self.df = minemeld.ft.taxii.DataFeed('testdf', mock.Mock(), {
+            'namespace': NAMESPACE,
+            'namespaceuri': NAMESPACEURI
+        })
+
+    def test_conformance(self):
+        for indicator, value, header in CASES:
+            expected = self.df._python_stix_content_block(
+                minemeld.ft.taxii._TYPE_MAPPING[value['type']],
+                indicator, value,
+                **header
+            )[1]
+
+            spid, content_block = minemeld.ft.stixxml.stix_content_block(
+                NAMESPACE, NAMESPACEURI,
+                indicator, value,
+                **header
+            )
+
+            self.assertTrue(isinstance(content_block, str))
+            self.assertEqual(_normalize(content_block), _normalize(expected))
+
+            cb = lxml.etree.fromstring(content_block)
+            package = cb.find(
+                '{http://taxii.mitre.org/messages/taxii_xml_binding-1.1}Content/'
+                '{http://stix.mitre.org/stix-1}STIX_Package'
+            )
+            self.assertEqual(package.get('id'), spid)
+
+    def test_supported_types(self):
+        self.assertEqual(
+            minemeld.ft.stixxml.SUPPORTED_TYPES,
+            set(minemeld.ft.taxii._TYPE_MAPPING.keys())
+        )
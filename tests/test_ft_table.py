@@ -210,6 +210,72 @@ class MineMeldFTTableTests(unittest.TestCase):
         self.assertEqual(ok, 1)
         table.close()
 
+    def test_get_prefix(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+
+        table.put('1.1.1.1\x00s1', {'a': 1})
+        table.put('1.1.1.1\x00s2', {'a': 2})
+        table.put('1.1.1.10\x00s1', {'a': 3})
+        table.put('1.1.1.2\x00s1', {'a': 4})
+
+        self.assertEqual(
+            list(table.get_prefix('1.1.1.1\x00')),
+            [('1.1.1.1\x00s1', {'a': 1}), ('1.1.1.1\x00s2', {'a': 2})]
+        )
+        self.assertEqual(list(table.get_prefix(u'1.1.1.3\x00')), [])
+
+        table.delete('1.1.1.1\x00s1')
+        self.assertEqual(
+            list(table.get_prefix('1.1.1.1\x00')),
+            [('1.1.1.1\x00s2', {'a': 2})]
+        )
+        table.close()
+
+    def test_mark(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+        table.create_index('a')
+
+        self.assertFalse(table.touch('k1', 10))
+
+        table.put('k1', {'a': 1})
+        self.assertEqual(table.get_mark('k1'), None)
+
+        self.assertTrue(table.touch('k1', 10))
+        self.assertEqual(table.get_mark('k1'), 10)
+        self.assertEqual(table.get('k1'), {'a': 1})
+
+        # put invalidates the mark
+        table.put('k1', {'a': 2})
+        self.assertEqual(table.get_mark('k1'), None)
+
+        table.touch('k1', 20)
+        table.delete('k1')
+        table.put('k1', {'a': 3})
+        self.assertEqual(table.get_mark('k1'), None)
+        table.close()
+
+    def test_query_marks(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+
+        for k in ['k1', 'k2', 'k3', 'k4']:
+            table.put(k, {'a': 1})
+
+        table.touch('k1', 10)
+        table.touch('k2', 30)
+        table.touch('k3', 20)
+        table.touch('k4', 15)
+        self.assertEqual(list(table.query_marks(20)), ['k1', 'k4', 'k3'])
+
+        # moved mark
+        table.touch('k1', 40)
+        self.assertEqual(list(table.query_marks(20)), ['k4', 'k3'])
+
+        # put invalidates the mark, delete removes it
+        table.put('k3', {'a': 2})
+        table.delete('k4')
+        self.assertEqual(list(table.query_marks(40)), ['k2', 'k1'])
+        table.close()
+
     @attr('slow')
     def test_random(self):
         # create table
@@ -33,8 +33,10 @@ import xmltodict
 import os
 import libtaxii.constants
 import re
-import lz4
-import json
+import StringIO
+import lz4.frame
+import libtaxii.messages_11
+import stix.core
 
 import minemeld.ft.taxii
 import minemeld.ft
@@ -54,6 +56,13 @@ class MockTaxiiContentBlock(object):
         self.content_binding = _Binding(libtaxii.constants.CB_STIX_XML_111)
 
 
+def _stix_package_dict(value):
+    cb = libtaxii.messages_11.ContentBlock.from_xml(
+        lz4.frame.decompress(value[5:])
+    )
+    return stix.core.STIXPackage.from_xml(StringIO.StringIO(cb.content)).to_dict()
+
+
 class MineMeldFTTaxiiTests(unittest.TestCase):
     @mock.patch.object(gevent, 'Greenlet')
     def test_taxiiclient_parse(self, glet_mock):
@@ -191,8 +200,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.uncompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -218,8 +227,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.uncompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -245,8 +254,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.uncompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -272,8 +281,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.uncompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -300,8 +309,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.uncompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators']
         cyboxprops = indicator[0]['observable']['object']['properties']
@@ -360,8 +369,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.decompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -417,8 +426,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.decompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -474,8 +483,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.decompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -552,8 +561,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.decompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -608,8 +617,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.decompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -635,8 +644,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.decompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
@@ -662,8 +671,8 @@ class MineMeldFTTaxiiTests(unittest.TestCase):
         else:
             self.fail(msg='hset not found')
 
-        self.assertEqual(args[2].startswith('lz4'), True)
-        stixdict = json.loads(lz4.decompress(args[2][3:]))
+        self.assertEqual(args[2].startswith('lz4cb'), True)
+        stixdict = _stix_package_dict(args[2])
 
         indicator = stixdict['indicators'][0]
         cyboxprops = indicator['observable']['object']['properties']
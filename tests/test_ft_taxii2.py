@@ -0,0 +1,129 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""FT TAXII2 tests
+
+Unit tests for minemeld.ft.taxii2
+"""
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import unittest
+import mock
+import os.path
+import time
+
+import ujson
+
+import minemeld.ft.taxii2
+
+FTNAME = 'testft-%d' % int(time.time())
+
+
+def _indicator(n, modified):
+    return {
+        'type': 'indicator',
+        'id': 'indicator--%d' % n,
+        'pattern': "[ipv4-addr:value = '10.0.0.%d']" % n,
+        'modified': modified
+    }
+
+
+def _relationship(n, source_ref, target_ref, description):
+    return {
+        'type': 'relationship',
+        'id': 'relationship--%d' % n,
+        'source_ref': source_ref,
+        'target_ref': target_ref,
+        'description': description,
+        'modified': '2020-01-01T00:00:00.000Z'
+    }
+
+
+def _attack_pattern(n):
+    return {
+        'type': 'attack-pattern',
+        'id': 'attack-pattern--%d' % n,
+        'name': 'T%d' % n,
+        'modified': '2020-01-01T00:00:00Z'
+    }
+
+
+PAGES = [
+    {
+        'objects': [
+            _indicator(1, '2020-01-02T00:00:00.000Z'),
+            _indicator(2, '2020-01-03T00:00:00.000Z'),
+            _relationship(1, 'indicator--1', 'attack-pattern--1', 'd1')
+        ],
+        'more': True
+    },
+    {
+        'objects': [
+            _relationship(2, 'indicator--2', 'malware--1', 'd2'),
+            _attack_pattern(1)
+        ],
+        'more': False
+    }
+]
+
+
+class MineMeldFTTaxii2Tests(unittest.TestCase):
+    def _client(self, max_objects_in_memory):
+        chassis = mock.Mock()
+
+        with mock.patch.dict(os.environ, {'MM_CONFIG_DIR': '.'}):
+            c = minemeld.ft.taxii2.Taxii2Client(FTNAME, chassis, {
+                'max_objects_in_memory': max_objects_in_memory
+            })
+
+        c.client = mock.Mock()
+        c.client.get.side_effect = [
+            mock.Mock(status_code=200, text=ujson.dumps(p)) for p in PAGES
+        ]
+        c.api_root = 'http://example.com/api/'
+        c.taxii_collection = {'id': 'c1'}
+        c.taxii_version = '2.1'
+
+        return c
+
+    def _check_poll(self, max_objects_in_memory):
+        c = self._client(max_objects_in_memory)
+
+        result = list(c._poll_and_filter_collection())
+
+        # indicators are converted again when relationships and
+        # attack patterns are received in later pages
+        self.assertItemsEqual(result[:2], [
+            ['10.0.0.1', {'type': 'IPv4', 'description': 'd1'}],
+            ['10.0.0.2', {'type': 'IPv4'}]
+        ])
+        self.assertItemsEqual(result[2:], [
+            ['10.0.0.1', {'type': 'IPv4', 'description': 'd1', 'techniques': 'T1'}],
+            ['10.0.0.2', {'type': 'IPv4', 'description': 'd2'}]
+        ])
+
+        self.assertEqual(c.last_stix2_package_ts, '2020-01-03T00:00:00.000Z')
+        self.assertEqual(
+            c.client.get.call_args_list[1][1]['params']['added_after'],
+            '2020-01-03T00:00:00.000Z'
+        )
+        self.assertFalse(os.path.exists('{}.stix2-temp'.format(FTNAME)))
+
+    def test_poll(self):
+        self._check_poll(100000)
+
+    def test_poll_spill(self):
+        self._check_poll(2)
@@ -0,0 +1,107 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Placement tests
+
+Unit tests for minemeld.placement
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import os.path
+
+from minemeld.run.config import MineMeldConfig
+import minemeld.placement
+
+
+def _config(nodes):
+    return MineMeldConfig(nodes=nodes, fabric={}, mgmtbus={}, changes=[])
+
+
+class MineMeldPlacement(unittest.TestCase):
+    def test_two_pipelines(self):
+        nodes = {
+            'm1': {},
+            'm2': {},
+            'm3': {},
+            'm4': {},
+            'p1': {'inputs': ['m1', 'm2']},
+            'p2': {'inputs': ['m3', 'm4']},
+            'o1': {'inputs': ['p1']},
+            'o2': {'inputs': ['p2']}
+        }
+        config = _config(nodes)
+
+        placement = minemeld.placement.plan(config, num_chassis=2, max_nodes=4)
+        self.assertEqual(
+            sorted(placement),
+            [['m1', 'm2', 'o1', 'p1'], ['m3', 'm4', 'o2', 'p2']]
+        )
+
+        traffic = {n: 1 for n in nodes}
+        self.assertEqual(
+            minemeld.placement.cross_traffic(config, placement, traffic),
+            (0, 6, 0, 6)
+        )
+
+        rr = minemeld.placement.round_robin(config, 2)
+        self.assertEqual(sorted(sum(rr, [])), sorted(nodes.keys()))
+        self.assertEqual(max(len(c) for c in rr), 4)
+
+    def test_balance(self):
+        nodes = {'m%d' % j: {} for j in range(6)}
+        nodes['p1'] = {'inputs': ['m%d' % j for j in range(6)]}
+        config = _config(nodes)
+
+        placement = minemeld.placement.plan(config, num_chassis=2, max_nodes=4)
+        self.assertEqual(sorted(len(c) for c in placement), [3, 4])
+        self.assertEqual(sorted(sum(placement, [])), sorted(nodes.keys()))
+
+    def test_no_chassis(self):
+        self.assertEqual(
+            minemeld.placement.plan(_config({}), num_chassis=0, max_nodes=4),
+            []
+        )
+
+    def test_estimate(self):
+        nodes = {
+            'm1': {},
+            'm2': {},
+            'p1': {
+                'class': 'minemeld.ft.op.AggregateFT',
+                'inputs': ['m1', 'm2']
+            }
+        }
+        config = _config(nodes)
+
+        state_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(state_dir, 'm1.chkp'), 'w') as f:
+                f.write(json.dumps({'checkpoint': 'x', 'length': 10}))
+            with open(os.path.join(state_dir, 'm2.chkp'), 'w') as f:
+                f.write('old format')
+
+            traffic = minemeld.placement.estimate_traffic(config, state_dir)
+
+        finally:
+            shutil.rmtree(state_dir)
+
+        self.assertEqual(traffic['m1'], 10)
+        self.assertEqual(traffic['m2'], minemeld.placement.DEFAULT_LENGTH)
+
+        load = minemeld.placement.estimate_load(config, traffic)
+        self.assertEqual(load['m1'], 10)
+        self.assertEqual(load['p1'], 2.0*(10+minemeld.placement.DEFAULT_LENGTH))
@@ -79,9 +79,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 0)
         self.assertEqual(eoq, True)
@@ -114,9 +115,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 1)
         self.assertEqual(eoq, True)
@@ -152,9 +154,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 1)
         self.assertEqual(eoq, True)
@@ -199,9 +202,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 1)
         self.assertEqual(eoq, True)
@@ -246,9 +250,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 0)
         self.assertEqual(eoq, True)
@@ -293,9 +298,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 1)
         self.assertEqual(eoq, True)
@@ -340,9 +346,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 2)
         self.assertEqual(eoq, True)
@@ -387,9 +394,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 1)
         self.assertEqual(eoq, True)
@@ -434,9 +442,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 1)
         self.assertEqual(eoq, True)
@@ -466,9 +475,10 @@ class MineMeldTracedStorage(unittest.TestCase):
             if args[1] == '<EOQ>':
                 eoq = True
             else:
-                line = json.loads(args[1])
-                if 'log' in line:
-                    num_logs += 1
+                for line in args[1].split('\n'):
+                    line = json.loads(line)
+                    if 'log' in line:
+                        num_logs += 1
 
         self.assertEqual(num_logs, 0)
         self.assertEqual(eoq, True)
@@ -651,3 +661,205 @@ class MineMeldTracedStorage(unittest.TestCase):
 
         qp.stop()
         gevent.sleep(0)
+
+    def test_query_index(self):
+        store = traced_mock.store_factory()
+
+        q = minemeld.traced.queryprocessor.Query(
+            store,
+            'Indicator:"1.1.1.1" -op:drop_update test',
+            0, 0,
+            100,
+            'uuid-test',
+            {}
+        )
+        self.assertEqual(q.index, ('indicator', '1.1.1.1'))
+
+        def _log(indicator, op):
+            return ujson.dumps({
+                'source': 'test',
+                'log': {'indicator': indicator, 'op': op}
+            })
+
+        self.assertTrue(q._check_query(_log('1.1.1.1', 'ACCEPT_UPDATE')))
+        self.assertFalse(q._check_query(_log('1.1.1.1', 'DROP_UPDATE')))
+        self.assertFalse(q._check_query(_log('1.1.1.10', 'ACCEPT_UPDATE')))
+        self.assertFalse(q._check_query('1.1.1.1 test'))
+
+        # partial terms match substrings and are not looked up
+        q = minemeld.traced.queryprocessor.Query(
+            store,
+            "-op:drop_update indicator:1.1.1 source:TE",
+            0, 0,
+            100,
+            'uuid-test',
+            {}
+        )
+        self.assertEqual(q.index, None)
+        self.assertTrue(q._check_query(_log('1.1.1.10', 'ACCEPT_UPDATE')))
+        self.assertTrue(q._check_query(_log('21.1.1.1', 'ACCEPT_UPDATE')))
+        self.assertFalse(q._check_query(_log('1.1.1.10', 'DROP_UPDATE')))
+        self.assertFalse(q._check_query(_log('1.1.2.1', 'ACCEPT_UPDATE')))
+
+        q = minemeld.traced.queryprocessor.Query(
+            store,
+            '-op:"drop_update" value:"1.1.1.1"',
+            0, 0,
+            100,
+            'uuid-test',
+            {}
+        )
+        self.assertEqual(q.index, None)
+
+    @mock.patch.object(redis.StrictRedis, 'from_url')
+    def test_query_parallel_days(self, from_url_mock):
+        class DaysStore(traced_mock.MockStore):
+            def __init__(self, days):
+                super(DaysStore, self).__init__()
+                self.days = days
+                self.scanned = []
+
+            def days_backwards(self, timestamp):
+                return [(d, d) for d in sorted(self.days, reverse=True)], 'No more logs to check'
+
+            def iterate_table_backwards(self, ref, table_name, timestamp, counter, index=None):
+                self.scanned.append(table_name)
+                for c in range(self.days[table_name], 0, -1):
+                    gevent.sleep(0)
+                    yield {
+                        'timestamp': int(table_name),
+                        'counter': c,
+                        'log': '{"day": "%s"}' % table_name
+                    }
+
+        store = DaysStore({'1': 3, '2': 1, '3': 0, '4': 2, '5': 50})
+
+        q = minemeld.traced.queryprocessor.Query(
+            store, "day", 0, 0, 5, 'uuid-test', {}
+        )
+        q._run()
+
+        events = []
+        for call in from_url_mock.mock_calls:
+            name, args, kwargs = call
+            if name != '().publish':
+                continue
+            self.assertEqual(args[0], 'mm-traced-q.uuid-test')
+            if args[1] == '<EOQ>':
+                events.append('<EOQ>')
+                continue
+            events.extend(json.loads(l) for l in args[1].split('\n'))
+
+        lines = [(e['timestamp'], e['counter']) for e in events if 'log' in e]
+        self.assertEqual(
+            lines,
+            [(5, 50), (5, 49), (5, 48), (5, 47), (5, 46)]
+        )
+        self.assertEqual(events[0], {'msg': 'Checking 5'})
+        self.assertEqual(events[-2], {'msg': 'Loaded 5 lines'})
+        self.assertEqual(events[-1], '<EOQ>')
+
+        # only max_tables-1 days are scanned in parallel
+        self.assertEqual(store.scanned, ['5', '4', '3', '2'])
+
+        q = minemeld.traced.queryprocessor.Query(
+            store, "day", 0, 0, 5, 'uuid-test', {}
+        )
+        store.days['5'] = 0
+        from_url_mock.reset_mock()
+        q._run()
+
+        events = []
+        for call in from_url_mock.mock_calls:
+            name, args, kwargs = call
+            if name == '().publish' and args[1] != '<EOQ>':
+                events.extend(json.loads(l) for l in args[1].split('\n'))
+
+        lines = [(e['timestamp'], e['counter']) for e in events if 'log' in e]
+        self.assertEqual(lines, [(4, 2), (4, 1), (2, 1), (1, 3), (1, 2)])
+        self.assertNotIn({'msg': 'No more logs to check'}, events)
+
+        gevent.sleep(0)
+        self.assertEqual(store.query_slots.counter, 4)
+
+    @mock.patch.object(redis.StrictRedis, 'from_url')
+    def test_query_slots(self, from_url_mock):
+        class SlotsStore(traced_mock.MockStore):
+            def __init__(self):
+                super(SlotsStore, self).__init__({'max_tables': 3})
+                self.active = 0
+                self.max_active = 0
+
+            def days_backwards(self, timestamp):
+                return [(d, d) for d in '4321'], 'No more logs to check'
+
+            def iterate_table_backwards(self, ref, table_name, timestamp, counter, index=None):
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    for c in range(500, 0, -1):
+                        gevent.sleep(0)
+                        yield {
+                            'timestamp': int(table_name),
+                            'counter': c,
+                            'log': '{"day": "%s"}' % table_name
+                        }
+
+                finally:
+                    self.active -= 1
+
+        store = SlotsStore()
+
+        queries = [
+            minemeld.traced.queryprocessor.Query(
+                store, "day", 0, 0, 1500, 'uuid-test-%d' % j, {}
+            )
+            for j in range(3)
+        ]
+        for q in queries:
+            q.start()
+        gevent.joinall(queries, raise_error=True)
+        gevent.sleep(0)
+
+        # the queries share the table slots, one is left for the writer
+        self.assertEqual(store.max_active, 2)
+        self.assertEqual(store.active, 0)
+        self.assertEqual(store.query_slots.counter, 2)
+
+    @mock.patch.object(redis.StrictRedis, 'from_url')
+    def test_query_stops_scanners(self, from_url_mock):
+        class SparseStore(traced_mock.MockStore):
+            def __init__(self):
+                super(SparseStore, self).__init__()
+                self.active = 0
+
+            def days_backwards(self, timestamp):
+                return [('2', '2'), ('1', '1')], 'No more logs to check'
+
+            def iterate_table_backwards(self, ref, table_name, timestamp, counter, index=None):
+                self.active += 1
+                try:
+                    for c in range(1000, 0, -1):
+                        # day 1 is still being scanned when day 2 is done
+                        gevent.sleep(0.001 if table_name == '1' else 0)
+                        log = 'x'
+                        if table_name == '2' or c % 100 == 0:
+                            log = '{"day": "%s"}' % table_name
+                        yield {
+                            'timestamp': int(table_name),
+                            'counter': c,
+                            'log': log
+                        }
+
+                finally:
+                    self.active -= 1
+
+        store = SparseStore()
+
+        # day 1 has matches left when the query is done
+        q = minemeld.traced.queryprocessor.Query(
+            store, "day", 0, 0, 1002, 'uuid-test', {}
+        )
+        q._run()
+
+        self.assertEqual(store.active, 0)
@@ -16,6 +16,7 @@
 Unit tests for minemeld.traced.storage
 """
 
+import os
 import unittest
 import tempfile
 import shutil
@@ -23,6 +24,7 @@ import random
 import time
 import mock
 import logging
+import ujson
 
 from nose.plugins.attrib import attr
 
@@ -87,6 +89,148 @@ class MineMeldTracedStorage(unittest.TestCase):
         table.close()
         table = None
 
+    def test_table_index(self):
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=True)
+        self.assertTrue(table.indexed)
+        table.put('%016x' % 1, 'value0', indexes={'indicator': '1.1.1.1', 'op': 'accept_update'})
+        table.put('%016x' % 2, 'value1', indexes={'indicator': '2.2.2.2', 'op': 'accept_update'})
+        table.put('%016x' % 3, 'value2', indexes={'indicator': '1.1.1.1', 'op': 'drop_update'})
+
+        lines = list(table.backwards_index_iterator(
+            'indicator', '1.1.1.1', 3, 0xFFFFFFFFFFFFFFFF
+        ))
+        self.assertEqual([l for _, l in lines], ['value2', 'value0'])
+        self.assertEqual(int(lines[0][0][:16], 16), 3)
+        self.assertEqual(int(lines[0][0][16:], 16), 2)
+
+        lines = list(table.backwards_index_iterator(
+            'op', 'accept_update', 1, 0xFFFFFFFFFFFFFFFF
+        ))
+        self.assertEqual([l for _, l in lines], ['value0'])
+
+        # index entries are not returned by the log iterator
+        lines = list(table.backwards_iterator(3, 0xFFFFFFFFFFFFFFFF))
+        self.assertEqual([l for _, l in lines], ['value2', 'value1', 'value0'])
+
+        table.close()
+
+    def test_log_indexes(self):
+        indexes = minemeld.traced.storage.log_indexes({
+            'source': 'Node1',
+            'log_type': 'TRACE',
+            'log': {
+                'indicator': u'WWW.EXAMPLE.COM',
+                'op': 'ACCEPT_UPDATE',
+                'value': {'confidence': 100}
+            }
+        })
+        self.assertEqual(indexes, {
+            'source': 'node1',
+            'indicator': 'www.example.com',
+            'op': 'accept_update'
+        })
+
+    def test_table_put_batch(self):
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=True)
+        table.put_batch([
+            ('%016x' % 1, 'value0', None),
+            ('%016x' % 1, 'value1', {'op': 'accept_update'}),
+            ('%016x' % 2, 'value2', None)
+        ])
+        self.assertEqual(table.max_counter, 2)
+        table.close()
+
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=False)
+        self.assertEqual(table.max_counter, 2)
+        lines = list(table.backwards_iterator(2, 0xFFFFFFFFFFFFFFFF))
+        self.assertEqual(
+            [(int(k[16:], 16), l) for k, l in lines],
+            [(2, 'value2'), (1, 'value1'), (0, 'value0')]
+        )
+        lines = list(table.backwards_index_iterator('op', 'accept_update', 2, 0xFFFFFFFFFFFFFFFF))
+        self.assertEqual([l for _, l in lines], ['value1'])
+        table.close()
+
+    def test_table_compression(self):
+        logs = [
+            ujson.dumps({
+                'source': 'node%d' % (j % 3),
+                'log_type': 'TRACE',
+                'log': {'indicator': '10.0.0.%d' % j, 'op': 'ACCEPT_UPDATE'}
+            }) for j in range(200)
+        ]
+
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=True)
+        table.compress = True
+
+        # not enough logs for a dictionary, logs are stored raw
+        table.put_batch([('%016x' % 0, logs[0], None)])
+        self.assertEqual(table.dictionary, None)
+
+        table.put_batch([('%016x' % (j+1), l, None) for j, l in enumerate(logs[1:])])
+        self.assertNotEqual(table.dictionary, None)
+        self.assertTrue(table.db.get('%016x%016x' % (2, 2)).startswith(
+            minemeld.traced.storage.COMPRESSED_PREFIX
+        ))
+        table.close()
+
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=False)
+        lines = list(table.backwards_iterator(200, 0xFFFFFFFFFFFFFFFF))
+        self.assertEqual([l for _, l in lines], logs[::-1])
+        table.close()
+
+    def test_table_compression_small_batches(self):
+        logs = [
+            ujson.dumps({
+                'source': 'node%d' % (j % 3),
+                'log_type': 'TRACE',
+                'log': {'indicator': '10.0.0.%d' % j, 'op': 'ACCEPT_UPDATE'}
+            }) for j in range(200)
+        ]
+
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=True)
+        table.compress = True
+        for j, l in enumerate(logs[:20]):
+            table.put_batch([('%016x' % j, l, None)])
+        self.assertEqual(table.dictionary, None)
+        table.close()
+
+        # the sample starts from the logs already in the table
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=False)
+        table.compress = True
+        for j, l in enumerate(logs[20:], start=20):
+            table.put_batch([('%016x' % j, l, None)])
+        self.assertNotEqual(table.dictionary, None)
+        self.assertTrue(table.db.get('%016x%016x' % (199, 199)).startswith(
+            minemeld.traced.storage.COMPRESSED_PREFIX
+        ))
+        lines = list(table.backwards_iterator(200, 0xFFFFFFFFFFFFFFFF))
+        self.assertEqual([l for _, l in lines], logs[::-1])
+        table.close()
+
+    def test_table_compress_logs(self):
+        logs = [
+            ujson.dumps({
+                'source': 'node%d' % (j % 3),
+                'log_type': 'TRACE',
+                'log': {'indicator': '10.0.0.%d' % j, 'op': 'ACCEPT_UPDATE'}
+            }) for j in range(200)
+        ]
+
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=True)
+        table.put_batch([('%016x' % j, l, {'op': 'accept_update'}) for j, l in enumerate(logs)])
+        self.assertEqual(table.compress_logs(batch_size=7), 200)
+        self.assertEqual(table.compress_logs(), 0)
+        self.assertEqual(table.max_counter, 199)
+        table.close()
+
+        table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=False)
+        lines = list(table.backwards_iterator(200, 0xFFFFFFFFFFFFFFFF))
+        self.assertEqual([l for _, l in lines], logs[::-1])
+        lines = list(table.backwards_index_iterator('op', 'accept_update', 200, 0xFFFFFFFFFFFFFFFF))
+        self.assertEqual([l for _, l in lines], logs[::-1])
+        table.close()
+
     def test_table_references(self):
         table = minemeld.traced.storage.Table(TABLENAME, create_if_missing=True)
         self.assertEqual(table.ref_count(), 0)
@@ -159,6 +303,37 @@ class MineMeldTracedStorage(unittest.TestCase):
         store.stop()
         self.assertEqual(len(store.current_tables), 0)
 
+    def test_store_write_batch(self):
+        cwd = os.getcwd()
+        tdir = tempfile.mkdtemp(prefix='minemeld.traced.batchtest')
+        os.chdir(tdir)
+
+        try:
+            store = minemeld.traced.storage.Store()
+            store.write_batch([
+                (1*86400*1000, 'log0', None),
+                (2*86400*1000, 'log1', None),
+                (1*86400*1000+1, 'log2', None)
+            ])
+            self.assertEqual(
+                minemeld.traced.storage.Table.list_tables(),
+                ['%016x' % 86400, '%016x' % (2*86400)]
+            )
+            self.assertEqual(store.current_tables['%016x' % 86400].max_counter, 1)
+            self.assertEqual(store.current_tables['%016x' % 86400].ref_count(), 0)
+
+            lines = [
+                l['log'] for l in store.iterate_backwards('q1', 3*86400*1000, 0xFFFFFFFFFFFFFFFF)
+                if 'log' in l
+            ]
+            self.assertEqual(lines, ['log1', 'log2', 'log0'])
+
+            store.stop()
+
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tdir)
+
     @mock.patch.object(minemeld.traced.storage, 'Table', side_effect=traced_mock.table_factory)
     def test_store_iterate_backwards(self, table_mock):
         _oldest_table_mock = mock.MagicMock(side_effect=traced_mock.MockTable.oldest_table)
@@ -239,6 +414,98 @@ class MineMeldTracedStorage(unittest.TestCase):
 
         store.stop()
 
+    def test_store_retention(self):
+        cwd = os.getcwd()
+        tdir = tempfile.mkdtemp(prefix='minemeld.traced.retentiontest')
+        os.chdir(tdir)
+
+        try:
+            store = minemeld.traced.storage.Store({'num_days': 3})
+            for d in range(1, 6):
+                store.write(d*86400*1000, 'log%d' % d)
+
+            # table of day 2 in use by a query
+            table = store._get_table('%016x' % (2*86400), 'query1', create_if_missing=False)
+
+            removed = store.enforce_retention(now=5*86400+10)
+            self.assertEqual(removed, ['%016x' % 86400])
+            self.assertEqual(
+                minemeld.traced.storage.Table.oldest_table(),
+                '%016x' % (2*86400)
+            )
+
+            store._release(table, 'query1')
+            removed = store.enforce_retention(now=5*86400+10)
+            self.assertEqual(removed, ['%016x' % (2*86400)])
+            self.assertNotIn('%016x' % (2*86400), store.current_tables)
+
+            # size cap, the current table is never removed
+            store.max_size = 1
+            removed = store.enforce_retention(now=5*86400+10)
+            self.assertEqual(removed, ['%016x' % (3*86400), '%016x' % (4*86400)])
+            self.assertEqual(
+                minemeld.traced.storage.Table.list_tables(),
+                ['%016x' % (5*86400)]
+            )
+
+            store.write(5*86400*1000+1, 'log6')
+            store.stop()
+
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tdir)
+
+    def test_store_retention_unlocked_remove(self):
+        cwd = os.getcwd()
+        tdir = tempfile.mkdtemp(prefix='minemeld.traced.retentiontest')
+        os.chdir(tdir)
+
+        try:
+            store = minemeld.traced.storage.Store({'num_days': 1})
+            for d in range(1, 3):
+                store.write(d*86400*1000, 'log%d' % d)
+
+            old_table = '%016x' % 86400
+            rmtree = shutil.rmtree
+            checks = []
+
+            def _rmtree(name):
+                checks.append(store.current_tables_lock.locked())
+                self.assertRaises(
+                    minemeld.traced.storage.TableNotFound,
+                    store._get_table, name, 'query1', create_if_missing=False
+                )
+                rmtree(name)
+
+            with mock.patch.object(minemeld.traced.storage.shutil, 'rmtree', side_effect=_rmtree):
+                removed = store.enforce_retention(now=2*86400+10)
+
+            self.assertEqual(removed, [old_table])
+            self.assertEqual(checks, [False])
+            self.assertEqual(store._removing_tables, set())
+            store.stop()
+
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tdir)
+
+    def test_store_retention_config(self):
+        store = minemeld.traced.storage.Store()
+        self.assertEqual(store.num_days, None)
+        store.start()
+        self.assertEqual(store._retention_glet, None)
+        store.stop()
+
+        with mock.patch.dict(os.environ, {'MINEMELD_TRACE_NUM_DAYS': '7'}):
+            store = minemeld.traced.storage.Store({'num_days': 3})
+            self.assertEqual(store.num_days, 7)
+
+        self.assertRaises(
+            ValueError,
+            minemeld.traced.storage.Store,
+            {'num_days': 0}
+        )
+
     @attr('slow')
     def test_stress_1(self):
         num_lines = 200000
@@ -24,6 +24,7 @@ import time
 import mock
 import logging
 import ujson
+import gevent
 
 import minemeld.traced.writer
 
@@ -39,16 +40,41 @@ class MineMeldTracedStorage(unittest.TestCase):
         comm = comm_mock.comm_factory(config)
         store = traced_mock.store_factory()
 
-        writer = minemeld.traced.writer.Writer(comm, store, 'TESTTOPIC')
+        writer = minemeld.traced.writer.Writer(comm, store, 'TESTTOPIC', {})
         self.assertEqual(comm.sub_channels[0]['topic'], 'TESTTOPIC')
         self.assertEqual(comm.sub_channels[0]['allowed_methods'], ['log'])
 
         writer.log(0, log='testlog')
+        self.assertEqual(len(store.writes), 0)
+
+        writer.stop()
         self.assertEqual(store.writes[0]['timestamp'], 0)
         self.assertEqual(store.writes[0]['log'], ujson.dumps({'log': 'testlog'}))
 
-        writer.stop()
         writer.log(0, log='testlog')
         self.assertEqual(len(store.writes), 1)
 
         writer.stop()  # just for coverage
+
+    def test_writer_batch(self):
+        config = {}
+        comm = comm_mock.comm_factory(config)
+        store = traced_mock.store_factory()
+
+        writer = minemeld.traced.writer.Writer(comm, store, 'TESTTOPIC', {
+            'batch_size': 3,
+            'batch_timeout': 0.1
+        })
+
+        for j in range(4):
+            writer.log(j, log='testlog%d' % j)
+        self.assertEqual([w['timestamp'] for w in store.writes], [0, 1, 2])
+        self.assertEqual(writer.statistics['batch.flushed'], 1)
+        self.assertEqual(writer.statistics['backlog.max'], 3)
+
+        gevent.sleep(0.3)
+        self.assertEqual([w['timestamp'] for w in store.writes], [0, 1, 2, 3])
+        self.assertEqual(writer.statistics['batch.flushed'], 2)
+        self.assertEqual(writer.statistics['batch.logs'], 4)
+
+        writer.stop()
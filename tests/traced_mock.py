@@ -18,6 +18,7 @@ This module implements mock classes for minemed.traced tests
 
 import gevent
 import gevent.event
+import gevent.lock
 
 import logging
 
@@ -61,7 +62,7 @@ class MockTable(object):
     def ref_count(self):
         return len(self.refs)
 
-    def put(self, key, value):
+    def put(self, key, value, indexes=None):
         self.last_used = _get_clock()
 
         self.max_counter += 1
@@ -113,8 +114,12 @@ class MockStore(object):
         self.db = {}
         self.counter = 0
         self.release_alls = []
+        self.max_tables = self.config.get('max_tables', 5)
+        self.query_slots = gevent.lock.BoundedSemaphore(
+            max(1, self.max_tables-1)
+        )
 
-    def write(self, timestamp, log):
+    def write(self, timestamp, log, indexes=None):
         self.writes.append({
             'timestamp': timestamp,
             'log': log
@@ -122,7 +127,11 @@ class MockStore(object):
         self.db['%016x%016x' % (timestamp, self.counter)] = log
         self.counter += 1
 
-    def iterate_backwards(self, ref, timestamp, counter):
+    def write_batch(self, logs):
+        for timestamp, log, indexes in logs:
+            self.write(timestamp, log, indexes=indexes)
+
+    def iterate_backwards(self, ref, timestamp, counter, index=None):
         starting_key = '%016x%016x' % (timestamp, counter)
         items = [[k, v] for k, v in self.db.iteritems() if k <= starting_key]
         items = sorted(items, cmp=lambda x, y: cmp(x[0], y[0]), reverse=True)
@@ -132,6 +141,14 @@ class MockStore(object):
                 yield {'msg': 'test message'}
             yield {'timestamp': i[0], 'log': i[1]}
 
+    def days_backwards(self, timestamp):
+        return [('0000000000000000', '1970-01-01')], 'No more logs to check'
+
+    def iterate_table_backwards(self, ref, table_name, timestamp, counter, index=None):
+        for line in self.iterate_backwards(ref, timestamp, counter, index=index):
+            if 'log' in line:
+                yield line
+
     def release_all(self, ref):
         self.release_alls.append(ref)
 